@@ -4,6 +4,8 @@ const fsp = require('fs').promises
 const Previsao = require('../models/Previsao')
 const Produto = require('../models/Produto')
 const Venda = require('../models/Venda')
+const { workerConfigurado, preverNoWorker } = require('../utils/workerPrevisao')
+const { argumentosRastreamento, registrarRastreamento } = require('../utils/rastreamentoPython')
 // resolução de problema de loooooping infinito
 // cache em memória para a previsão padrão
 let cachePrevisao = {
@@ -135,6 +137,32 @@ const salvarPrevisao = async (dadosPrevisao, idUsuario) => {
   }
 }
 
+// salva no banco todas as previsões geradas pelo python, ignorando as que falharem
+const salvarPrevisoesGeradas = async (previsoesAnalisadas, idUsuario) => {
+  const previsoesSalvas = []
+  for (const previsao of previsoesAnalisadas) {
+    try {
+      const previsaoSalva = await salvarPrevisao(previsao, idUsuario)
+      previsoesSalvas.push(previsaoSalva)
+    } catch (erroSalvar) {
+      console.error(`Erro ao salvar previsão para SKU ${previsao.sku}:`, erroSalvar)
+    }
+  }
+  return previsoesSalvas
+}
+
+// tenta gerar as previsões no worker python persistente
+// retorna null se o worker não estiver configurado ou disponível, para cair no spawn
+const preverComWorker = async csvData => {
+  if (!workerConfigurado()) return null
+  try {
+    return await preverNoWorker(csvData)
+  } catch (erro) {
+    console.error('Worker de previsão indisponível, executando script python:', erro.message)
+    return null
+  }
+}
+
 // gera previsões usando dados csv enviados pelo usuário
 // executa o script python e salva os resultados no banco
 const getPrevisao = async (req, res) => {
@@ -151,6 +179,17 @@ const getPrevisao = async (req, res) => {
     return res.status(401).json({ error: 'Usuário não autenticado.' })
   }
 
+  // usa o worker persistente quando disponível
+  const previsoesDoWorker = await preverComWorker(csvData)
+  if (previsoesDoWorker) {
+    const previsoesSalvas = await salvarPrevisoesGeradas(previsoesDoWorker, idUsuario)
+    return res.json({
+      previsoes: previsoesDoWorker,
+      salvas_bd: previsoesSalvas.length,
+      total_geradas: previsoesDoWorker.length,
+    })
+  }
+
   // caminho para o script python que gera as previsões
   const caminhoScriptPython = path.resolve(
     __dirname,
@@ -161,19 +200,42 @@ const getPrevisao = async (req, res) => {
     'run_prophet.py'
   )
 
-  // executa o script python como processo separado
-  const processoPython = spawn('python', [caminhoScriptPython])
+  // executa o script python como processo separado, recebendo uma linha json por sku
+  const processoPython = spawn('python', [caminhoScriptPython, '--ndjson', ...argumentosRastreamento()])
 
-  let previsoes = ''
+  let bufferSaida = ''
+  let linhaInvalida = null
   let erro = ''
+  const previsoesAnalisadas = []
+  const salvamentos = []
+
+  // converte uma linha de saída e já salva a previsão no banco, sem esperar os demais skus
+  const processarLinha = linha => {
+    if (!linha.trim()) return
+    try {
+      const previsao = JSON.parse(linha)
+      previsoesAnalisadas.push(previsao)
+      salvamentos.push(
+        salvarPrevisao(previsao, idUsuario).catch(erroSalvar => {
+          console.error(`Erro ao salvar previsão para SKU ${previsao.sku}:`, erroSalvar)
+          return null
+        })
+      )
+    } catch (erroParse) {
+      linhaInvalida = linha
+    }
+  }
 
   // envia os dados csv para o script python
   processoPython.stdin.write(csvData)
   processoPython.stdin.end()
 
-  // captura a saída do script (previsões em json)
+  // captura a saída do script linha a linha (cada linha é a previsão de um sku)
   processoPython.stdout.on('data', dados => {
-    previsoes += dados.toString()
+    bufferSaida += dados.toString()
+    const linhas = bufferSaida.split('\n')
+    bufferSaida = linhas.pop()
+    linhas.forEach(processarLinha)
   })
 
   // captura erros se houver
@@ -183,6 +245,9 @@ const getPrevisao = async (req, res) => {
 
   // quando o script python termina
   processoPython.on('close', async codigo => {
+    processarLinha(bufferSaida)
+    erro = registrarRastreamento(erro)
+
     if (codigo !== 0) {
       console.error(`Encerrado com o seguinte código: ${codigo}`)
       console.error(erro)
@@ -191,30 +256,21 @@ const getPrevisao = async (req, res) => {
         .json({ error: 'Falha ao executar o modelo de previsão.', details: erro })
     }
 
-    try {
-      // converte a resposta json do python
-      const previsoesAnalisadas = JSON.parse(previsoes)
-
-      // salva cada previsão no banco de dados
-      const previsoesSalvas = []
-      for (const previsao of previsoesAnalisadas) {
-        try {
-          const previsaoSalva = await salvarPrevisao(previsao, idUsuario)
-          previsoesSalvas.push(previsaoSalva)
-        } catch (erroSalvar) {
-          console.error(`Erro ao salvar previsão para SKU ${previsao.sku}:`, erroSalvar)
-        }
-      }
-
-      // retorna as previsões e informações sobre o que foi salvo
-      res.json({
-        previsoes: previsoesAnalisadas,
-        salvas_bd: previsoesSalvas.length,
-        total_geradas: previsoesAnalisadas.length,
-      })
-    } catch (erro) {
-      res.status(500).json({ error: 'Falha ao analisar previsões do script.', details: previsoes })
+    if (linhaInvalida !== null) {
+      return res
+        .status(500)
+        .json({ error: 'Falha ao analisar previsões do script.', details: linhaInvalida })
     }
+
+    // aguarda os salvamentos iniciados durante a execução
+    const previsoesSalvas = (await Promise.all(salvamentos)).filter(Boolean)
+
+    // retorna as previsões e informações sobre o que foi salvo
+    res.json({
+      previsoes: previsoesAnalisadas,
+      salvas_bd: previsoesSalvas.length,
+      total_geradas: previsoesAnalisadas.length,
+    })
   })
 }
 
@@ -268,51 +324,57 @@ const getDefaultPrevisao = async (req, res) => {
 
     const dadosCsv = await fsp.readFile(caminhoArquivoCsv, 'utf8')
 
-    // encapsula a execução do script python em uma promise
-    const previsoesAnalisadas = await new Promise((resolve, reject) => {
-      const processoPython = spawn('python', [caminhoScriptPython])
+    // usa o worker persistente quando disponível
+    let previsoesAnalisadas = await preverComWorker(dadosCsv)
 
-      let previsoes = ''
-      let erroPython = ''
+    // senão encapsula a execução do script python em uma promise
+    if (!previsoesAnalisadas) {
+      previsoesAnalisadas = await new Promise((resolve, reject) => {
+        const processoPython = spawn('python', [caminhoScriptPython, ...argumentosRastreamento()])
 
-      processoPython.stdin.write(dadosCsv)
-      processoPython.stdin.end()
+        let previsoes = ''
+        let erroPython = ''
 
-      processoPython.stdout.on('data', dados => {
-        previsoes += dados.toString()
-      })
+        processoPython.stdin.write(dadosCsv)
+        processoPython.stdin.end()
 
-      processoPython.stderr.on('data', dados => {
-        erroPython += dados.toString()
-      })
+        processoPython.stdout.on('data', dados => {
+          previsoes += dados.toString()
+        })
 
-      processoPython.on('error', err => {
-        reject({
-          status: 500,
-          json: { error: 'Falha ao iniciar o processo python.', details: err.message },
+        processoPython.stderr.on('data', dados => {
+          erroPython += dados.toString()
         })
-      })
 
-      processoPython.on('close', codigo => {
-        if (codigo !== 0) {
-          console.error(`Script Python encerrado com código ${codigo}: ${erroPython}`)
+        processoPython.on('error', err => {
           reject({
             status: 500,
-            json: { error: 'Falha ao executar o modelo de previsão.', details: erroPython },
+            json: { error: 'Falha ao iniciar o processo python.', details: err.message },
           })
-        } else {
-          try {
-            const resultado = JSON.parse(previsoes)
-            resolve(resultado)
-          } catch (erroParse) {
+        })
+
+        processoPython.on('close', codigo => {
+          erroPython = registrarRastreamento(erroPython)
+          if (codigo !== 0) {
+            console.error(`Script Python encerrado com código ${codigo}: ${erroPython}`)
             reject({
               status: 500,
-              json: { error: 'Falha ao analisar previsões do script.', details: previsoes },
+              json: { error: 'Falha ao executar o modelo de previsão.', details: erroPython },
             })
+          } else {
+            try {
+              const resultado = JSON.parse(previsoes)
+              resolve(resultado)
+            } catch (erroParse) {
+              reject({
+                status: 500,
+                json: { error: 'Falha ao analisar previsões do script.', details: previsoes },
+              })
+            }
           }
-        }
+        })
       })
-    })
+    }
 
     // 4. atualiza o cache com os novos dados
     cachePrevisao.dados = previsoesAnalisadas
@@ -488,6 +550,7 @@ const getRelatorioDiario = async (req, res) => {
         caminhoArquivoCsv,
         sku,
         data_alvo,
+        ...argumentosRastreamento(),
       ])
 
       let resultado = ''
@@ -509,6 +572,7 @@ const getRelatorioDiario = async (req, res) => {
       })
 
       processoPython.on('close', codigo => {
+        erro = registrarRastreamento(erro)
         if (codigo !== 0) {
           console.error(`Script Python encerrado com código ${codigo}: ${erro}`)
           reject({
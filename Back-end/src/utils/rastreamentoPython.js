@@ -0,0 +1,46 @@
+// rastreamento das etapas do script python de previsão (opção --rastrear)
+// o script emite no stderr uma linha json por etapa (leitura, preparação, treino, previsão, métricas, saída)
+// com duração, linhas e pico de memória; aqui essas linhas são separadas das mensagens de erro e vão para o log
+const winston = require('winston')
+
+// ligado com PREVISAO_RASTREAR=1 no .env
+const RASTREAR_PREVISAO = process.env.PREVISAO_RASTREAR === '1'
+
+const logger = winston.createLogger({
+  level: 'info',
+  format: winston.format.combine(winston.format.timestamp(), winston.format.json()),
+  defaultMeta: { servico: 'previsao-python' },
+  transports: [
+    new winston.transports.Console(),
+    new winston.transports.File({ filename: 'logs/previsao.log' }),
+  ],
+})
+
+// argumentos extras para o spawn do script python
+const argumentosRastreamento = () => (RASTREAR_PREVISAO ? ['--rastrear'] : [])
+
+// registra as linhas de rastreamento do stderr no log e devolve o restante do texto (erros e avisos)
+const registrarRastreamento = textoStderr => {
+  if (!RASTREAR_PREVISAO || !textoStderr) return textoStderr
+
+  const restante = []
+  textoStderr.split('\n').forEach(linha => {
+    if (linha.startsWith('{"tipo": "rastreamento"')) {
+      try {
+        const registro = JSON.parse(linha)
+        logger.info(`etapa ${registro.etapa}`, registro)
+        return
+      } catch (erroParse) {
+        // linha incompleta: mantém junto das demais mensagens
+      }
+    }
+    restante.push(linha)
+  })
+
+  return restante.join('\n')
+}
+
+module.exports = {
+  argumentosRastreamento,
+  registrarRastreamento,
+}
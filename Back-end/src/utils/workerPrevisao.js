@@ -0,0 +1,95 @@
+// cliente do worker python persistente de previsões (python run_prophet.py --servidor)
+// evita iniciar um processo python novo a cada requisição de previsão
+const net = require('net')
+
+const HOST_WORKER = process.env.PREVISAO_WORKER_HOST || '127.0.0.1'
+const PORTA_WORKER = process.env.PREVISAO_WORKER_PORTA
+const TIMEOUT_WORKER_MS = 10 * 60 * 1000
+// cada consulta aguarda no máximo este tempo pelo fim do trabalho antes de responder o andamento
+const ESPERA_CONSULTA_S = 5
+
+let proximoId = 1
+
+// o worker só é usado quando a porta estiver configurada no .env
+const workerConfigurado = () => Boolean(PORTA_WORKER)
+
+// envia uma mensagem json por linha e aguarda a resposta com o mesmo id
+const enviarMensagem = (mensagem, timeoutMs = TIMEOUT_WORKER_MS) =>
+  new Promise((resolve, reject) => {
+    const id = proximoId++
+    const conexao = net.createConnection({ host: HOST_WORKER, port: Number(PORTA_WORKER) })
+    let buffer = ''
+
+    conexao.setTimeout(timeoutMs, () => {
+      conexao.destroy()
+      reject(new Error('Tempo esgotado aguardando o worker de previsão.'))
+    })
+
+    conexao.on('connect', () => {
+      conexao.write(JSON.stringify({ ...mensagem, id }) + '\n')
+    })
+
+    conexao.on('data', dados => {
+      buffer += dados.toString()
+      const fimLinha = buffer.indexOf('\n')
+      if (fimLinha === -1) return
+
+      conexao.end()
+      try {
+        const resposta = JSON.parse(buffer.slice(0, fimLinha))
+        if (!resposta.ok) {
+          return reject(new Error(resposta.erro || 'Erro no worker de previsão.'))
+        }
+        resolve(resposta)
+      } catch (erro) {
+        reject(erro)
+      }
+    })
+
+    conexao.on('error', reject)
+  })
+
+// verifica se o worker está no ar e pronto para receber previsões
+const verificarSaudeWorker = async () => {
+  if (!workerConfigurado()) return false
+  try {
+    const resposta = await enviarMensagem({ acao: 'saude' }, 2000)
+    return resposta.status === 'pronto'
+  } catch (erro) {
+    return false
+  }
+}
+
+// coloca o csv na fila de previsões do worker; pedidos iguais ainda em andamento viram o mesmo trabalho
+// prioridade: números menores são atendidos primeiro (padrão 5)
+const enviarPrevisaoWorker = async (csvData, prioridade) => {
+  const mensagem = { acao: 'enviar', csv: csvData }
+  if (prioridade !== undefined) mensagem.prioridade = prioridade
+  return enviarMensagem(mensagem)
+}
+
+// estado de um trabalho (na_fila, executando, concluido, erro), com o resultado quando concluído
+const consultarPrevisaoWorker = async (trabalho, esperaS = 0) =>
+  enviarMensagem({ acao: 'resultado', trabalho, esperar: esperaS }, (esperaS + 30) * 1000)
+
+// gera previsões para o csv informado e devolve o mesmo json do modo stdin;
+// envia o trabalho e consulta o andamento em vez de manter uma conexão aberta até o fim
+const preverNoWorker = async (csvData, prioridade) => {
+  const limite = Date.now() + TIMEOUT_WORKER_MS
+  const { trabalho } = await enviarPrevisaoWorker(csvData, prioridade)
+
+  while (Date.now() < limite) {
+    const resposta = await consultarPrevisaoWorker(trabalho, ESPERA_CONSULTA_S)
+    if (resposta.estado === 'concluido') return resposta.resultado
+    if (resposta.estado === 'erro') throw new Error(resposta.erro || 'Erro no worker de previsão.')
+  }
+  throw new Error('Tempo esgotado aguardando o worker de previsão.')
+}
+
+module.exports = {
+  workerConfigurado,
+  verificarSaudeWorker,
+  enviarPrevisaoWorker,
+  consultarPrevisaoWorker,
+  preverNoWorker,
+}
@@ -0,0 +1,105 @@
+# histórico de vendas em parquet (colunar): convertido uma vez a partir do csv/xlsx e lido depois
+# só com as colunas usadas e só com os skus e o período pedidos
+# o conjunto é particionado por ano (pasta ano=AAAA) e ordenado por sku e data, de forma que as
+# estatísticas de cada grupo de linhas permitem ao pyarrow pular os grupos de outros skus
+import argparse
+import os
+import sys
+
+from importacao import importar_sob_demanda
+from ingestao import COLUNAS_VENDAS, carregar_arquivo_vendas, compactar_vendas
+
+pd = importar_sob_demanda("pandas")
+
+# linhas por grupo do parquet: grupos menores deixam o filtro por sku mais seletivo
+TAMANHO_GRUPO_LINHAS = 64_000
+
+# o armazém parquet depende do pyarrow (opcional)
+def parquet_disponivel():
+    try:
+        import pyarrow.dataset  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+# uma pasta (conjunto particionado) ou um arquivo .parquet é tratado como armazém parquet
+def eh_armazem_parquet(caminho):
+    return os.path.isdir(caminho) or os.path.splitext(caminho)[1].lower() == ".parquet"
+
+# converte o arquivo de vendas (csv ou xlsx) em um conjunto parquet particionado por ano
+def converter_para_parquet(origem, destino, tamanho_grupo=TAMANHO_GRUPO_LINHAS):
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+
+    dados = carregar_arquivo_vendas(origem)
+    dados = dados.dropna(subset=['data_dia']).astype({'id_produto': 'int64'})
+    dados = dados.sort_values(['id_produto', 'data_dia'], kind='stable', ignore_index=True)
+    dados['ano'] = dados['data_dia'].dt.year.astype('int32')
+
+    ds.write_dataset(
+        pa.Table.from_pandas(dados, preserve_index=False),
+        destino,
+        format='parquet',
+        partitioning=ds.partitioning(pa.schema([('ano', pa.int32())]), flavor='hive'),
+        max_rows_per_group=tamanho_grupo,
+        min_rows_per_group=min(tamanho_grupo, 16_384),
+        existing_data_behavior='delete_matching',
+    )
+    return len(dados)
+
+# monta o filtro empurrado para a leitura: skus, período e partições de ano do período
+def _montar_filtro(esquema, skus=None, data_inicial=None, data_final=None):
+    import pyarrow as pa
+    import pyarrow.compute as pc
+
+    condicoes = []
+    if skus is not None:
+        condicoes.append(pc.field('id_produto').isin(pa.array([int(sku) for sku in skus], type=pa.int64())))
+
+    tipo_data = esquema.field('data_dia').type
+    if data_inicial is not None:
+        data_inicial = pd.Timestamp(data_inicial)
+        condicoes.append(pc.field('data_dia') >= pa.scalar(data_inicial.to_pydatetime(), type=tipo_data))
+        if 'ano' in esquema.names:
+            condicoes.append(pc.field('ano') >= data_inicial.year)
+    if data_final is not None:
+        data_final = pd.Timestamp(data_final)
+        condicoes.append(pc.field('data_dia') <= pa.scalar(data_final.to_pydatetime(), type=tipo_data))
+        if 'ano' in esquema.names:
+            condicoes.append(pc.field('ano') <= data_final.year)
+
+    filtro = None
+    for condicao in condicoes:
+        filtro = condicao if filtro is None else filtro & condicao
+    return filtro
+
+# lê do armazém só as colunas de vendas, dos skus e do período pedidos, no mesmo formato de ler_csv_vendas
+def ler_vendas_parquet(caminho, skus=None, data_inicial=None, data_final=None):
+    import pyarrow.dataset as ds
+
+    conjunto = ds.dataset(caminho, format='parquet', partitioning='hive')
+    filtro = _montar_filtro(conjunto.schema, skus, data_inicial, data_final)
+    tabela = conjunto.to_table(columns=COLUNAS_VENDAS, filter=filtro)
+
+    # o armazém já está ordenado por sku e data dentro de cada partição de ano
+    dados = tabela.to_pandas().sort_values(['id_produto', 'data_dia'], kind='stable', ignore_index=True)
+    return compactar_vendas(dados)
+
+def ler_argumentos():
+    parser = argparse.ArgumentParser(description="Converte o histórico de vendas (csv/xlsx) em um armazém parquet")
+    parser.add_argument('origem', help="arquivo de vendas .csv ou .xlsx")
+    parser.add_argument('destino', help="pasta do armazém parquet (substitui as partições existentes)")
+    parser.add_argument('--tamanho-grupo', type=int, default=TAMANHO_GRUPO_LINHAS, help="linhas por grupo do parquet")
+    return parser.parse_args()
+
+def main():
+    args = ler_argumentos()
+    if not parquet_disponivel():
+        print("pyarrow não instalado: pip install pyarrow", file=sys.stderr)
+        sys.exit(1)
+
+    linhas = converter_para_parquet(args.origem, args.destino, args.tamanho_grupo)
+    print(f"{linhas} linhas gravadas em {args.destino}", file=sys.stderr)
+
+if __name__ == "__main__":
+    main()
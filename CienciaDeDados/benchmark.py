@@ -0,0 +1,637 @@
+# benchmark e backtest com origem móvel do pipeline de previsão:
+# treina em cada corte do histórico, prevê os dias seguintes e mede o erro fora da amostra (d+1..d+7),
+# o tempo de treino e a memória de pico por sku (python e processo do cmdstan); inclui um gerador de dados sintéticos
+# no formato de dados_vendas_itamind.csv para rodar com milhares de skus sem dados reais
+import argparse
+import json
+import os
+import pickle
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from functools import partial
+
+import numpy as np
+import pandas as pd
+
+from paralelo import executar_em_paralelo, obter_num_workers
+from ingestao import carregar_arquivo_vendas
+from preparacao import particionar_por_sku
+from main import treinar_modelo_prophet, gerar_previsao
+from modelos_rapidos import ajustar_modelo_global
+from previsao_rapida import prever_em_lote
+from memoria_compartilhada import publicar_tarefas, liberar
+from instrumentacao import memoria_pico_mb
+
+# configuração padrão do backtest
+NUM_CORTES = 3
+HORIZONTE = 7
+PASSO_DIAS = 7
+MINIMO_DIAS_TREINO = 28
+
+# orçamento de tempo (ms, mediana) das operações que não treinam modelos; o tempo do interpretador
+# vazio é medido junto para descontar a lentidão da máquina
+ORCAMENTO_INICIALIZACAO_MS = {
+    "ajuda": 300,
+    "retirada": 300,
+    "dia_semana": 1500,
+}
+PASTA_SCRIPTS = os.path.dirname(os.path.abspath(__file__))
+
+# pico de memória aceito na leitura + particionamento: uma parte fixa (bloco de TAMANHO_BLOCO linhas
+# em leitura, tabelas do pandas) mais uma parte proporcional ao tamanho do csv de entrada;
+# medido em 2026-10: de 42 mb (csv de 34 mb) a 288 mb (csv de 338 mb), variando até ~35 mb entre execuções
+LIMITE_MEMORIA_BASE_MB = 64
+LIMITE_MEMORIA_POR_ENTRADA = 0.8
+
+# quantidades de skus sintéticos (365 dias) em que o limite de memória é conferido
+SKUS_MEMORIA = (1000, 10000)
+
+# mede, em um processo novo, o acréscimo de memória residente de carregar o arquivo e particionar por sku
+_CODIGO_MEDICAO_MEMORIA = """
+import json, sys
+from ingestao import carregar_arquivo_vendas
+from instrumentacao import memoria_pico_mb
+from preparacao import particionar_por_sku
+import pandas as pd
+pd.DataFrame({"a": [1]}).sum()
+def rss():
+    # VmHWM é zerado no exec; ru_maxrss herda o pico do processo pai
+    try:
+        with open("/proc/self/status") as status:
+            for linha in status:
+                if linha.startswith("VmHWM:"):
+                    return int(linha.split()[1]) / 1024
+    except OSError:
+        pass
+    return memoria_pico_mb() or 0.0
+base = rss()
+dados = carregar_arquivo_vendas(sys.argv[1])
+leitura = rss()
+particoes = particionar_por_sku(dados)
+print(json.dumps({
+    "base_mb": base,
+    "leitura_mb": leitura - base,
+    "pico_mb": rss() - base,
+    "tabela_mb": dados.memory_usage(deep=True).sum() / 2 ** 20,
+    "linhas": len(dados),
+    "skus": len(particoes),
+}))
+"""
+
+# gera vendas diárias sintéticas com nível, tendência, sazonalidade semanal, ruído e dias sem venda,
+# nas mesmas colunas de dados_vendas_itamind.csv
+def gerar_dados_sinteticos(num_skus=100, num_dias=90, data_inicial="2025-03-25", semente=42):
+    gerador = np.random.default_rng(semente)
+    datas = pd.date_range(data_inicial, periods=num_dias, freq='D')
+    skus = 100000 + np.arange(num_skus)
+
+    # parâmetros de cada sku (volumes de poucos kg até centenas de kg por dia)
+    nivel = gerador.lognormal(mean=3.5, sigma=1.2, size=num_skus)
+    tendencia = gerador.normal(0, 0.002, size=num_skus)
+    padrao_semanal = 1 + gerador.normal(0, 0.15, size=(num_skus, 7))
+    padrao_semanal[:, 4:6] += 0.3  # sexta e sábado vendem mais
+
+    dias = np.arange(num_dias)
+    dia_semana = datas.weekday.to_numpy()
+    vendas = (
+        nivel[:, None]
+        * (1 + tendencia[:, None] * dias[None, :])
+        * padrao_semanal[:, dia_semana]
+        * gerador.lognormal(0, 0.2, size=(num_skus, num_dias))
+    )
+
+    # alguns dias sem registro de venda
+    presentes = gerador.random((num_skus, num_dias)) > 0.03
+
+    return pd.DataFrame({
+        "data_dia": np.tile(datas.to_numpy(), num_skus)[presentes.ravel()],
+        "id_produto": np.repeat(skus, num_dias)[presentes.ravel()],
+        "descricao_produto": "PRODUTO SINTETICO",
+        "total_venda_dia_kg": np.round(np.clip(vendas, 0, None), 2).ravel()[presentes.ravel()],
+        "Equipe responsavel": "ItaMind",
+    })
+
+# grava os dados sintéticos como csv no mesmo formato do arquivo de vendas real
+def salvar_csv_sintetico(dados, caminho):
+    # formata só as datas distintas e espalha o texto pelas linhas (strftime linha a linha é lento)
+    codigos, datas = pd.factorize(dados['data_dia'])
+    dados = dados.assign(data_dia=datas.strftime('%d/%m/%Y').to_numpy()[codigos])
+    dados.to_csv(caminho, sep=';', index=False, encoding='latin1', float_format='%.2f')
+
+# datas de corte do backtest: a última deixa um horizonte completo de dados reais depois dela
+def definir_cortes(dados_sku, num_cortes=NUM_CORTES, horizonte=HORIZONTE, passo=PASSO_DIAS, minimo_treino=MINIMO_DIAS_TREINO):
+    primeiro_dia = dados_sku['ds'].min()
+    ultimo_corte = dados_sku['ds'].max() - pd.Timedelta(days=horizonte)
+
+    cortes = []
+    for posicao in range(num_cortes):
+        corte = ultimo_corte - pd.Timedelta(days=passo * posicao)
+        if (corte - primeiro_dia).days < minimo_treino:
+            break
+        cortes.append(corte)
+
+    return sorted(cortes)
+
+# o primeiro treino de cada processo paga a importação do prophet e o carregamento do cmdstan;
+# um treino descartável antes do primeiro corte tira esse custo das medidas de tempo
+_worker_aquecido = False
+
+def _aquecer_worker():
+    global _worker_aquecido
+    if _worker_aquecido:
+        return
+    treinar_modelo_prophet(particionar_por_sku(gerar_dados_sinteticos(1, MINIMO_DIAS_TREINO * 2)).popitem()[1])
+    _worker_aquecido = True
+
+# pico de memória python (tracemalloc) de um treino + previsão, medido em uma passada separada
+# para não pesar no tempo; o processo do cmdstan não aparece no tracemalloc e é medido pelo rss
+# do maior processo filho já encerrado do worker (o cmdstan é o maior deles; kb no linux)
+def medir_memoria_treino(treino, horizonte=HORIZONTE):
+    tracemalloc.start()
+    try:
+        modelo = treinar_modelo_prophet(treino)
+        if modelo is not None:
+            gerar_previsao(modelo, horizonte)
+        _, memoria_pico = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    memoria_cmdstan = memoria_pico_mb(filhos=True)
+    return memoria_pico / (1024 * 1024), np.nan if memoria_cmdstan is None else memoria_cmdstan
+
+# treina com os dados até o corte e compara a previsão com os dados reais dos dias seguintes;
+# devolve os erros por horizonte e as medidas de tempo e memória desse treino
+# o tempo é medido sem tracemalloc e com o worker aquecido; a memória só no último corte de cada sku
+# (o de maior histórico), em uma segunda passada
+def avaliar_corte(dados_sku, chave, horizonte=HORIZONTE):
+    sku, corte = chave
+    _aquecer_worker()
+    inicio = time.perf_counter()
+
+    treino = dados_sku[dados_sku['ds'] <= corte]
+    reais = dados_sku[(dados_sku['ds'] > corte) & (dados_sku['ds'] <= corte + pd.Timedelta(days=horizonte))]
+
+    inicio_treino = time.perf_counter()
+    modelo = treinar_modelo_prophet(treino)
+    tempo_treino = time.perf_counter() - inicio_treino
+    if modelo is None:
+        return None
+
+    previsao = gerar_previsao(modelo, horizonte)
+    comparacao = reais.merge(previsao[['ds', 'yhat']], on='ds', how='inner')
+    tempo_total = time.perf_counter() - inicio
+
+    memoria_pico = memoria_cmdstan = np.nan
+    if corte == dados_sku['ds'].max() - pd.Timedelta(days=horizonte):
+        memoria_pico, memoria_cmdstan = medir_memoria_treino(treino, horizonte)
+
+    return {
+        "sku": int(sku),
+        "corte": corte.strftime('%Y-%m-%d'),
+        "horizonte": (comparacao['ds'] - corte).dt.days.tolist(),
+        "y": comparacao['y'].tolist(),
+        "yhat": comparacao['yhat'].tolist(),
+        "tempo_total_s": tempo_total,
+        "tempo_treino_s": tempo_treino,
+        "memoria_pico_mb": memoria_pico,
+        "memoria_cmdstan_mb": memoria_cmdstan,
+    }
+
+# backtest do modelo global: um único ajuste por corte para todos os skus que têm esse corte;
+# gera avaliações no mesmo formato de avaliar_corte, com o tempo do ajuste dividido entre os skus
+# e a memória de pico do ajuste conjunto
+def avaliar_global(tarefas, horizonte=HORIZONTE):
+    por_corte = {}
+    for (sku, corte), dados_sku in tarefas:
+        por_corte.setdefault(corte, {})[sku] = dados_sku
+
+    avaliacoes = []
+    for corte, particoes in sorted(por_corte.items()):
+        treinos = {sku: dados_sku[dados_sku['ds'] <= corte] for sku, dados_sku in particoes.items()}
+
+        tracemalloc.start()
+        inicio = time.perf_counter()
+        ajustes = ajustar_modelo_global(treinos, horizonte)
+        tempo_por_sku = (time.perf_counter() - inicio) / len(particoes)
+        _, memoria_pico = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        for sku, dados_sku in particoes.items():
+            reais = dados_sku[(dados_sku['ds'] > corte) & (dados_sku['ds'] <= corte + pd.Timedelta(days=horizonte))]
+            comparacao = reais.merge(ajustes[sku]["previsao"][['ds', 'yhat']], on='ds', how='inner')
+            avaliacoes.append({
+                "sku": int(sku),
+                "corte": corte.strftime('%Y-%m-%d'),
+                "horizonte": (comparacao['ds'] - corte).dt.days.tolist(),
+                "y": comparacao['y'].tolist(),
+                "yhat": comparacao['yhat'].tolist(),
+                "tempo_total_s": tempo_por_sku,
+                "tempo_treino_s": tempo_por_sku,
+                "memoria_pico_mb": memoria_pico / (1024 * 1024),
+                "memoria_cmdstan_mb": np.nan,
+            })
+
+    return avaliacoes
+
+# tempo do ajuste global com quantidades crescentes de skus sintéticos (mostra o custo por sku caindo)
+def medir_escala_global(quantidades=(100, 1000, 10000), num_dias=365, horizonte=HORIZONTE):
+    escala = []
+    for num_skus in quantidades:
+        particoes = particionar_por_sku(gerar_dados_sinteticos(num_skus, num_dias))
+        inicio = time.perf_counter()
+        ajustar_modelo_global(particoes, horizonte)
+        tempo = time.perf_counter() - inicio
+        escala.append({
+            "skus": num_skus,
+            "tempo_s": tempo,
+            "tempo_por_sku_ms": tempo / num_skus * 1000,
+        })
+    return escala
+
+# latência da previsão por sku com históricos crescentes: predict completo do prophet,
+# modo rápido com amostras de incerteza, modo rápido com intervalo analítico e lote com todos os skus
+def medir_previsao(tamanhos=(90, 365, 730), num_skus=10, horizonte=HORIZONTE, amostras=1000):
+    medicoes = []
+    for num_dias in tamanhos:
+        particoes = particionar_por_sku(gerar_dados_sinteticos(num_skus, num_dias))
+        modelos = [(sku, treinar_modelo_prophet(dados_sku)) for sku, dados_sku in particoes.items()]
+
+        # uma execução de aquecimento antes (grades de sazonalidade já montadas, como num processo em uso)
+        def cronometrar(funcao):
+            funcao()
+            inicio = time.perf_counter()
+            funcao()
+            return (time.perf_counter() - inicio) / num_skus * 1000
+
+        def predict_completo():
+            for _, modelo in modelos:
+                modelo.uncertainty_samples = amostras
+                modelo.predict(modelo.make_future_dataframe(periods=horizonte))
+
+        medicoes.append({
+            "dias_historico": num_dias,
+            "completo_ms_por_sku": cronometrar(predict_completo),
+            "rapido_ms_por_sku": cronometrar(
+                lambda: [prever_em_lote([item], horizonte, amostras) for item in modelos]),
+            "analitico_ms_por_sku": cronometrar(
+                lambda: [prever_em_lote([item], horizonte, 0) for item in modelos]),
+            "lote_analitico_ms_por_sku": cronometrar(lambda: prever_em_lote(modelos, horizonte, 0)),
+        })
+    return medicoes
+
+# tarefa vazia usada para medir só o custo de levar os dados até os workers
+def _contar_linhas(dados_sku, sku):
+    return len(dados_sku)
+
+# custo de despachar um sku para os workers com e sem memória compartilhada, com históricos crescentes:
+# bytes serializados por tarefa e tempo total de uma passada com uma função que não faz nada
+def medir_despacho(tamanhos=(90, 365, 1095), num_skus=2000, num_workers=None):
+    medicoes = []
+    valor_anterior = os.environ.get('ITAMIND_MEMORIA_COMPARTILHADA')
+    try:
+        for num_dias in tamanhos:
+            tarefas = list(particionar_por_sku(gerar_dados_sinteticos(num_skus, num_dias)).items())
+            caminho, compartilhadas = publicar_tarefas(tarefas)
+            medicao = {
+                "dias_historico": num_dias,
+                "bytes_por_tarefa_serializada": len(pickle.dumps(tarefas[0])),
+                "bytes_por_tarefa_compartilhada": len(pickle.dumps(compartilhadas[0])),
+            }
+            liberar(caminho)
+
+            for nome, ativa in (("serializada", "0"), ("compartilhada", "1")):
+                os.environ['ITAMIND_MEMORIA_COMPARTILHADA'] = ativa
+                inicio = time.perf_counter()
+                for _ in executar_em_paralelo(_contar_linhas, tarefas, num_workers):
+                    pass
+                medicao[f"tempo_{nome}_s"] = time.perf_counter() - inicio
+            medicoes.append(medicao)
+    finally:
+        if valor_anterior is None:
+            os.environ.pop('ITAMIND_MEMORIA_COMPARTILHADA', None)
+        else:
+            os.environ['ITAMIND_MEMORIA_COMPARTILHADA'] = valor_anterior
+    return medicoes
+
+# rmse e mape (%) fora da amostra para cada horizonte d+1..d+n;
+# dias sem venda ficam fora do mape (o erro percentual não é definido para y = 0)
+def metricas_por_horizonte(avaliacoes):
+    erros = pd.DataFrame({
+        "horizonte": np.concatenate([avaliacao["horizonte"] for avaliacao in avaliacoes]),
+        "y": np.concatenate([avaliacao["y"] for avaliacao in avaliacoes]),
+        "yhat": np.concatenate([avaliacao["yhat"] for avaliacao in avaliacoes]),
+    })
+    erros['quadrado'] = (erros['y'] - erros['yhat']) ** 2
+    erros['percentual'] = ((erros['y'] - erros['yhat']).abs() / erros['y']).where(erros['y'] > 0)
+
+    agrupado = erros.groupby('horizonte')
+    return {
+        f"D+{int(horizonte)}": {
+            "rmse": float(np.sqrt(quadrado)),
+            "mape": float(percentual * 100),
+            "amostras": int(amostras),
+        }
+        for horizonte, quadrado, percentual, amostras in zip(
+            agrupado.size().index,
+            agrupado['quadrado'].mean(),
+            agrupado['percentual'].mean(),
+            agrupado.size(),
+        )
+    }
+
+# resume tempos e memória por sku (tempos somados nos cortes de cada sku, memória do corte medido)
+def resumir_recursos(avaliacoes):
+    recursos = pd.DataFrame([
+        {chave: avaliacao[chave] for chave in
+         ["sku", "tempo_total_s", "tempo_treino_s", "memoria_pico_mb", "memoria_cmdstan_mb"]}
+        for avaliacao in avaliacoes
+    ])
+    por_sku = recursos.groupby('sku').agg(
+        tempo_total_s=('tempo_total_s', 'sum'),
+        tempo_treino_s=('tempo_treino_s', 'sum'),
+        memoria_pico_mb=('memoria_pico_mb', 'max'),
+        memoria_cmdstan_mb=('memoria_cmdstan_mb', 'max'),
+    )
+
+    resumo = {
+        "skus": len(por_sku),
+        "treinos": len(recursos),
+        "tempo_por_sku_s": {
+            "media": float(por_sku['tempo_total_s'].mean()),
+            "p95": float(por_sku['tempo_total_s'].quantile(0.95)),
+        },
+        "tempo_treino_por_sku_s": {
+            "media": float(por_sku['tempo_treino_s'].mean()),
+            "p95": float(por_sku['tempo_treino_s'].quantile(0.95)),
+        },
+        "memoria_pico_por_sku_mb": {
+            "media": float(por_sku['memoria_pico_mb'].mean()),
+            "maximo": float(por_sku['memoria_pico_mb'].max()),
+        },
+    }
+    # o modelo global não usa o cmdstan
+    if por_sku['memoria_cmdstan_mb'].notna().any():
+        resumo["memoria_cmdstan_mb"] = {"maximo": float(por_sku['memoria_cmdstan_mb'].max())}
+    return resumo
+
+# executa o backtest de todos os skus, com cortes e skus distribuídos entre os processos
+# motor: "prophet" (um modelo por sku), "global" (um ajuste conjunto por corte) ou "ambos", lado a lado
+def executar_backtest(dados_brutos, num_cortes=NUM_CORTES, horizonte=HORIZONTE, passo=PASSO_DIAS,
+                      num_workers=None, max_skus=None, motor="prophet"):
+    inicio = time.perf_counter()
+
+    particoes = particionar_por_sku(dados_brutos)
+    if max_skus:
+        particoes = dict(list(particoes.items())[:max_skus])
+    tempo_preparacao = time.perf_counter() - inicio
+
+    # uma tarefa por combinação sku x corte
+    tarefas = [
+        ((sku, corte), dados_sku)
+        for sku, dados_sku in particoes.items()
+        if len(dados_sku) >= 10
+        for corte in definir_cortes(dados_sku, num_cortes, horizonte, passo)
+    ]
+
+    avaliacoes_por_motor = {}
+    tempos_por_motor = {}
+    if motor in ("prophet", "ambos"):
+        inicio_motor = time.perf_counter()
+        funcao = partial(avaliar_corte, horizonte=horizonte)
+        avaliacoes_por_motor["prophet"] = [
+            avaliacao
+            for _, avaliacao in executar_em_paralelo(funcao, tarefas, num_workers)
+            if avaliacao is not None
+        ]
+        tempos_por_motor["prophet"] = time.perf_counter() - inicio_motor
+    if motor in ("global", "ambos"):
+        inicio_motor = time.perf_counter()
+        avaliacoes_por_motor["global"] = avaliar_global(tarefas, horizonte)
+        tempos_por_motor["global"] = time.perf_counter() - inicio_motor
+
+    if not any(avaliacoes_por_motor.values()):
+        return {"erro": "Nenhum SKU com histórico suficiente para o backtest"}
+
+    resultado = {
+        "configuracao": {
+            "cortes": num_cortes,
+            "horizonte": horizonte,
+            "passo_dias": passo,
+            "workers": obter_num_workers(num_workers),
+            "motor": motor,
+        },
+    }
+    for nome, avaliacoes in avaliacoes_por_motor.items():
+        bloco = {
+            "metricas_por_horizonte": metricas_por_horizonte(avaliacoes),
+            "recursos": resumir_recursos(avaliacoes),
+            "tempo_motor_s": tempos_por_motor[nome],
+        }
+        # com os dois motores cada um tem sua seção; com um só o formato é o mesmo de antes
+        if motor == "ambos":
+            resultado[nome] = bloco
+        else:
+            resultado.update(bloco)
+
+    resultado.update({
+        "tempo_preparacao_s": tempo_preparacao,
+        "tempo_total_s": time.perf_counter() - inicio,
+        # pico de memória residente do processo principal (None quando a plataforma não permite medir)
+        "memoria_maxima_processo_mb": memoria_pico_mb(),
+    })
+    return resultado
+
+# mede o tempo de inicialização das operações rápidas em processos novos (como o node as chama)
+# e compara a mediana, descontado o interpretador vazio, com ORCAMENTO_INICIALIZACAO_MS
+def medir_inicializacao(repeticoes=5, arquivo=None, sku=None):
+    arquivo = arquivo or os.path.join(PASTA_SCRIPTS, 'dados_vendas_itamind.csv')
+    sku = sku or 237479
+    comandos = {
+        "interpretador": [sys.executable, "-c", "pass"],
+        "ajuda": [sys.executable, "main.py", "--help"],
+        "retirada": [sys.executable, "main.py", "--retirada", "100"],
+        "dia_semana": [sys.executable, "main.py", "--dia-semana", "sexta", "--arquivo", arquivo, "--sku", str(sku)],
+    }
+
+    medianas = {}
+    for nome, comando in comandos.items():
+        tempos = []
+        for _ in range(repeticoes):
+            inicio = time.perf_counter()
+            subprocess.run(comando, cwd=PASTA_SCRIPTS, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, check=True)
+            tempos.append((time.perf_counter() - inicio) * 1000)
+        medianas[nome] = float(np.median(tempos))
+
+    interpretador = medianas.pop("interpretador")
+    return {
+        "interpretador_ms": round(interpretador, 1),
+        "operacoes": {
+            nome: {
+                "mediana_ms": round(mediana, 1),
+                "acima_do_interpretador_ms": round(mediana - interpretador, 1),
+                "orcamento_ms": ORCAMENTO_INICIALIZACAO_MS[nome],
+                "dentro_do_orcamento": mediana - interpretador <= ORCAMENTO_INICIALIZACAO_MS[nome],
+            }
+            for nome, mediana in medianas.items()
+        },
+    }
+
+# regressão de memória: o pico da ingestão compacta (leitura + particionamento) não pode passar de
+# LIMITE_MEMORIA_BASE_MB + LIMITE_MEMORIA_POR_ENTRADA vezes o tamanho do csv; sem arquivo usa um csv sintético
+def medir_memoria(arquivo=None, num_skus=10000, num_dias=365, base_mb=LIMITE_MEMORIA_BASE_MB,
+                  por_entrada=LIMITE_MEMORIA_POR_ENTRADA):
+    with tempfile.TemporaryDirectory() as pasta:
+        if arquivo is None:
+            arquivo = os.path.join(pasta, 'vendas_sinteticas.csv')
+            salvar_csv_sintetico(gerar_dados_sinteticos(num_skus, num_dias), arquivo)
+
+        saida = subprocess.run(
+            [sys.executable, "-c", _CODIGO_MEDICAO_MEMORIA, os.path.abspath(arquivo)],
+            cwd=PASTA_SCRIPTS, capture_output=True, text=True, check=True
+        ).stdout
+        medicao = json.loads(saida.strip().splitlines()[-1])
+        tamanho_entrada = os.path.getsize(arquivo) / 2 ** 20
+
+    medicao = {chave: round(valor, 1) if isinstance(valor, float) else valor for chave, valor in medicao.items()}
+    medicao["entrada_mb"] = round(tamanho_entrada, 1)
+    medicao["pico_por_entrada"] = round(medicao["pico_mb"] / tamanho_entrada, 2)
+    medicao["limite_mb"] = round(base_mb + por_entrada * tamanho_entrada, 1)
+    medicao["dentro_do_limite"] = medicao["pico_mb"] <= medicao["limite_mb"]
+    return medicao
+
+# confere o limite de memória em vários tamanhos de entrada (um único ponto não separa a parte fixa
+# da proporcional); com arquivo mede só ele
+def conferir_memoria(arquivo=None, quantidades=SKUS_MEMORIA, num_dias=365):
+    if arquivo:
+        medicoes = [medir_memoria(arquivo)]
+    else:
+        medicoes = [medir_memoria(num_skus=num_skus, num_dias=num_dias) for num_skus in quantidades]
+    return {
+        "limite": {"base_mb": LIMITE_MEMORIA_BASE_MB, "por_entrada": LIMITE_MEMORIA_POR_ENTRADA},
+        "medicoes": medicoes,
+        "dentro_do_limite": all(medicao["dentro_do_limite"] for medicao in medicoes),
+    }
+
+# regressão do intervalo sem amostras: com --amostras-incerteza 0 e sem --previsao-rapida os dois scripts
+# precisam devolver todos os skus com yhat_lower/yhat_upper (o predict completo do prophet não os gera)
+def conferir_sem_amostras(arquivo=None, num_skus=3, num_dias=90):
+    with tempfile.TemporaryDirectory() as pasta:
+        if arquivo is None:
+            arquivo = os.path.join(pasta, 'vendas_sinteticas.csv')
+            salvar_csv_sintetico(gerar_dados_sinteticos(num_skus, num_dias), arquivo)
+        esperados = len(particionar_por_sku(carregar_arquivo_vendas(arquivo)))
+
+        scripts = {}
+        for script in ("main.py", "run_prophet.py"):
+            with open(arquivo, 'rb') as entrada:
+                saida = subprocess.run(
+                    [sys.executable, script, "--sem-cache", "--amostras-incerteza", "0", "--workers", "1"],
+                    cwd=PASTA_SCRIPTS, stdin=entrada, capture_output=True, check=True
+                ).stdout
+            resultados = json.loads(saida)
+            scripts[script] = {
+                "skus": len(resultados),
+                "esperados": esperados,
+                "com_intervalo": bool(resultados) and all(
+                    previsao.get("yhat_lower") is not None and previsao.get("yhat_upper") is not None
+                    for resultado in resultados for previsao in resultado["previsoes"]
+                ),
+            }
+    return {
+        "scripts": scripts,
+        "ok": all(item["skus"] == item["esperados"] and item["com_intervalo"] for item in scripts.values()),
+    }
+
+def ler_argumentos():
+    parser = argparse.ArgumentParser(description="Backtest com origem móvel e benchmark do pipeline de previsão")
+    parser.add_argument('--arquivo', help="arquivo de vendas (.csv/.xlsx); sem ele usa dados sintéticos")
+    parser.add_argument('--skus', type=int, default=20, help="quantidade de skus sintéticos (ou limite de skus do arquivo)")
+    parser.add_argument('--dias', type=int, default=90, help="dias de histórico sintético")
+    parser.add_argument('--semente', type=int, default=42)
+    parser.add_argument('--cortes', type=int, default=NUM_CORTES)
+    parser.add_argument('--horizonte', type=int, default=HORIZONTE)
+    parser.add_argument('--passo', type=int, default=PASSO_DIAS, help="dias entre cortes consecutivos")
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--motor', choices=["prophet", "global", "ambos"], default="prophet",
+                        help="motor avaliado no backtest: prophet por sku, modelo global ou os dois lado a lado")
+    parser.add_argument('--escala-global', action='store_true',
+                        help="mede só o tempo do modelo global com 100, 1.000 e 10.000 skus sintéticos")
+    parser.add_argument('--previsao', action='store_true',
+                        help="mede só a latência da previsão por sku (completa x rápida x lote) com 90, 365 e 730 dias")
+    parser.add_argument('--despacho', action='store_true',
+                        help="mede o custo de levar os históricos aos workers, serializados x em memória compartilhada")
+    parser.add_argument('--gerar-csv', metavar='CAMINHO', help="apenas grava os dados sintéticos em um csv e sai")
+    parser.add_argument('--inicializacao', action='store_true',
+                        help="mede só o tempo de inicialização das operações rápidas contra o orçamento")
+    parser.add_argument('--memoria', action='store_true',
+                        help="mede só o pico de memória da ingestão em relação ao tamanho do csv")
+    parser.add_argument('--skus-memoria', type=int, nargs='+', default=list(SKUS_MEMORIA), metavar='N',
+                        help="quantidades de skus sintéticos usadas por --memoria (padrão: %(default)s)")
+    parser.add_argument('--sem-amostras', action='store_true',
+                        help="confere só que os scripts devolvem o intervalo com --amostras-incerteza 0")
+    parser.add_argument('--saida', metavar='CAMINHO', help="grava o resultado em json neste arquivo")
+    return parser.parse_args()
+
+def main():
+    args = ler_argumentos()
+
+    if args.memoria:
+        resultado = conferir_memoria(args.arquivo, args.skus_memoria, num_dias=max(args.dias, 365))
+        print(json.dumps(resultado, indent=2, ensure_ascii=False))
+        if not resultado["dentro_do_limite"]:
+            sys.exit(1)
+        return
+
+    if args.escala_global:
+        print(json.dumps(medir_escala_global(num_dias=max(args.dias, 365), horizonte=args.horizonte), indent=2))
+        return
+
+    if args.previsao:
+        print(json.dumps(medir_previsao(num_skus=min(args.skus, 10), horizonte=args.horizonte), indent=2))
+        return
+
+    if args.despacho:
+        print(json.dumps(medir_despacho(num_workers=args.workers), indent=2))
+        return
+
+    if args.inicializacao:
+        resultado = medir_inicializacao(arquivo=args.arquivo)
+        print(json.dumps(resultado, indent=2, ensure_ascii=False))
+        if not all(operacao["dentro_do_orcamento"] for operacao in resultado["operacoes"].values()):
+            sys.exit(1)
+        return
+
+    if args.sem_amostras:
+        resultado = conferir_sem_amostras(args.arquivo)
+        print(json.dumps(resultado, indent=2, ensure_ascii=False))
+        if not resultado["ok"]:
+            sys.exit(1)
+        return
+
+    if args.arquivo:
+        dados_brutos = carregar_arquivo_vendas(args.arquivo)
+        max_skus = args.skus
+    else:
+        dados_brutos = gerar_dados_sinteticos(args.skus, args.dias, semente=args.semente)
+        max_skus = None
+
+    if args.gerar_csv:
+        salvar_csv_sintetico(dados_brutos, args.gerar_csv)
+        print(f"Dados sintéticos gravados em {args.gerar_csv} ({len(dados_brutos)} linhas)", file=sys.stderr)
+        return
+
+    resultado = executar_backtest(
+        dados_brutos, args.cortes, args.horizonte, args.passo,
+        num_workers=args.workers, max_skus=max_skus, motor=args.motor
+    )
+
+    saida = json.dumps(resultado, indent=2, ensure_ascii=False)
+    if args.saida:
+        with open(args.saida, 'w', encoding='utf-8') as arquivo:
+            arquivo.write(saida)
+    print(saida)
+
+if __name__ == "__main__":
+    main()
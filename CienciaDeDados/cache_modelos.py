@@ -0,0 +1,116 @@
+# cache em disco dos modelos prophet treinados, indexado por sku + impressão digital dos dados
+# um sku cujo histórico e parâmetros não mudaram reaproveita o modelo salvo em vez de ser retreinado
+import hashlib
+import json
+import os
+import sys
+import tempfile
+
+from importacao import importar_sob_demanda
+
+np = importar_sob_demanda("numpy")
+pd = importar_sob_demanda("pandas")
+
+# pasta padrão do cache (pode ser trocada pela variável ITAMIND_CACHE_MODELOS)
+PASTA_PADRAO = os.path.join(os.path.dirname(os.path.abspath(__file__)), '.cache_modelos')
+
+# limites padrão do cache antes de descartar os modelos usados há mais tempo
+TAMANHO_MAXIMO_MB = 200
+MAXIMO_MODELOS = 5000
+
+# prefixo dos modelos de validação (treinados sem os últimos dias, motor auto): ficam fora das chaves
+# do sku, então não servem de modelo do sku nem de ponto de partida para o treino incremental
+PREFIXO_VALIDACAO = "validacao-"
+
+# chave do cache para o modelo de validação do sku
+def chave_validacao(sku):
+    return f"{PREFIXO_VALIDACAO}{sku}"
+
+# pasta onde os modelos são gravados
+def obter_pasta_cache():
+    return os.environ.get('ITAMIND_CACHE_MODELOS', PASTA_PADRAO)
+
+# o cache pode ser desligado com ITAMIND_CACHE_MODELOS_ATIVO=0
+def cache_ativo():
+    return os.environ.get('ITAMIND_CACHE_MODELOS_ATIVO', '1') != '0'
+
+# gera um hash do histórico preparado (ds, y), dos parâmetros do modelo e dos feriados
+def calcular_impressao_digital(dados_sku, parametros, feriados=None):
+    hash_dados = hashlib.sha256()
+    hash_dados.update(dados_sku['ds'].to_numpy(dtype='datetime64[ns]').view(np.int64).tobytes())
+    hash_dados.update(dados_sku['y'].to_numpy(dtype=np.float64).tobytes())
+    hash_dados.update(json.dumps(parametros, sort_keys=True, default=str).encode('utf-8'))
+
+    if feriados is not None:
+        hash_dados.update(pd.util.hash_pandas_object(feriados, index=False).to_numpy().tobytes())
+
+    return hash_dados.hexdigest()[:32]
+
+def _caminho_modelo(sku, impressao):
+    return os.path.join(obter_pasta_cache(), f"{sku}_{impressao}.json")
+
+# carrega o modelo salvo para o sku e a impressão digital; retorna None se não existir
+def carregar_modelo(sku, impressao):
+    from prophet.serialize import model_from_json
+
+    caminho = _caminho_modelo(sku, impressao)
+    try:
+        with open(caminho, 'r', encoding='utf-8') as arquivo:
+            modelo = model_from_json(arquivo.read())
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        print(f"Modelo em cache inválido para o SKU {sku}, será retreinado: {e}", file=sys.stderr)
+        return None
+
+    # marca o uso para a política de descarte (lru)
+    try:
+        os.utime(caminho)
+    except OSError:
+        pass
+
+    return modelo
+
+# grava o modelo de forma atômica (arquivo temporário + rename), seguro para vários processos
+def salvar_modelo(sku, impressao, modelo):
+    from prophet.serialize import model_to_json
+
+    pasta = obter_pasta_cache()
+    try:
+        os.makedirs(pasta, exist_ok=True)
+        descritor, caminho_temporario = tempfile.mkstemp(dir=pasta, suffix='.tmp')
+        with os.fdopen(descritor, 'w', encoding='utf-8') as arquivo:
+            arquivo.write(model_to_json(modelo))
+        os.replace(caminho_temporario, _caminho_modelo(sku, impressao))
+    except Exception as e:
+        print(f"Não foi possível salvar o modelo do SKU {sku} no cache: {e}", file=sys.stderr)
+
+# descarta os modelos usados há mais tempo até respeitar os limites de tamanho e quantidade
+def aplicar_limites(tamanho_maximo_mb=None, maximo_modelos=None):
+    pasta = obter_pasta_cache()
+    if not os.path.isdir(pasta):
+        return 0
+
+    tamanho_maximo = float(tamanho_maximo_mb or os.environ.get('ITAMIND_CACHE_MODELOS_MB', TAMANHO_MAXIMO_MB)) * 1024 * 1024
+    maximo_modelos = int(maximo_modelos or MAXIMO_MODELOS)
+
+    arquivos = []
+    for entrada in os.scandir(pasta):
+        if entrada.is_file() and entrada.name.endswith('.json'):
+            informacoes = entrada.stat()
+            arquivos.append((informacoes.st_mtime, informacoes.st_size, entrada.path))
+
+    # mais recentes primeiro; mantém enquanto couber nos limites
+    arquivos.sort(reverse=True)
+    tamanho_total = 0
+    removidos = 0
+    for posicao, (_, tamanho, caminho) in enumerate(arquivos):
+        tamanho_total += tamanho
+        if tamanho_total > tamanho_maximo or posicao >= maximo_modelos:
+            try:
+                os.remove(caminho)
+                removidos += 1
+            except OSError:
+                pass
+
+    return removidos
@@ -0,0 +1,191 @@
+# cache em disco (sqlite) dos resultados de previsão por sku, indexado pelo conteúdo do histórico
+# preparado do sku + horizonte + parâmetros do modelo; ao reenviar um arquivo quase igual, só os skus
+# cujos dados mudaram são previstos de novo. As entradas expiram após um prazo (ttl) e as usadas há
+# mais tempo são descartadas quando o banco passa do tamanho máximo
+import os
+import sqlite3
+import sys
+import time
+
+from cache_modelos import obter_pasta_cache, calcular_impressao_digital
+from serializacao import para_json, ler_json
+
+# muda quando o formato ou o cálculo dos resultados guardados muda, invalidando as entradas antigas
+VERSAO_RESULTADOS = 2
+
+# limites padrão (ITAMIND_CACHE_RESULTADOS_TTL_H e ITAMIND_CACHE_RESULTADOS_MB)
+TTL_HORAS = 24
+TAMANHO_MAXIMO_MB = 100
+
+# resultados novos gravados por transação
+LOTE_GRAVACAO = 200
+
+# chaves consultadas por comando (o sqlite limita a quantidade de parâmetros)
+LOTE_CONSULTA = 500
+
+# o banco fica junto do cache de modelos, a menos que ITAMIND_CACHE_RESULTADOS indique outro arquivo
+def obter_caminho_cache_resultados():
+    return os.environ.get('ITAMIND_CACHE_RESULTADOS', os.path.join(obter_pasta_cache(), 'resultados.sqlite'))
+
+# o cache pode ser desligado com ITAMIND_CACHE_RESULTADOS_ATIVO=0 (também desligado por --sem-cache)
+def cache_resultados_ativo():
+    return os.environ.get('ITAMIND_CACHE_RESULTADOS_ATIVO', '1') != '0'
+
+# chave do resultado de um sku: hash do histórico preparado (ds, y), do sku e dos parâmetros da previsão
+def calcular_chave_resultado(dados_sku, sku, parametros):
+    return calcular_impressao_digital(dados_sku, {**parametros, "sku": int(sku), "versao": VERSAO_RESULTADOS})
+
+class CacheResultados:
+    def __init__(self, caminho=None, ttl_horas=None, tamanho_maximo_mb=None):
+        self.caminho = caminho or obter_caminho_cache_resultados()
+        self.ttl = float(ttl_horas or os.environ.get('ITAMIND_CACHE_RESULTADOS_TTL_H', TTL_HORAS)) * 3600
+        self.tamanho_maximo = float(
+            tamanho_maximo_mb or os.environ.get('ITAMIND_CACHE_RESULTADOS_MB', TAMANHO_MAXIMO_MB)
+        ) * 1024 * 1024
+        self.pendentes = []
+
+        os.makedirs(os.path.dirname(os.path.abspath(self.caminho)), exist_ok=True)
+        # wal permite que várias execuções (pipe, servidor) leiam enquanto outra grava
+        self.conexao = sqlite3.connect(self.caminho, timeout=30)
+        self.conexao.execute("PRAGMA auto_vacuum = INCREMENTAL")
+        self.conexao.execute("PRAGMA journal_mode = WAL")
+        self.conexao.execute("PRAGMA synchronous = NORMAL")
+        self.conexao.execute(
+            "CREATE TABLE IF NOT EXISTS resultados ("
+            " chave TEXT PRIMARY KEY, sku INTEGER NOT NULL, resultado TEXT NOT NULL,"
+            " criado_em REAL NOT NULL, usado_em REAL NOT NULL)"
+        )
+        self.conexao.execute("CREATE INDEX IF NOT EXISTS resultados_usado_em ON resultados (usado_em)")
+        self.conexao.commit()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *excecao):
+        self.fechar()
+
+    # resultados guardados e ainda válidos das chaves pedidas, {chave: resultado}; marca o uso (lru)
+    def buscar(self, chaves):
+        chaves = list(chaves)
+        validos_desde = time.time() - self.ttl
+        encontrados = {}
+        for inicio in range(0, len(chaves), LOTE_CONSULTA):
+            lote = chaves[inicio:inicio + LOTE_CONSULTA]
+            marcadores = ",".join("?" * len(lote))
+            linhas = self.conexao.execute(
+                f"SELECT chave, resultado FROM resultados WHERE chave IN ({marcadores}) AND criado_em >= ?",
+                (*lote, validos_desde),
+            )
+            encontrados.update((chave, ler_json(resultado)) for chave, resultado in linhas)
+
+        if encontrados:
+            agora = time.time()
+            self.conexao.executemany(
+                "UPDATE resultados SET usado_em = ? WHERE chave = ?", [(agora, chave) for chave in encontrados]
+            )
+            self.conexao.commit()
+        return encontrados
+
+    # guarda o resultado de um sku; as gravações são agrupadas em transações de LOTE_GRAVACAO
+    def guardar(self, chave, sku, resultado):
+        agora = time.time()
+        self.pendentes.append((chave, int(sku), para_json(resultado), agora, agora))
+        if len(self.pendentes) >= LOTE_GRAVACAO:
+            self.gravar_pendentes()
+
+    def gravar_pendentes(self):
+        if not self.pendentes:
+            return
+        self.conexao.executemany("INSERT OR REPLACE INTO resultados VALUES (?, ?, ?, ?, ?)", self.pendentes)
+        self.conexao.commit()
+        self.pendentes = []
+
+    # remove as entradas expiradas e, acima do tamanho máximo, as usadas há mais tempo
+    def aplicar_limites(self):
+        self.gravar_pendentes()
+        removidos = self.conexao.execute(
+            "DELETE FROM resultados WHERE criado_em < ?", (time.time() - self.ttl,)
+        ).rowcount
+
+        tamanho_total = self.conexao.execute("SELECT COALESCE(SUM(LENGTH(resultado)), 0) FROM resultados").fetchone()[0]
+        if tamanho_total > self.tamanho_maximo:
+            excedente = tamanho_total - self.tamanho_maximo
+            descartar = []
+            for chave, tamanho in self.conexao.execute(
+                "SELECT chave, LENGTH(resultado) FROM resultados ORDER BY usado_em"
+            ):
+                if excedente <= 0:
+                    break
+                descartar.append((chave,))
+                excedente -= tamanho
+            self.conexao.executemany("DELETE FROM resultados WHERE chave = ?", descartar)
+            removidos += len(descartar)
+
+        self.conexao.commit()
+        if removidos:
+            self.conexao.execute("PRAGMA incremental_vacuum")
+        return removidos
+
+    def fechar(self):
+        try:
+            self.gravar_pendentes()
+        finally:
+            self.conexao.close()
+
+# previsões das tarefas [(sku, dados ds/y)] reaproveitando os resultados guardados: os skus com resultado
+# válido saem direto do cache e só os demais passam por prever(tarefas_pendentes), um gerador de
+# resultados {"sku": ...}; os resultados novos são guardados. Com ordenado=True a saída segue a ordem das
+# tarefas, senão os skus do cache saem primeiro. Se o banco não puder ser usado, prevê tudo sem cache
+def prever_com_cache(tarefas, prever, parametros, ordenado=True):
+    tarefas = list(tarefas)
+    cache = None
+    try:
+        cache = CacheResultados()
+        chaves = {sku: calcular_chave_resultado(dados_sku, sku, parametros) for sku, dados_sku in tarefas}
+        encontrados = cache.buscar(chaves.values())
+    except (sqlite3.Error, OSError) as e:
+        print(f"Cache de resultados indisponível, prevendo todos os SKUs: {e}", file=sys.stderr)
+        if cache is not None:
+            cache.conexao.close()
+        yield from prever(tarefas)
+        return
+
+    with cache:
+        guardados = {sku: encontrados[chave] for sku, chave in chaves.items() if chave in encontrados}
+        pendentes = [(sku, dados_sku) for sku, dados_sku in tarefas if sku not in guardados]
+        print(f"Cache de resultados: {len(guardados)} SKUs reaproveitados, {len(pendentes)} a prever", file=sys.stderr)
+
+        def novos():
+            for resultado in prever(pendentes):
+                try:
+                    cache.guardar(chaves[resultado["sku"]], resultado["sku"], resultado)
+                except sqlite3.Error as e:
+                    print(f"Não foi possível guardar o resultado do SKU {resultado['sku']}: {e}", file=sys.stderr)
+                yield resultado
+
+        if ordenado:
+            yield from _intercalar(tarefas, guardados, novos())
+        else:
+            yield from guardados.values()
+            yield from novos()
+
+        try:
+            cache.aplicar_limites()
+        except sqlite3.Error as e:
+            print(f"Não foi possível aplicar os limites do cache de resultados: {e}", file=sys.stderr)
+
+# junta, na ordem das tarefas, os resultados guardados e os novos (que chegam na ordem dos pendentes,
+# sem os skus que falharam)
+def _intercalar(tarefas, guardados, novos):
+    recebidos = {}
+    for sku, _ in tarefas:
+        if sku in guardados:
+            yield guardados[sku]
+            continue
+        while sku not in recebidos:
+            resultado = next(novos, None)
+            if resultado is None:
+                break
+            recebidos[resultado["sku"]] = resultado
+        if sku in recebidos:
+            yield recebidos.pop(sku)
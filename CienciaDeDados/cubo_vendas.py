@@ -0,0 +1,211 @@
+# cubo de vendas sku x dia da semana x mês calculado em uma única passada vetorizada sobre os dados brutos
+# o cubo é montado uma vez por arquivo de vendas (e guardado em disco) e responde qualquer consulta de
+# sku, dia da semana e intervalo de meses sem voltar aos dados brutos
+import functools
+import hashlib
+import os
+import sys
+import tempfile
+
+from importacao import importar_sob_demanda
+from preparacao import codificar_skus
+
+np = importar_sob_demanda("numpy")
+pd = importar_sob_demanda("pandas")
+
+# nomes dos dias da semana na numeração do pandas (segunda = 0)
+DIAS_SEMANA = {
+    'segunda': 0,
+    'terça': 1,
+    'quarta': 2,
+    'quinta': 3,
+    'sexta': 4,
+    'sábado': 5,
+    'domingo': 6
+}
+NOMES_DIAS = list(DIAS_SEMANA)
+
+# converte o nome do dia (ou o número 0-6) para o número do dia da semana
+def numero_dia_semana(dia_semana):
+    if isinstance(dia_semana, int) and 0 <= dia_semana <= 6:
+        return dia_semana
+
+    dia_semana = str(dia_semana).strip().lower()
+    if dia_semana not in DIAS_SEMANA:
+        raise ValueError(f"Dia inválido: '{dia_semana}'. Use: {', '.join(DIAS_SEMANA.keys())}")
+    return DIAS_SEMANA[dia_semana]
+
+# meses são guardados como inteiros (meses desde 1970-01) para evitar textos por linha
+def _mes_para_indice(mes):
+    return int(np.datetime64(pd.Timestamp(mes).strftime('%Y-%m'), 'M').astype(np.int64))
+
+def _indice_para_mes(indice):
+    return str(np.datetime64(int(indice), 'M'))
+
+class CuboVendas:
+    # totais[sku, dia, mês] em kg e dias[sku, dia, mês] com a quantidade de dias com registro de venda;
+    # o eixo de meses começa em mes_inicial (meses desde 1970-01)
+    def __init__(self, skus, mes_inicial, totais, dias):
+        self.skus = np.asarray(skus)
+        self.mes_inicial = int(mes_inicial)
+        self.totais = totais
+        self.dias = dias
+        self.posicoes = {sku: posicao for posicao, sku in enumerate(self.skus.tolist())}
+
+    @property
+    def meses(self):
+        return [_indice_para_mes(self.mes_inicial + posicao) for posicao in range(self.totais.shape[2])]
+
+    # fatia do eixo de meses para o intervalo pedido (AAAA-MM, inclusivo; None = sem limite)
+    def _fatia_meses(self, mes_inicial=None, mes_final=None):
+        inicio = 0 if mes_inicial is None else max(_mes_para_indice(mes_inicial) - self.mes_inicial, 0)
+        fim = self.totais.shape[2] if mes_final is None else max(_mes_para_indice(mes_final) - self.mes_inicial + 1, 0)
+        return slice(inicio, fim)
+
+    # soma mensal das vendas de um sku em um dia da semana; só aparecem meses com vendas registradas
+    def consultar(self, sku, dia_semana, mes_inicial=None, mes_final=None):
+        numero_dia = numero_dia_semana(dia_semana)
+        resposta = {"sku": int(sku), "dia_semana": NOMES_DIAS[numero_dia], "meses": []}
+
+        posicao = self.posicoes.get(sku)
+        if posicao is None:
+            return resposta
+
+        fatia = self._fatia_meses(mes_inicial, mes_final)
+        totais = self.totais[posicao, numero_dia, fatia]
+        dias = self.dias[posicao, numero_dia, fatia]
+        inicio = self.mes_inicial + (fatia.start or 0)
+
+        for deslocamento in np.flatnonzero(dias).tolist():
+            resposta["meses"].append({
+                "ano_mes": _indice_para_mes(inicio + deslocamento),
+                "total_kg": round(float(totais[deslocamento]), 2),
+                "dias_com_venda": int(dias[deslocamento]),
+            })
+        return resposta
+
+    # grade completa (ou filtrada) em formato longo: uma linha por sku x dia da semana x mês com vendas
+    def para_tabela(self, skus=None, dias_semana=None, mes_inicial=None, mes_final=None):
+        posicoes = np.arange(len(self.skus)) if skus is None else np.array(
+            [self.posicoes[sku] for sku in skus if sku in self.posicoes], dtype=np.intp
+        )
+        numeros_dias = np.arange(7) if dias_semana is None else np.array(
+            [numero_dia_semana(dia) for dia in dias_semana], dtype=np.intp
+        )
+        fatia = self._fatia_meses(mes_inicial, mes_final)
+
+        totais = self.totais[np.ix_(posicoes, numeros_dias)][:, :, fatia]
+        dias = self.dias[np.ix_(posicoes, numeros_dias)][:, :, fatia]
+        i_sku, i_dia, i_mes = np.nonzero(dias)
+
+        return pd.DataFrame({
+            "sku": self.skus[posicoes[i_sku]],
+            "dia_semana": np.array(NOMES_DIAS, dtype=object)[numeros_dias[i_dia]],
+            "ano_mes": np.array(self.meses[fatia], dtype=object)[i_mes],
+            "total_kg": np.round(totais[i_sku, i_dia, i_mes], 2),
+            "dias_com_venda": dias[i_sku, i_dia, i_mes],
+        })
+
+    # lista de dicionários serializáveis em json para o painel
+    def para_json(self, **filtros):
+        tabela = self.para_tabela(**filtros)
+        colunas = list(tabela.columns)
+        return [
+            dict(zip(colunas, linha))
+            for linha in zip(*(tabela[coluna].to_numpy().tolist() for coluna in colunas))
+        ]
+
+    def salvar(self, caminho):
+        # grava em arquivo temporário e renomeia para não deixar um cubo pela metade
+        pasta = os.path.dirname(caminho)
+        os.makedirs(pasta, exist_ok=True)
+        descritor, temporario = tempfile.mkstemp(dir=pasta, suffix='.npz')
+        with os.fdopen(descritor, 'wb') as arquivo:
+            np.savez(arquivo, skus=self.skus, mes_inicial=self.mes_inicial, totais=self.totais, dias=self.dias)
+        os.replace(temporario, caminho)
+
+    @classmethod
+    def carregar(cls, caminho):
+        with np.load(caminho, allow_pickle=False) as arquivo:
+            return cls(arquivo['skus'], arquivo['mes_inicial'], arquivo['totais'], arquivo['dias'])
+
+# monta o cubo a partir dos dados brutos (data_dia, id_produto, total_venda_dia_kg) com a mesma limpeza
+# da preparação: descarta linhas sem sku ou data e vendas ausentes ou negativas
+def montar_cubo_vendas(dados_brutos):
+    codigos, skus = codificar_skus(dados_brutos['id_produto'])
+    datas = dados_brutos['data_dia'].to_numpy(dtype='datetime64[D]')
+    vendas = dados_brutos['total_venda_dia_kg'].to_numpy(dtype=np.float64)
+
+    validas = (codigos >= 0) & ~np.isnat(datas) & (vendas >= 0)
+    if not validas.all():
+        codigos, datas, vendas = codigos[validas], datas[validas], vendas[validas]
+
+    if len(codigos) == 0:
+        return CuboVendas(np.array([], dtype=np.int64), 0, np.zeros((0, 7, 0)), np.zeros((0, 7, 0), dtype=np.int32))
+
+    # dia da semana (1970-01-01 foi uma quinta) e mês a partir dos mesmos dias desde a época
+    dias_epoca = datas.astype(np.int64)
+    dia_semana = (dias_epoca + 3) % 7
+    meses = datas.astype('datetime64[M]').astype(np.int64)
+    mes_inicial = int(meses.min())
+    num_meses = int(meses.max()) - mes_inicial + 1
+    num_skus = len(skus)
+
+    # um único agrupamento por chave combinada sku x dia x mês
+    chave = (codigos.astype(np.int64) * 7 + dia_semana) * num_meses + (meses - mes_inicial)
+    tamanho = num_skus * 7 * num_meses
+    totais = np.bincount(chave, weights=vendas, minlength=tamanho).reshape(num_skus, 7, num_meses)
+    dias = np.bincount(chave, minlength=tamanho).astype(np.int32).reshape(num_skus, 7, num_meses)
+
+    # só os skus que sobraram depois da limpeza
+    presentes = dias.any(axis=(1, 2))
+    if not presentes.all():
+        skus, totais, dias = skus[presentes], totais[presentes], dias[presentes]
+
+    return CuboVendas(skus.astype(np.int64), mes_inicial, totais, dias)
+
+# assinatura do arquivo (ou pasta do armazém parquet): caminho, tamanho e data de modificação
+def _assinatura_arquivo(caminho):
+    caminho = os.path.abspath(caminho)
+    if os.path.isdir(caminho):
+        arquivos = sorted(
+            os.path.join(raiz, nome) for raiz, _, nomes in os.walk(caminho) for nome in nomes
+        )
+    else:
+        arquivos = [caminho]
+
+    assinatura = hashlib.sha256(caminho.encode('utf-8'))
+    for arquivo in arquivos:
+        estado = os.stat(arquivo)
+        assinatura.update(f"{arquivo}|{estado.st_size}|{estado.st_mtime_ns}".encode('utf-8'))
+    return assinatura.hexdigest()[:32]
+
+def _caminho_cubo(assinatura):
+    from cache_modelos import obter_pasta_cache
+    return os.path.join(obter_pasta_cache(), 'cubos', f"{assinatura}.npz")
+
+# cubo do arquivo de vendas: reaproveita o cubo já montado no processo ou gravado em disco enquanto o
+# arquivo não mudar; só lê os dados brutos quando não há cubo válido
+def obter_cubo_arquivo(caminho):
+    return _obter_cubo(_assinatura_arquivo(caminho), os.path.abspath(caminho))
+
+@functools.lru_cache(maxsize=8)
+def _obter_cubo(assinatura, caminho):
+    from cache_modelos import cache_ativo
+    from ingestao import carregar_arquivo_vendas
+
+    caminho_cubo = _caminho_cubo(assinatura)
+    if cache_ativo() and os.path.exists(caminho_cubo):
+        try:
+            return CuboVendas.carregar(caminho_cubo)
+        except Exception as e:
+            print(f"Cubo em cache inválido, será recalculado: {e}", file=sys.stderr)
+
+    cubo = montar_cubo_vendas(carregar_arquivo_vendas(caminho))
+
+    if cache_ativo():
+        try:
+            cubo.salvar(caminho_cubo)
+        except OSError as e:
+            print(f"Não foi possível gravar o cubo em cache: {e}", file=sys.stderr)
+    return cubo
@@ -0,0 +1,116 @@
+# calendário de feriados nacionais e regionais (pará / belém) gerado localmente para qualquer faixa de anos
+# os feriados móveis (carnaval, sexta-feira santa, corpus christi) são calculados a partir da páscoa;
+# as tabelas no formato do prophet são montadas uma vez por faixa de anos e compartilhadas entre os skus
+import datetime
+import functools
+
+from importacao import importar_sob_demanda
+
+pd = importar_sob_demanda("pandas")
+
+# janela de efeito de cada feriado no prophet: o próprio dia e o dia seguinte
+JANELA_ANTERIOR = 0
+JANELA_POSTERIOR = 1
+
+# feriados de data fixa: (mês, dia, nome, abrangência, primeiro ano em vigor)
+FERIADOS_FIXOS = [
+    (1, 1, "Confraternização Universal", "nacional", None),
+    (4, 21, "Tiradentes", "nacional", None),
+    (5, 1, "Dia do Trabalho", "nacional", None),
+    (9, 7, "Independência do Brasil", "nacional", None),
+    (10, 12, "Nossa Senhora Aparecida", "nacional", None),
+    (11, 2, "Finados", "nacional", None),
+    (11, 15, "Proclamação da República", "nacional", None),
+    (11, 20, "Dia Nacional de Zumbi e da Consciência Negra", "nacional", 2024),
+    (12, 25, "Natal", "nacional", None),
+    (8, 15, "Adesão do Pará à Independência", "pará", None),
+    (1, 12, "Aniversário de Belém", "belém", None),
+    (12, 8, "Nossa Senhora da Conceição", "belém", None),
+]
+
+# feriados móveis em dias a partir do domingo de páscoa
+FERIADOS_PASCOA = [
+    (-48, "Carnaval (segunda-feira)", "nacional"),
+    (-47, "Carnaval (terça-feira)", "nacional"),
+    (-2, "Sexta-feira Santa", "nacional"),
+    (60, "Corpus Christi", "nacional"),
+]
+
+# datas avulsas do calendário original da loja, mantidas para não perder os efeitos já aprendidos
+FERIADOS_AVULSOS = [
+    ("2025-03-29", "Data comemorativa local", "loja"),
+    ("2025-06-29", "Data comemorativa local", "loja"),
+    ("2025-07-28", "Data comemorativa local", "loja"),
+    ("2025-09-08", "Data comemorativa local", "loja"),
+]
+
+# domingo de páscoa pelo algoritmo anônimo do calendário gregoriano (meeus/jones/butcher)
+def calcular_pascoa(ano):
+    a = ano % 19
+    b, c = divmod(ano, 100)
+    d, e = divmod(b, 4)
+    f = (b + 8) // 25
+    g = (b - f + 1) // 3
+    h = (19 * a + b - d - g + 15) % 30
+    i, k = divmod(c, 4)
+    l = (32 + 2 * e + 2 * i - h - k) % 7
+    m = (a + 11 * h + 22 * l) // 451
+    mes, dia = divmod(h + l - 7 * m + 114, 31)
+    return datetime.date(ano, mes, dia + 1)
+
+# círio de nazaré: segundo domingo de outubro; a segunda-feira seguinte é feriado em belém
+def calcular_cirio(ano):
+    primeiro_outubro = datetime.date(ano, 10, 1)
+    primeiro_domingo = primeiro_outubro + datetime.timedelta(days=(6 - primeiro_outubro.weekday()) % 7)
+    return primeiro_domingo + datetime.timedelta(days=7)
+
+# lista (data, nome, abrangência) dos feriados de um ano
+def feriados_do_ano(ano):
+    feriados = [
+        (datetime.date(ano, mes, dia), nome, abrangencia)
+        for mes, dia, nome, abrangencia, desde in FERIADOS_FIXOS
+        if desde is None or ano >= desde
+    ]
+
+    pascoa = calcular_pascoa(ano)
+    feriados += [
+        (pascoa + datetime.timedelta(days=deslocamento), nome, abrangencia)
+        for deslocamento, nome, abrangencia in FERIADOS_PASCOA
+    ]
+
+    cirio = calcular_cirio(ano)
+    feriados.append((cirio, "Círio de Nazaré", "belém"))
+    feriados.append((cirio + datetime.timedelta(days=1), "Segunda-feira do Círio", "belém"))
+
+    feriados += [
+        (datetime.date.fromisoformat(data), nome, abrangencia)
+        for data, nome, abrangencia in FERIADOS_AVULSOS
+        if int(data[:4]) == ano
+    ]
+    return feriados
+
+# tabela legível dos feriados da faixa de anos (inclusiva), ordenada por data
+@functools.lru_cache(maxsize=None)
+def listar_feriados(ano_inicial, ano_final):
+    feriados = [feriado for ano in range(ano_inicial, ano_final + 1) for feriado in feriados_do_ano(ano)]
+    tabela = pd.DataFrame(feriados, columns=["data", "nome", "abrangencia"])
+    tabela["data"] = pd.to_datetime(tabela["data"])
+    return tabela.sort_values("data", ignore_index=True)
+
+# feriados da faixa de anos no formato do prophet (holiday, ds, lower_window, upper_window);
+# todos entram como um único feriado genérico, como no calendário original, para não multiplicar
+# os regressores do modelo; datas que coincidem aparecem uma vez só
+@functools.lru_cache(maxsize=None)
+def obter_feriados(ano_inicial, ano_final=None):
+    ano_final = ano_inicial if ano_final is None else ano_final
+    datas = listar_feriados(ano_inicial, ano_final)["data"].drop_duplicates()
+    return pd.DataFrame({
+        "holiday": "feriado",
+        "ds": datas.to_numpy(),
+        "lower_window": JANELA_ANTERIOR,
+        "upper_window": JANELA_POSTERIOR,
+    })
+
+# feriados que cobrem o histórico e o ano seguinte ao último dia (onde caem as previsões)
+def feriados_para_historico(datas):
+    return obter_feriados(int(datas.min().year), int(datas.max().year) + 1)
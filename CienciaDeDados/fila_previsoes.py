@@ -0,0 +1,197 @@
+# fila assíncrona (asyncio) de trabalhos de previsão para o modo servidor:
+# - cada trabalho tem uma prioridade (números menores são atendidos primeiro)
+# - pedidos idênticos enquanto o primeiro ainda está na fila ou executando (mesmo hash do csv)
+#   compartilham uma única execução
+# - o estado e o resultado de cada trabalho ficam guardados para consulta, assim o back-end
+#   acompanha o andamento em vez de manter uma conexão bloqueada até o fim
+# a fila roda em um loop asyncio numa thread própria; a função de previsão roda em threads auxiliares
+# e manda o treino dos skus para o pool de processos do servidor, que limita o uso de cpu
+import asyncio
+import hashlib
+import itertools
+import sys
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+# prioridade usada quando o pedido não informa uma
+PRIORIDADE_PADRAO = 5
+
+# trabalhos executados ao mesmo tempo (o treino de todos divide o mesmo pool de processos)
+MAXIMO_TRABALHOS_SIMULTANEOS = 2
+
+# trabalhos terminados ficam disponíveis para consulta por este tempo (s), até este limite
+RETENCAO_CONCLUIDOS_S = 15 * 60
+MAXIMO_CONCLUIDOS = 256
+
+ESTADOS_FINAIS = ("concluido", "erro")
+
+def calcular_hash_conteudo(conteudo):
+    return hashlib.sha256(conteudo.encode('utf-8')).hexdigest()
+
+class Trabalho:
+    def __init__(self, hash_conteudo, conteudo, prioridade):
+        self.id = uuid.uuid4().hex
+        self.hash_conteudo = hash_conteudo
+        self.conteudo = conteudo
+        self.prioridade = prioridade
+        self.sequencia = 0
+        self.estado = "na_fila"
+        self.solicitacoes = 1
+        self.criado_em = time.time()
+        self.inicio = None
+        self.fim = None
+        self.resultado = None
+        self.erro = None
+        self.terminado = threading.Event()
+
+    # estado do trabalho sem o resultado (resposta leve para as consultas periódicas)
+    def resumo(self):
+        resumo = {
+            "trabalho": self.id,
+            "estado": self.estado,
+            "prioridade": self.prioridade,
+            "solicitacoes": self.solicitacoes,
+        }
+        if self.inicio is not None:
+            resumo["espera_s"] = round(self.inicio - self.criado_em, 3)
+        if self.fim is not None:
+            resumo["duracao_s"] = round(self.fim - self.inicio, 3)
+        if self.erro is not None:
+            resumo["erro"] = self.erro
+        return resumo
+
+class FilaPrevisoes:
+    def __init__(self, funcao_previsao, max_simultaneos=MAXIMO_TRABALHOS_SIMULTANEOS):
+        self.funcao_previsao = funcao_previsao
+        self.trabalhos = {}
+        self.pendentes_por_hash = {}
+        self.trava = threading.Lock()
+        self._sequencia = itertools.count()
+        self._executor = ThreadPoolExecutor(max_workers=max_simultaneos)
+
+        # o loop asyncio da fila roda em uma thread própria; os servidores tcp e de linhas
+        # (baseados em threads) entram nele por call_soon_threadsafe
+        self._loop = asyncio.new_event_loop()
+        iniciada = threading.Event()
+        self._thread = threading.Thread(target=self._rodar, args=(max_simultaneos, iniciada), daemon=True)
+        self._thread.start()
+        iniciada.wait()
+
+    def _rodar(self, max_simultaneos, iniciada):
+        asyncio.set_event_loop(self._loop)
+        self._fila = asyncio.PriorityQueue()
+        self._consumidores = [self._loop.create_task(self._consumir()) for _ in range(max_simultaneos)]
+        iniciada.set()
+        self._loop.run_forever()
+
+    # coloca o trabalho na fila; (prioridade, sequência) garante a ordem de chegada entre iguais
+    def _enfileirar(self, trabalho):
+        trabalho.sequencia = next(self._sequencia)
+        item = (trabalho.prioridade, trabalho.sequencia, trabalho)
+        self._loop.call_soon_threadsafe(self._fila.put_nowait, item)
+
+    async def _consumir(self):
+        while True:
+            _, sequencia, trabalho = await self._fila.get()
+
+            # entradas antigas de um trabalho que foi adiantado (ou já executado) são ignoradas
+            with self.trava:
+                if trabalho.estado != "na_fila" or sequencia != trabalho.sequencia:
+                    continue
+                trabalho.estado = "executando"
+                trabalho.inicio = time.time()
+
+            try:
+                resultado = await self._loop.run_in_executor(self._executor, self.funcao_previsao, trabalho.conteudo)
+                estado, erro = "concluido", None
+            except Exception as e:
+                print(f"Erro no trabalho de previsão {trabalho.id}: {e}", file=sys.stderr)
+                resultado, estado, erro = None, "erro", str(e)
+
+            with self.trava:
+                trabalho.resultado = resultado
+                trabalho.estado = estado
+                trabalho.erro = erro
+                trabalho.fim = time.time()
+                trabalho.conteudo = None
+                if self.pendentes_por_hash.get(trabalho.hash_conteudo) is trabalho:
+                    del self.pendentes_por_hash[trabalho.hash_conteudo]
+            trabalho.terminado.set()
+
+    # descarta os trabalhos terminados há mais tempo que a retenção ou além do limite guardado
+    def _descartar_antigos(self):
+        agora = time.time()
+        terminados = sorted(
+            (trabalho for trabalho in self.trabalhos.values() if trabalho.estado in ESTADOS_FINAIS),
+            key=lambda trabalho: trabalho.fim,
+        )
+        excedentes = len(terminados) - MAXIMO_CONCLUIDOS
+        for posicao, trabalho in enumerate(terminados):
+            if posicao < excedentes or agora - trabalho.fim > RETENCAO_CONCLUIDOS_S:
+                del self.trabalhos[trabalho.id]
+
+    # envia um csv para previsão e devolve (trabalho, reaproveitado); se um pedido com o mesmo conteúdo
+    # ainda não terminou, o trabalho existente é devolvido em vez de criar outro
+    def enviar(self, conteudo, prioridade=PRIORIDADE_PADRAO):
+        hash_conteudo = calcular_hash_conteudo(conteudo)
+
+        with self.trava:
+            self._descartar_antigos()
+
+            trabalho = self.pendentes_por_hash.get(hash_conteudo)
+            if trabalho is not None:
+                trabalho.solicitacoes += 1
+                # um pedido mais urgente adianta o trabalho que ainda espera na fila
+                if prioridade < trabalho.prioridade and trabalho.estado == "na_fila":
+                    trabalho.prioridade = prioridade
+                    self._enfileirar(trabalho)
+                return trabalho, True
+
+            trabalho = Trabalho(hash_conteudo, conteudo, prioridade)
+            self.trabalhos[trabalho.id] = trabalho
+            self.pendentes_por_hash[hash_conteudo] = trabalho
+            self._enfileirar(trabalho)
+            return trabalho, False
+
+    def obter(self, id_trabalho):
+        with self.trava:
+            return self.trabalhos.get(id_trabalho)
+
+    # resumo de um trabalho já obtido (com obter) e sua posição na fila (1 = o próximo a executar);
+    # continua válido mesmo que ele tenha sido descartado da consulta depois de terminar
+    def resumir(self, trabalho):
+        with self.trava:
+            return self._resumir(trabalho)
+
+    def _resumir(self, trabalho):
+        resumo = trabalho.resumo()
+        if trabalho.estado == "na_fila":
+            chave = (trabalho.prioridade, trabalho.sequencia)
+            resumo["posicao"] = 1 + sum(
+                1 for outro in self.trabalhos.values()
+                if outro.estado == "na_fila" and (outro.prioridade, outro.sequencia) < chave
+            )
+        return resumo
+
+    # contagem de trabalhos por estado, para o sinal de saúde
+    def contagem(self):
+        with self.trava:
+            contagem = {"na_fila": 0, "executando": 0, "concluido": 0, "erro": 0}
+            for trabalho in self.trabalhos.values():
+                contagem[trabalho.estado] += 1
+            return contagem
+
+    async def _parar(self):
+        for consumidor in self._consumidores:
+            consumidor.cancel()
+        await asyncio.gather(*self._consumidores, return_exceptions=True)
+        self._loop.stop()
+
+    # para os consumidores e o loop; trabalhos ainda na fila são abandonados
+    def encerrar(self):
+        asyncio.run_coroutine_threadsafe(self._parar(), self._loop)
+        self._thread.join()
+        self._loop.close()
+        self._executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,119 @@
+# histórico de vendas já preparado (limpo e ordenado por data, como em preparar_dados_para_prophet)
+# guardado em disco, um arquivo por sku; o modo de acréscimo recebe só as linhas novas do dia,
+# regrava apenas os skus tocados e marca como pendentes de nova previsão os que mudaram
+import json
+import os
+import sys
+import tempfile
+
+from importacao import importar_sob_demanda
+from preparacao import particionar_por_sku
+
+np = importar_sob_demanda("numpy")
+pd = importar_sob_demanda("pandas")
+
+# pasta padrão do histórico (pode ser trocada pela variável ITAMIND_HISTORICO ou por --historico)
+PASTA_PADRAO = os.path.join(os.path.dirname(os.path.abspath(__file__)), '.historico_vendas')
+
+# skus cujo histórico mudou desde a última previsão
+ARQUIVO_PENDENTES = 'pendentes.json'
+
+def obter_pasta_historico(pasta=None):
+    return pasta or os.environ.get('ITAMIND_HISTORICO', PASTA_PADRAO)
+
+def _caminho_sku(pasta, sku):
+    return os.path.join(pasta, f"{int(sku)}.npz")
+
+# grava o arquivo de forma atômica (arquivo temporário + rename), sem deixar um histórico pela metade
+def _gravar_atomico(pasta, caminho, gravar):
+    os.makedirs(pasta, exist_ok=True)
+    descritor, temporario = tempfile.mkstemp(dir=pasta, suffix='.tmp')
+    try:
+        with os.fdopen(descritor, 'wb') as arquivo:
+            gravar(arquivo)
+        os.replace(temporario, caminho)
+    except BaseException:
+        os.remove(temporario)
+        raise
+
+# datas e vendas guardadas do sku (arrays vazios se o sku ainda não tem histórico)
+def _ler_arrays(pasta, sku):
+    try:
+        with np.load(_caminho_sku(pasta, sku), allow_pickle=False) as arquivo:
+            return arquivo['ds'], arquivo['y']
+    except FileNotFoundError:
+        return None, None
+
+# histórico preparado (ds, y) de um sku, ou None se o sku não está no histórico
+def carregar_historico_sku(sku, pasta=None):
+    datas, vendas = _ler_arrays(obter_pasta_historico(pasta), sku)
+    if datas is None:
+        return None
+    return pd.DataFrame({'ds': datas, 'y': vendas}, copy=False)
+
+# junta o histórico guardado com as linhas novas; numa mesma data vale a linha mais recente
+# (reenvio de um dia corrigido substitui o valor antigo em vez de duplicar)
+def _mesclar(datas, vendas, datas_novas, vendas_novas):
+    if datas is not None:
+        datas_novas = np.concatenate([datas, datas_novas.astype(datas.dtype)])
+        vendas_novas = np.concatenate([vendas, vendas_novas.astype(vendas.dtype)])
+
+    ordem = np.argsort(datas_novas, kind='stable')
+    datas_novas, vendas_novas = datas_novas[ordem], vendas_novas[ordem]
+    ultima_da_data = np.r_[datas_novas[1:] != datas_novas[:-1], True]
+    return datas_novas[ultima_da_data], vendas_novas[ultima_da_data]
+
+def listar_pendentes(pasta=None):
+    try:
+        with open(os.path.join(obter_pasta_historico(pasta), ARQUIVO_PENDENTES), 'r', encoding='utf-8') as arquivo:
+            return set(json.load(arquivo))
+    except FileNotFoundError:
+        return set()
+    except ValueError as e:
+        print(f"Lista de SKUs pendentes inválida, será recriada: {e}", file=sys.stderr)
+        return set()
+
+def _gravar_pendentes(pasta, pendentes):
+    conteudo = json.dumps(sorted(pendentes)).encode('utf-8')
+    _gravar_atomico(pasta, os.path.join(pasta, ARQUIVO_PENDENTES), lambda arquivo: arquivo.write(conteudo))
+
+# acrescenta as linhas novas (data_dia, id_produto, total_venda_dia_kg) ao histórico preparado;
+# só os skus presentes nas linhas novas são lidos e regravados, e só os que mudaram ficam pendentes
+def acrescentar_vendas(dados_novos, pasta=None):
+    pasta = obter_pasta_historico(pasta)
+    alterados = []
+
+    for sku, delta in particionar_por_sku(dados_novos).items():
+        sku = int(sku)
+        datas, vendas = _ler_arrays(pasta, sku)
+        novas_datas, novas_vendas = _mesclar(
+            datas, vendas, delta['ds'].to_numpy(), delta['y'].to_numpy(dtype=np.float32)
+        )
+        if datas is not None and np.array_equal(datas, novas_datas) and np.array_equal(vendas, novas_vendas):
+            continue
+
+        _gravar_atomico(pasta, _caminho_sku(pasta, sku),
+                        lambda arquivo: np.savez(arquivo, ds=novas_datas, y=novas_vendas))
+        alterados.append(sku)
+
+    if alterados:
+        _gravar_pendentes(pasta, listar_pendentes(pasta) | set(alterados))
+
+    return {"linhas": len(dados_novos), "skus_alterados": len(alterados), "skus_pendentes": len(listar_pendentes(pasta))}
+
+# histórico preparado dos skus pendentes de previsão, {sku: ds/y}
+def carregar_pendentes(pasta=None):
+    particoes = {}
+    for sku in sorted(listar_pendentes(pasta)):
+        dados_sku = carregar_historico_sku(sku, pasta)
+        if dados_sku is not None:
+            particoes[sku] = dados_sku
+    return particoes
+
+# retira os skus da lista de pendentes depois que a previsão foi entregue
+def limpar_pendentes(skus, pasta=None):
+    pasta = obter_pasta_historico(pasta)
+    pendentes = listar_pendentes(pasta)
+    restantes = pendentes - {int(sku) for sku in skus}
+    if restantes != pendentes:
+        _gravar_pendentes(pasta, restantes)
@@ -0,0 +1,28 @@
+# importação sob demanda das bibliotecas pesadas (pandas, numpy)
+# o módulo só é executado no primeiro acesso a um atributo, então caminhos que não usam a biblioteca
+# (ajuda da linha de comando, perguntas do modo interativo, cálculo de retirada) não pagam a importação
+import importlib.util
+import sys
+
+# devolve o módulo já carregado ou um módulo preguiçoso registrado em sys.modules,
+# de forma que importações normais posteriores (ex: dentro do prophet) recebam o mesmo objeto
+def importar_sob_demanda(nome):
+    if nome in sys.modules:
+        return sys.modules[nome]
+
+    especificacao = importlib.util.find_spec(nome)
+    if especificacao is None:
+        raise ModuleNotFoundError(f"Módulo não encontrado: {nome}", name=nome)
+
+    carregador = importlib.util.LazyLoader(especificacao.loader)
+    especificacao.loader = carregador
+    modulo = importlib.util.module_from_spec(especificacao)
+    sys.modules[nome] = modulo
+    carregador.exec_module(modulo)
+    return modulo
+
+# executa já os módulos preguiçosos informados; o carregamento sob demanda não é seguro entre threads,
+# então o modo servidor (várias previsões em threads) carrega as bibliotecas antes de atender
+def carregar_agora(*nomes):
+    for nome in nomes:
+        getattr(importar_sob_demanda(nome), '__name__')
@@ -0,0 +1,171 @@
+# leitura dos dados de vendas direto da memória, sem arquivos temporários
+import io
+import os
+import sys
+
+from importacao import importar_sob_demanda
+
+pd = importar_sob_demanda("pandas")
+
+# colunas usadas pelo modelo; as demais (descrição, equipe...) são descartadas já na leitura
+COLUNAS_VENDAS = ["data_dia", "id_produto", "total_venda_dia_kg"]
+
+# tipos explícitos evitam a inferência de tipos do pandas a cada bloco:
+# - data_dia como categoria guarda cada texto de data uma única vez (e cada data é interpretada uma vez)
+# - id_produto é lido como float para aceitar linhas vazias e vira categoria no final
+# - vendas em float32 (kg com duas casas decimais cabem com folga)
+TIPOS_VENDAS = {
+    "data_dia": "category",
+    "id_produto": "float64",
+    "total_venda_dia_kg": "float32",
+}
+
+# quantidade de linhas lidas por bloco no modo streaming
+TAMANHO_BLOCO = 200_000
+
+# verifica se o motor pyarrow foi pedido (ITAMIND_MOTOR_CSV=pyarrow) e está instalado
+def _usar_pyarrow(motor):
+    motor = motor or os.environ.get('ITAMIND_MOTOR_CSV', 'c')
+    if motor != 'pyarrow':
+        return False
+
+    try:
+        import pyarrow  # noqa: F401
+        return True
+    except ImportError:
+        print("pyarrow não instalado, usando o leitor padrão do pandas.", file=sys.stderr)
+        return False
+
+# converte datas no formato fixo dd/mm/aaaa interpretando cada data distinta uma única vez
+# (o histórico repete as mesmas datas para todos os skus); aceita texto ou categoria
+def converter_datas(serie, formato='%d/%m/%Y'):
+    if isinstance(serie.dtype, pd.CategoricalDtype):
+        codigos, datas_unicas = serie.cat.codes.to_numpy(), serie.cat.categories
+    else:
+        codigos, datas_unicas = pd.factorize(serie)
+    datas = pd.DatetimeIndex(pd.to_datetime(datas_unicas, format=formato, errors='coerce'))
+    convertidas = datas.take(codigos, allow_fill=True, fill_value=pd.NaT)
+    return pd.Series(convertidas, index=serie.index, name=serie.name)
+
+# confere o cabeçalho do csv antes de ler qualquer linha de dados, para recusar logo um arquivo
+# sem as colunas necessárias (em vez de descobrir isso só depois de carregá-lo)
+def validar_cabecalho(caminho, encoding='latin1', sep=';'):
+    with open(caminho, 'r', encoding=encoding, errors='replace', newline='') as arquivo:
+        cabecalho = arquivo.readline()
+
+    colunas = {coluna.strip().strip('"') for coluna in cabecalho.rstrip('\r\n').split(sep)}
+    if not all(coluna in colunas for coluna in COLUNAS_VENDAS):
+        raise ValueError(f"O arquivo deve conter as colunas: {', '.join(COLUNAS_VENDAS)}")
+
+# remove linhas sem sku e aplica o tipo final das colunas
+def _finalizar_bloco(bloco, formato_data):
+    bloco = bloco[bloco['id_produto'].notna()]
+    return pd.DataFrame({
+        'data_dia': converter_datas(bloco['data_dia'], formato_data),
+        'id_produto': pd.to_numeric(bloco['id_produto'], downcast='integer'),
+        'total_venda_dia_kg': bloco['total_venda_dia_kg'],
+    })
+
+# representação compacta da tabela de vendas: sku como categoria (códigos de 1-2 bytes por linha
+# em vez de 8) e vendas em float32; as datas já chegam convertidas
+def compactar_vendas(dados):
+    return dados.astype({
+        'id_produto': 'category',
+        'total_venda_dia_kg': 'float32',
+    })
+
+# lê o csv de vendas (separador ';') de um buffer binário ou de texto em uma única passada
+# no modo padrão lê em blocos, mantendo em memória apenas as três colunas necessárias;
+# com skus, cada bloco é reduzido às linhas desses skus antes de interpretar as datas, e o pico de
+# memória passa a depender do tamanho do bloco e dos skus pedidos, não do arquivo
+def ler_csv_vendas(fonte, encoding='utf-8', formato_data='%d/%m/%Y', tamanho_bloco=TAMANHO_BLOCO, motor=None,
+                   skus=None):
+    opcoes = {
+        'sep': ';',
+        'usecols': COLUNAS_VENDAS,
+        'dtype': TIPOS_VENDAS,
+        'encoding': encoding,
+        'encoding_errors': 'replace',
+    }
+
+    # o pyarrow lê o arquivo inteiro de uma vez, então o filtro por sku fica com a leitura em blocos
+    if skus is None and _usar_pyarrow(motor):
+        # o pyarrow lê o buffer inteiro com múltiplas threads
+        if isinstance(fonte, io.TextIOBase):
+            fonte = io.BytesIO(fonte.read().encode(encoding))
+        opcoes.pop('encoding_errors')
+        return compactar_vendas(_finalizar_bloco(pd.read_csv(fonte, engine='pyarrow', **opcoes), formato_data))
+
+    if skus is not None:
+        skus = list(skus)
+
+    blocos = []
+    for bloco in pd.read_csv(fonte, chunksize=tamanho_bloco, **opcoes):
+        if skus is not None:
+            bloco = bloco[bloco['id_produto'].isin(skus)]
+            if bloco.empty:
+                continue
+        blocos.append(_finalizar_bloco(bloco, formato_data))
+
+    if not blocos:
+        return pd.DataFrame(columns=COLUNAS_VENDAS)
+
+    return _juntar_blocos(blocos)
+
+# junta os blocos coluna a coluna, liberando cada coluna dos blocos logo depois de copiada
+# (o pico de memória fica em blocos + uma coluna, e não em blocos + tabela inteira);
+# a categoria do sku é criada depois, com as categorias de todos os blocos
+def _juntar_blocos(blocos):
+    colunas = {}
+    for coluna in COLUNAS_VENDAS:
+        partes = [bloco.pop(coluna) for bloco in blocos]
+        colunas[coluna] = pd.concat(partes, ignore_index=True)
+        del partes
+    return compactar_vendas(pd.DataFrame(colunas, copy=False))
+
+# lê o csv recebido pela entrada padrão direto do buffer binário
+def ler_csv_stdin(**opcoes):
+    return ler_csv_vendas(sys.stdin.buffer, encoding=sys.stdin.encoding or 'utf-8', **opcoes)
+
+# carrega um arquivo de vendas local (.csv separado por ';' em latin1, ou planilha excel)
+def carregar_arquivo_vendas(caminho, skus=None, data_inicial=None, data_final=None):
+    # armazém parquet: o filtro de skus e datas é aplicado na própria leitura
+    from armazem_parquet import eh_armazem_parquet, parquet_disponivel, ler_vendas_parquet
+    if eh_armazem_parquet(caminho):
+        if not parquet_disponivel():
+            raise ValueError("Leitura de parquet requer o pyarrow instalado")
+        return ler_vendas_parquet(caminho, skus, data_inicial, data_final)
+
+    extensao = os.path.splitext(caminho)[1].lower()
+
+    if extensao == ".csv":
+        # cabeçalho validado antes da leitura; o filtro de skus é aplicado bloco a bloco
+        validar_cabecalho(caminho, encoding='latin1')
+        with open(caminho, 'rb') as arquivo:
+            dados = ler_csv_vendas(arquivo, encoding='latin1', skus=skus)
+        skus = None
+    elif extensao in [".xls", ".xlsx"]:
+        dados = pd.read_excel(caminho)
+        if not all(coluna in dados.columns for coluna in COLUNAS_VENDAS):
+            raise ValueError(f"O arquivo deve conter as colunas: {', '.join(COLUNAS_VENDAS)}")
+        dados = dados[COLUNAS_VENDAS].dropna(subset=['id_produto'])
+        dados['data_dia'] = pd.to_datetime(dados['data_dia'], errors='coerce')
+        dados = compactar_vendas(dados)
+    else:
+        raise ValueError(f"Formato de arquivo não suportado: {extensao}")
+
+    return filtrar_vendas(dados, skus, data_inicial, data_final)
+
+# mantém só os skus e o período pedidos (None = sem filtro)
+def filtrar_vendas(dados, skus=None, data_inicial=None, data_final=None):
+    filtro = pd.Series(True, index=dados.index)
+    if skus is not None:
+        filtro &= dados['id_produto'].isin(list(skus))
+    if data_inicial is not None:
+        filtro &= dados['data_dia'] >= pd.Timestamp(data_inicial)
+    if data_final is not None:
+        filtro &= dados['data_dia'] <= pd.Timestamp(data_final)
+
+    if filtro.all():
+        return dados
+    return dados[filtro].reset_index(drop=True)
@@ -0,0 +1,157 @@
+# instrumentação das etapas do pipeline (leitura do csv, preparação, treino, previsão, métricas e saída)
+# cada etapa medida vira uma linha json no stderr com duração, linhas processadas e pico de memória,
+# para o node registrar no log; --profile grava as estatísticas do cProfile
+import contextvars
+import functools
+import io
+import json
+import os
+import sys
+import time
+from contextlib import contextmanager
+
+# tipo das linhas de rastreamento no stderr (o backend separa por este campo)
+TIPO_RASTREAMENTO = "rastreamento"
+
+# sku processado no momento (preenchido por contexto_sku)
+_sku_atual = contextvars.ContextVar('sku_atual', default=None)
+
+# totais por etapa acumulados neste processo
+_totais = {}
+
+# o rastreamento é ligado com --rastrear (ou ITAMIND_RASTREAMENTO=1), valendo também para os processos filhos
+def rastreamento_ativo():
+    return os.environ.get('ITAMIND_RASTREAMENTO', '0') == '1'
+
+# pico de memória residente em mb do processo ou, com filhos=True, do maior processo filho já encerrado;
+# o módulo resource só existe em sistemas unix (ru_maxrss em kb no linux, em bytes no macos); no windows
+# usa o pico do working set do psutil, se instalado, e devolve None quando não há como medir
+def memoria_pico_mb(filhos=False):
+    try:
+        import resource
+    except ImportError:
+        return None if filhos else _memoria_pico_psutil()
+
+    pico = resource.getrusage(resource.RUSAGE_CHILDREN if filhos else resource.RUSAGE_SELF).ru_maxrss
+    return pico / (1024 * 1024) if sys.platform == 'darwin' else pico / 1024
+
+def _memoria_pico_psutil():
+    try:
+        import psutil
+    except ImportError:
+        return None
+    memoria = psutil.Process().memory_info()
+    return getattr(memoria, 'peak_wset', memoria.rss) / (1024 * 1024)
+
+def _arredondar(valor):
+    return None if valor is None else round(valor, 1)
+
+# associa as etapas medidas dentro do bloco a um sku
+@contextmanager
+def contexto_sku(sku):
+    token = _sku_atual.set(sku)
+    try:
+        yield
+    finally:
+        _sku_atual.reset(token)
+
+# uma única escrita por linha para que as linhas de processos diferentes não se misturem no stderr
+def _emitir(registro):
+    sys.stderr.write(json.dumps(registro, ensure_ascii=False, default=str) + "\n")
+    sys.stderr.flush()
+
+def _registrar(nome, duracao, linhas):
+    total = _totais.setdefault(nome, {"chamadas": 0, "duracao_s": 0.0, "linhas": 0})
+    total["chamadas"] += 1
+    total["duracao_s"] += duracao
+    total["linhas"] += linhas or 0
+
+    sku = _sku_atual.get()
+    _emitir({
+        "tipo": TIPO_RASTREAMENTO,
+        "etapa": nome,
+        "sku": int(sku) if sku is not None else None,
+        "duracao_ms": round(duracao * 1000, 3),
+        "linhas": linhas,
+        "memoria_pico_mb": _arredondar(memoria_pico_mb()),
+        "pid": os.getpid(),
+    })
+
+# mede um trecho de código; o dicionário devolvido aceita "linhas" quando a contagem só é conhecida no fim
+#   with etapa("saida") as medida:
+#       ...
+#       medida["linhas"] = len(resultados)
+@contextmanager
+def etapa(nome, linhas=None):
+    medida = {"linhas": linhas}
+    if not rastreamento_ativo():
+        yield medida
+        return
+
+    inicio = time.perf_counter()
+    try:
+        yield medida
+    finally:
+        _registrar(nome, time.perf_counter() - inicio, medida["linhas"])
+
+# conta as linhas de um dataframe (ou de outro objeto com tamanho); None se não houver
+def _contar_linhas(objeto):
+    if objeto is None or isinstance(objeto, (str, bytes, dict)) or not hasattr(objeto, '__len__'):
+        return None
+    return len(objeto)
+
+# decorador que mede cada chamada da função como uma etapa; as linhas vêm do dataframe devolvido
+# ou, se a função não devolver um, do primeiro argumento
+def medir_etapa(nome):
+    def decorador(funcao):
+        @functools.wraps(funcao)
+        def envoltorio(*args, **kwargs):
+            if not rastreamento_ativo():
+                return funcao(*args, **kwargs)
+
+            inicio = time.perf_counter()
+            resultado = funcao(*args, **kwargs)
+            duracao = time.perf_counter() - inicio
+
+            linhas = _contar_linhas(resultado) if hasattr(resultado, 'columns') else None
+            if linhas is None and args:
+                linhas = _contar_linhas(args[0])
+            _registrar(nome, duracao, linhas)
+            return resultado
+        return envoltorio
+    return decorador
+
+# emite uma linha com os totais por etapa deste processo (as etapas dos processos filhos saem nas próprias linhas)
+def emitir_resumo():
+    if not rastreamento_ativo() or not _totais:
+        return
+    _emitir({
+        "tipo": TIPO_RASTREAMENTO,
+        "etapa": "resumo",
+        "etapas": {
+            nome: {**total, "duracao_s": round(total["duracao_s"], 4)}
+            for nome, total in _totais.items()
+        },
+        "memoria_pico_mb": _arredondar(memoria_pico_mb()),
+        "pid": os.getpid(),
+    })
+
+# executa o bloco sob o cProfile, grava as estatísticas em caminho (lidas com pstats ou snakeviz)
+# e imprime no stderr as funções com maior tempo acumulado
+@contextmanager
+def perfilar(caminho, limite=25):
+    import cProfile
+    import pstats
+
+    perfil = cProfile.Profile()
+    perfil.enable()
+    try:
+        yield perfil
+    finally:
+        perfil.disable()
+        perfil.dump_stats(caminho)
+
+        texto = io.StringIO()
+        pstats.Stats(perfil, stream=texto).sort_stats('cumulative').print_stats(limite)
+        print(texto.getvalue(), file=sys.stderr)
+        print(f"Estatísticas do cProfile gravadas em {caminho}", file=sys.stderr)
@@ -1,117 +1,143 @@
 # importando bibliotecas necessárias
-import pandas as pd
-import numpy as np
-from prophet import Prophet
-from sklearn.metrics import root_mean_squared_error, mean_absolute_percentage_error
-from datetime import timedelta
+import math
 import os
 import json
 import sys
 import warnings
+import argparse
+import io
+import time
+from functools import partial
+from paralelo import criar_pool
+from modelos_rapidos import prever_por_nivel, MOTORES
+from instrumentacao import medir_etapa, etapa, contexto_sku, emitir_resumo, perfilar
+from ingestao import ler_csv_vendas, ler_csv_stdin, carregar_arquivo_vendas
+from preparacao import particionar_por_sku, preparar_sku
+from cache_modelos import (cache_ativo, calcular_impressao_digital, carregar_modelo, salvar_modelo, aplicar_limites,
+                           chave_validacao)
+from relatorio import gerar_relatorios_operacionais
+from feriados import feriados_para_historico
+from cubo_vendas import montar_cubo_vendas, obter_cubo_arquivo
+from previsao_rapida import previsao_rapida_ativa, obter_amostras_incerteza, configurar_incerteza, prever_horizonte, prever_em_lote
+from cache_resultados import cache_resultados_ativo, prever_com_cache
+from serializacao import HORIZONTE_PADRAO, horizonte_valido, previsoes_para_registros, para_json
+from historico_vendas import acrescentar_vendas, carregar_pendentes, limpar_pendentes
+from treino_incremental import treino_incremental_ativo, obter_parametros_iniciais, registrar_tempo_treino
+from importacao import importar_sob_demanda, carregar_agora
+
+# pandas e numpy só são carregados no primeiro uso; prophet e scikit-learn dentro das funções que os usam
+pd = importar_sob_demanda("pandas")
+np = importar_sob_demanda("numpy")
 
 # ignora avisos para uma saída mais limpa
 warnings.filterwarnings('ignore')
 
-def obter_feriados():
-    return pd.DataFrame({
-        "holiday": "feriado",
-        "ds": pd.to_datetime([
-            "2025-01-01", "2025-03-29", "2025-04-21", "2025-05-01",
-            "2025-06-29", "2025-07-28", "2025-09-07", "2025-09-08",
-            "2025-10-12", "2025-11-02", "2025-11-15", "2025-12-08", "2025-12-25"
-        ]),
-        "lower_window": 0,
-        "upper_window": 1
-    })
-
-def processar_csv_entrada():
-    try:
-        # lê todo o conteúdo da entrada padrão
-        conteudo_csv = sys.stdin.read()
-
-        # salva o conteúdo em um arquivo temporário para facilitar a leitura com pandas
-        with open('dados_temporarios.csv', 'w', encoding='latin1') as arquivo:
-            arquivo.write(conteudo_csv)
+# parâmetros do prophet usados em todos os treinos (também compõem a chave do cache de modelos)
+PARAMETROS_MODELO = {
+    "weekly_seasonality": True,
+    "yearly_seasonality": False, # desativado para focar em padrões semanais
+    "daily_seasonality": False,
+}
 
-        # lê os dados do arquivo temporário
-        dados = pd.read_csv('dados_temporarios.csv', encoding='latin1', sep=';')
+# identifica o formato de saída deste script no cache de resultados
+SCRIPT = "main"
 
-        # converte a coluna de data
-        dados['data_dia'] = pd.to_datetime(dados['data_dia'], format='%d/%m/%Y', errors='coerce')
-
-        # remove o arquivo temporário após o uso
-        os.remove('dados_temporarios.csv')
+@medir_etapa("leitura_csv")
+def processar_csv_entrada(conteudo_csv=None):
+    try:
+        # lê direto do buffer da entrada padrão, a menos que o conteúdo já tenha sido recebido (modo servidor)
+        if conteudo_csv is None:
+            return ler_csv_stdin()
 
-        return dados
+        return ler_csv_vendas(io.StringIO(conteudo_csv))
 
     except Exception as e:
         print(f"Erro ao processar CSV da entrada padrão: {e}", file=sys.stderr)
         return pd.DataFrame()
 
-def carregar_arquivo_local(caminho):
-    # obtém a extensão do arquivo para determinar como lê-lo
-    extensao = os.path.splitext(caminho)[1].lower()
-
-    if extensao == ".csv":
-        dados = pd.read_csv(caminho, encoding='latin1', sep=';')
-        # converte a data para o formato datetime
-        dados['data_dia'] = pd.to_datetime(dados['data_dia'], format='%d/%m/%Y', errors='coerce')
-    elif extensao in [".xls", ".xlsx"]:
-        dados = pd.read_excel(caminho)
-        # garante que a coluna de data está no formato correto
-        dados['data_dia'] = pd.to_datetime(dados['data_dia'], errors='coerce')
-    else:
-        raise ValueError(f"Formato de arquivo não suportado: {extensao}")
-
-    # valida se as colunas essenciais estão presentes no arquivo
-    colunas_necessarias = ["data_dia", "id_produto", "total_venda_dia_kg"]
-    if not all(col in dados.columns for col in colunas_necessarias):
-        raise ValueError(f"O arquivo deve conter as colunas: {', '.join(colunas_necessarias)}")
-
-    return dados
+# carrega um arquivo local de vendas (.csv, .xlsx ou armazém parquet) com só os skus pedidos;
+# o csv tem o cabeçalho validado antes da leitura e é lido em blocos, guardando apenas as linhas desses skus
+def carregar_arquivo_local(caminho, skus=None):
+    return carregar_arquivo_vendas(caminho, skus=skus)
 
+# histórico ds/y do sku sem linhas ausentes ou negativas, ordenado por data (mesma preparação do modo integração)
+@medir_etapa("preparacao")
 def preparar_dados_para_prophet(dados_brutos, sku):
     try:
-        # filtra o dataframe para o sku desejado
-        dados_sku = dados_brutos[dados_brutos['id_produto'] == sku].copy()
-
-        if dados_sku.empty:
-            return pd.DataFrame()
-
-        # seleciona e renomeia as colunas para o padrão do prophet
-        dados_prophet = dados_sku[['data_dia', 'total_venda_dia_kg']].copy()
-        dados_prophet.columns = ['ds', 'y']
-
-        # remove linhas com dados ausentes e vendas negativas
-        dados_prophet = dados_prophet.dropna()
-        dados_prophet = dados_prophet[dados_prophet['y'] >= 0]
-
-        # ordena os dados por data
-        dados_prophet = dados_prophet.sort_values('ds')
-
-        return dados_prophet
+        return preparar_sku(dados_brutos, sku)
 
     except Exception as e:
         print(f"Erro ao preparar dados para o SKU {sku}: {e}", file=sys.stderr)
         return pd.DataFrame()
 
-def treinar_modelo_prophet(dados):
+@medir_etapa("treino")
+def treinar_modelo_prophet(dados, parametros_iniciais=None):
     try:
+        from prophet import Prophet
+
         modelo = Prophet(
-            weekly_seasonality=True,
-            yearly_seasonality=False, # desativado para focar em padrões semanais
-            daily_seasonality=False,
-            holidays=obter_feriados() # adiciona feriados
+            **PARAMETROS_MODELO,
+            holidays=feriados_para_historico(dados['ds']) # adiciona feriados do período
         )
-        modelo.fit(dados)
+        # no treino incremental a otimização parte dos parâmetros do modelo anterior
+        if parametros_iniciais is not None:
+            modelo.fit(dados, init=parametros_iniciais)
+        else:
+            modelo.fit(dados)
         return modelo
 
     except Exception as e:
         print(f"Erro ao treinar o modelo: {e}", file=sys.stderr)
         return None
 
+# reaproveita o modelo do cache em disco se o histórico do sku não mudou; senão treina e salva
+# com validacao=True (modelo treinado sem a semana reservada do motor auto) o modelo fica em chave
+# própria no cache, sem treino incremental nem registro de tempo, para não se passar pelo modelo do sku
+def obter_modelo(dados_sku, sku, validacao=False):
+    if not cache_ativo():
+        return treinar_modelo_prophet(dados_sku)
+
+    impressao = calcular_impressao_digital(dados_sku, PARAMETROS_MODELO, feriados_para_historico(dados_sku['ds']))
+    if validacao:
+        modelo = carregar_modelo(chave_validacao(sku), impressao)
+        if modelo is None:
+            modelo = treinar_modelo_prophet(dados_sku)
+            if modelo is not None:
+                salvar_modelo(chave_validacao(sku), impressao, modelo)
+        return modelo
+
+    modelo = carregar_modelo(sku, impressao)
+    if modelo is not None:
+        return modelo
+
+    # com histórico novo, tenta o treino aquecido a partir do último modelo do sku
+    modelo = None
+    aquecido = False
+    if treino_incremental_ativo():
+        parametros_iniciais = obter_parametros_iniciais(sku)
+        if parametros_iniciais is not None:
+            inicio = time.perf_counter()
+            modelo = treinar_modelo_prophet(dados_sku, parametros_iniciais)
+            aquecido = modelo is not None
+
+    if modelo is None:
+        inicio = time.perf_counter()
+        modelo = treinar_modelo_prophet(dados_sku)
+
+    if modelo is not None:
+        registrar_tempo_treino(sku, time.perf_counter() - inicio, aquecido)
+        salvar_modelo(sku, impressao, modelo)
+    return modelo
+
+@medir_etapa("previsao")
 def gerar_previsao(modelo, dias_previsao=30):
     try:
+        configurar_incerteza(modelo)
+
+        # modo rápido: yhat do histórico direto dos parâmetros e incerteza só no horizonte
+        if previsao_rapida_ativa():
+            return prever_horizonte(modelo, dias_previsao)
+
         # cria um dataframe futuro para fazer as previsões
         futuro = modelo.make_future_dataframe(periods=dias_previsao)
         previsao = modelo.predict(futuro)
@@ -121,8 +147,11 @@ def gerar_previsao(modelo, dias_previsao=30):
         print(f"Erro ao gerar previsão: {e}", file=sys.stderr)
         return pd.DataFrame()
 
+@medir_etapa("metricas")
 def calcular_metricas(dados_reais, previsao):
     try:
+        from sklearn.metrics import root_mean_squared_error, mean_absolute_percentage_error
+
         # une os dados reais com os previstos para comparação
         dados_unidos = pd.merge(dados_reais, previsao[['ds', 'yhat']], on='ds', how='inner')
 
@@ -143,142 +172,384 @@ def calcular_metricas(dados_reais, previsao):
         return 0.0, 0.0
 
 def calcular_retirada(quantidade_prevista, percentual_perda=15):
-    if quantidade_prevista is None or pd.isna(quantidade_prevista) or quantidade_prevista <= 0:
+    if quantidade_prevista is None or math.isnan(quantidade_prevista) or quantidade_prevista <= 0:
         return "-"
     # fórmula para encontrar a quantidade original antes da perda percentual
     quantidade_congelado = quantidade_prevista / (1 - (percentual_perda / 100))
     return round(quantidade_congelado, 2)
 
 def gerar_relatorio_operacional(previsao, sku, data_alvo_str):
-    relatorio_lista = []
+    # calcula d, d+1 e d+2 com o motor vetorizado de relatórios
+    relatorio = gerar_relatorios_operacionais({sku: previsao}, [data_alvo_str]).iloc[0]
 
-    # mapeia a data de retirada (d-2) para a quantidade prevista na data da venda (d)
-    retirada_por_data = {}
+    # formata para exibição no terminal ("-" quando não há quantidade)
+    def formatar(valor):
+        return "-" if pd.isna(valor) else round(float(valor), 2)
 
-    for _, row in previsao.iterrows():
-        data_venda = row["ds"].date()
-        kg_previsto = round(row["yhat"], 2)
-        data_retirada = data_venda - timedelta(days=2)
-        retirada_por_data[data_retirada] = kg_previsto
+    return pd.DataFrame([{
+        "Data de Retirada": relatorio["data_retirada"].strftime("%d/%m/%Y"),
+        "SKU": sku,
+        "Kg a retirar hoje (venda em D+2)": formatar(relatorio["kg_a_retirar"]),
+        "Kg em descongelamento (venda em D+1)": formatar(relatorio["kg_em_descongelamento"]),
+        "Kg disponível para venda hoje (D)": formatar(relatorio["kg_para_venda_hoje"]),
+    }])
 
-    # converte a data alvo para o formato de data
-    data_alvo = pd.to_datetime(data_alvo_str).date()
+# calcula a quantidade total vendida em um dia da semana selecionado (domingo, segunda,...) e compara entre os meses da base de dados
+# a soma sai do cubo sku x dia da semana x mês; o texto no terminal é só a apresentação da consulta
+def calcular_soma_por_dia_semana(dados_prophet, dia_semana, sku=0, cubo=None):
+    if cubo is None:
+        cubo = montar_cubo_vendas(pd.DataFrame({
+            'data_dia': dados_prophet['ds'],
+            'id_produto': sku,
+            'total_venda_dia_kg': dados_prophet['y'],
+        }))
+
+    consulta = cubo.consultar(sku, dia_semana)
+    soma_mensal = {mes["ano_mes"]: mes["total_kg"] for mes in consulta["meses"]}
 
-    # calcula as quantidades para o relatório com base na data alvo
-    # o que retirar hoje (data_alvo) para vender em d+2
-    kg_a_retirar = retirada_por_data.get(data_alvo)
-    # o que está em descongelamento (foi retirado ontem) para vender amanhã (d+1)
-    kg_em_descongelamento = retirada_por_data.get(data_alvo - timedelta(days=1))
-    # o que está pronto para venda hoje (foi retirado anteontem)
-    kg_para_venda_hoje = retirada_por_data.get(data_alvo - timedelta(days=2))
+    # imprime no terminal
+    print(f"\n📊 Comparativo de vendas para '{consulta['dia_semana'].capitalize()}' por mês:")
+    for mes, total in soma_mensal.items():
+        print(f" - {mes}: {total} kg")
 
+    return soma_mensal
+
+
+# skus com menos linhas que isso não são previstos
+MINIMO_LINHAS_SKU = 10
+
+# treina o modelo e gera a previsão dos próximos dias de um sku no formato de saída json
+def processar_sku(dados_sku, sku, horizonte=HORIZONTE_PADRAO):
+    # as etapas medidas abaixo ficam associadas ao sku
+    with contexto_sku(sku):
+        modelo = obter_modelo(dados_sku, sku)
+        if modelo is None:
+            return None
+
+        # gera previsão para o horizonte pedido
+        previsao = gerar_previsao(modelo, dias_previsao=horizonte)
+        if previsao.empty:
+            return None
+
+        rmse, mape = calcular_metricas(dados_sku, previsao)
+
+        return formatar_resultado(sku, previsao, rmse, mape, horizonte)
+
+# treina os skus de um lote e faz a previsão rápida de todos os modelos juntos (prever_em_lote),
+# com o mesmo resultado de processar_sku para cada sku
+def processar_lote_skus(itens, horizonte=HORIZONTE_PADRAO):
+    modelos = []
+    for sku, dados_sku in itens:
+        with contexto_sku(sku):
+            modelo = obter_modelo(dados_sku, sku)
+        if modelo is not None:
+            modelos.append((sku, modelo))
+
+    with etapa("previsao_lote", len(modelos)):
+        try:
+            previsoes = prever_em_lote(modelos, horizonte)
+        except Exception as e:
+            print(f"Erro na previsão em lote, prevendo os SKUs um a um: {e}", file=sys.stderr)
+            previsoes = {sku: gerar_previsao(modelo, dias_previsao=horizonte) for sku, modelo in modelos}
+
+    resultados = []
+    for sku, dados_sku in itens:
+        previsao = previsoes.get(sku)
+        if previsao is None or previsao.empty:
+            resultados.append((sku, None))
+            continue
+        with contexto_sku(sku):
+            rmse, mape = calcular_metricas(dados_sku, previsao)
+            resultados.append((sku, formatar_resultado(sku, previsao, rmse, mape, horizonte)))
+    return resultados
+
+# treina só com o histórico de treino e prevê os dias reservados (validação do motor auto)
+def prever_validacao(treino, sku, dias):
+    with contexto_sku(sku):
+        modelo = obter_modelo(treino, sku, validacao=True)
+        if modelo is None:
+            return None
+        return gerar_previsao(modelo, dias_previsao=dias)
+
+# formata os dias finais da previsão (arredondados, sem negativos) e as métricas no json de saída
+@medir_etapa("formatacao")
+def formatar_resultado(sku, previsao, rmse, mape, horizonte=HORIZONTE_PADRAO):
+    return {
+        "sku": int(sku),
+        "rmse": round(rmse, 2),
+        "mape": round(mape, 2),
+        "previsoes": previsoes_para_registros(previsao, horizonte, limitar=True)
+    }
 
-    relatorio_lista.append({
-        "Data de Retirada": data_alvo.strftime("%d/%m/%Y"),
-        "SKU": sku,
-        "Kg a retirar hoje (venda em D+2)": calcular_retirada(kg_a_retirar),
-        "Kg em descongelamento (venda em D+1)": calcular_retirada(kg_em_descongelamento),
-        "Kg disponível para venda hoje (D)": round(kg_para_venda_hoje, 2) if kg_para_venda_hoje else "-",
-    })
+# gera a previsão de 7 dias de cada sku com dados suficientes, entregando cada resultado assim que fica pronto
+# (ordenado=False libera os skus na ordem em que terminam, para a saída em streaming)
+def gerar_previsoes_em_fluxo(dados_brutos, num_workers=None, executor=None, ordenado=True, motor="prophet",
+                             horizonte=HORIZONTE_PADRAO):
+    # prepara os dados de todos os skus em uma única passada
+    with etapa("particionamento", len(dados_brutos)):
+        particoes = particionar_por_sku(dados_brutos)
+
+    yield from prever_particoes_em_fluxo(particoes, num_workers, executor, ordenado, motor, horizonte)
+
+# previsão dos skus já preparados ({sku: ds/y}), descartando os que não têm dados suficientes
+def prever_particoes_em_fluxo(particoes, num_workers=None, executor=None, ordenado=True, motor="prophet",
+                              horizonte=HORIZONTE_PADRAO):
+    tarefas = [
+        (sku, dados_sku)
+        for sku, dados_sku in particoes.items()
+        if len(dados_sku) >= MINIMO_LINHAS_SKU
+    ]
+
+    # distribui o treino e a previsão dos skus entre os processos (ou usa os modelos rápidos, conforme o motor)
+    prever = partial(
+        prever_por_nivel, processar_sku=partial(processar_sku, horizonte=horizonte),
+        formatar_resultado=partial(formatar_resultado, horizonte=horizonte), motor=motor,
+        dias_previsao=horizonte, num_workers=num_workers, executor=executor, ordenado=ordenado,
+        validar_sku=prever_validacao,
+        processar_lote=partial(processar_lote_skus, horizonte=horizonte) if previsao_rapida_ativa() else None
+    )
+
+    # skus com o mesmo histórico da última execução saem do cache de resultados
+    # (o motor global ajusta todos os skus juntos, então o resultado de um sku depende dos demais)
+    if motor != "global" and cache_resultados_ativo():
+        yield from prever_com_cache(tarefas, prever, parametros_resultado(motor, horizonte), ordenado)
+    else:
+        yield from prever(tarefas)
+
+    # descarta os modelos menos usados se o cache passou do limite
+    if cache_ativo():
+        aplicar_limites()
+
+# parâmetros que, junto com o histórico do sku, determinam o resultado guardado no cache de resultados
+def parametros_resultado(motor, horizonte):
+    return {
+        "script": SCRIPT,
+        "motor": motor,
+        "horizonte": horizonte,
+        "modelo": PARAMETROS_MODELO,
+        "previsao_rapida": previsao_rapida_ativa(),
+        "amostras_incerteza": obter_amostras_incerteza(),
+        "incremental": treino_incremental_ativo(),
+    }
 
-    return pd.DataFrame(relatorio_lista)
+# gera a previsão de 7 dias para todos os skus com dados suficientes
+def gerar_previsoes(dados_brutos, num_workers=None, executor=None, motor="prophet", horizonte=HORIZONTE_PADRAO):
+    return list(gerar_previsoes_em_fluxo(dados_brutos, num_workers, executor, motor=motor, horizonte=horizonte))
 
-# calcula a quantidade total vendida em um dia da semana selecionado (domingo, segunda,...) e compara entre os meses da base de dados
-def calcular_soma_por_dia_semana(dados_prophet, dia_semana):
-
-    # cria um dicionário de mapeamento de nomes dos dias da semana para o número correspondente que o pandas usa
-    dias_map = {
-        'segunda': 0,
-        'terça': 1,
-        'quarta': 2,
-        'quinta': 3,
-        'sexta': 4,
-        'sábado': 5,
-        'domingo': 6
-    }
+# modo servidor: mantém bibliotecas e pool de processos carregados entre requisições
+def iniciar_servidor(args):
+    from servidor import servir_tcp, servir_linhas
 
-    # converte o texto do usuário para letras minúsculas
-    dia_semana = dia_semana.lower()
+    executor = criar_pool(args.workers)
+    carregar_agora("numpy", "pandas")
 
-    # verifica se o dia informado é válido
-    if dia_semana not in dias_map:
-        raise ValueError(f"Dia inválido: '{dia_semana}'. Use: {', '.join(dias_map.keys())}")
+    def prever_csv(conteudo_csv):
+        dados_brutos = processar_csv_entrada(conteudo_csv)
+        if dados_brutos.empty:
+            return []
+        # sem pool (--workers 1) os skus rodam no próprio processo, sem criar um pool a cada requisição
+        return gerar_previsoes(dados_brutos, args.workers, executor, motor=args.motor, horizonte=args.horizonte)
 
-    # obtém o número do dia da semana correspondente
-    numero_dia = dias_map[dia_semana]
+    try:
+        if args.servidor:
+            servir_tcp(prever_csv, args.host, args.porta)
+        else:
+            servir_linhas(prever_csv)
+    finally:
+        if executor is not None:
+            executor.shutdown()
+
+# lê as opções da linha de comando
+def ler_argumentos():
+    parser = argparse.ArgumentParser(description="Previsão de vendas por SKU com Prophet")
+    parser.add_argument('--workers', type=int, default=None,
+                        help="número de processos para treinar os SKUs (padrão: ITAMIND_WORKERS ou total de núcleos)")
+    parser.add_argument('--ndjson', action='store_true',
+                        help="imprime uma linha json por SKU assim que cada previsão termina")
+    parser.add_argument('--motor', choices=MOTORES, default="prophet",
+                        help="prophet (padrão), rapido (modelos por dia da semana) ou auto (rápido para SKUs de baixo volume, prophet só onde vence)")
+    parser.add_argument('--horizonte', type=horizonte_valido, default=HORIZONTE_PADRAO,
+                        help="dias de previsão entregues por SKU no json (padrão: 7)")
+    parser.add_argument('--rastrear', action='store_true',
+                        help="emite no stderr uma linha json por etapa (tempo, linhas e pico de memória), por SKU")
+    parser.add_argument('--profile', metavar='CAMINHO',
+                        help="grava as estatísticas do cProfile da execução neste arquivo (SKUs no processo principal)")
+    parser.add_argument('--retirada', type=float, metavar='KG',
+                        help="só calcula a quantidade a retirar do freezer para a venda prevista (não carrega o prophet)")
+    parser.add_argument('--perda', type=float, default=15, help="percentual de perda no descongelamento (padrão: 15)")
+    parser.add_argument('--dia-semana', metavar='DIA',
+                        help="só soma as vendas do dia da semana por mês (com --arquivo e --sku; não carrega o prophet)")
+    parser.add_argument('--cubo', action='store_true',
+                        help="imprime em json a soma de vendas por SKU x dia da semana x mês do --arquivo (não carrega o prophet)")
+    parser.add_argument('--arquivo', help="arquivo de vendas (.csv, .xlsx ou armazém parquet) usado por --dia-semana e --cubo")
+    parser.add_argument('--sku', type=int, help="SKU usado por --dia-semana (filtro opcional em --cubo)")
+    parser.add_argument('--mes-inicial', metavar='AAAA-MM', help="primeiro mês incluído em --cubo")
+    parser.add_argument('--mes-final', metavar='AAAA-MM', help="último mês incluído em --cubo")
+    parser.add_argument('--sem-cache', action='store_true',
+                        help="ignora os caches de modelos e de resultados em disco e prevê todos os SKUs novamente")
+    parser.add_argument('--incremental', action='store_true',
+                        help="retreina SKUs com histórico novo partindo dos parâmetros do último modelo salvo")
+    parser.add_argument('--acrescentar', nargs='?', const='-', metavar='ARQUIVO',
+                        help="junta só as vendas novas (do arquivo ou, sem ele, da entrada padrão) ao histórico em disco "
+                             "e prevê apenas os SKUs alterados")
+    parser.add_argument('--historico', metavar='PASTA',
+                        help="pasta do histórico preparado usado por --acrescentar (padrão: ITAMIND_HISTORICO ou .historico_vendas)")
+    parser.add_argument('--previsao-rapida', action='store_true',
+                        help="prevê só o horizonte com o yhat do histórico calculado direto dos parâmetros do modelo")
+    parser.add_argument('--amostras-incerteza', type=int, metavar='N',
+                        help="amostras do intervalo de incerteza do prophet (0 = intervalo analítico pelos resíduos, "
+                             "calculado pela previsão rápida)")
+    parser.add_argument('--servidor', action='store_true',
+                        help="mantém o processo ativo atendendo previsões via socket tcp local")
+    parser.add_argument('--linhas', action='store_true',
+                        help="mantém o processo ativo atendendo previsões em json por linha via stdin/stdout")
+    parser.add_argument('--host', default='127.0.0.1', help="endereço do modo servidor")
+    parser.add_argument('--porta', type=int, default=8765, help="porta do modo servidor")
+    return parser.parse_args()
 
-    # filtra os dados para o dia da semana desejado
-    dados_filtrados = dados_prophet[dados_prophet['ds'].dt.weekday == numero_dia].copy()
+def main():
+    args = ler_argumentos()
+
+    # desliga o cache também nos processos filhos
+    if args.sem_cache:
+        os.environ['ITAMIND_CACHE_MODELOS_ATIVO'] = '0'
+        os.environ['ITAMIND_CACHE_RESULTADOS_ATIVO'] = '0'
+    if args.incremental:
+        os.environ['ITAMIND_TREINO_INCREMENTAL'] = '1'
+    if args.previsao_rapida:
+        os.environ['ITAMIND_PREVISAO_RAPIDA'] = '1'
+    if args.amostras_incerteza is not None:
+        os.environ['ITAMIND_AMOSTRAS_INCERTEZA'] = str(args.amostras_incerteza)
+    if args.rastrear:
+        os.environ['ITAMIND_RASTREAMENTO'] = '1'
+
+    # operações rápidas, que respondem sem treinar modelos
+    if args.retirada is not None:
+        print(json.dumps({"retirada_kg": calcular_retirada(args.retirada, args.perda)}))
+        return
+    if args.cubo:
+        executar_cubo(args)
+        return
+    if args.dia_semana:
+        executar_soma_dia_semana(args)
+        return
 
-    # extrai ano-mês para agrupamento
-    dados_filtrados['ano_mes'] = dados_filtrados['ds'].dt.to_period('M').astype(str)
+    # acréscimo diário ao histórico preparado, prevendo só os skus alterados
+    if args.acrescentar:
+        executar_acrescimo(args)
+        emitir_resumo()
+        return
 
-    # soma por mês
-    soma_mensal = dados_filtrados.groupby('ano_mes')['y'].sum().round(2)
+    # modo servidor persistente (socket tcp ou json por linha na entrada padrão)
+    if args.servidor or args.linhas:
+        iniciar_servidor(args)
+        return
 
-    # imprime no terminal
-    print(f"\n📊 Comparativo de vendas para '{dia_semana.capitalize()}' por mês:")
-    for mes, total in soma_mensal.items():
-        print(f" - {mes}: {total} kg")
+    # com o cProfile os skus rodam no processo principal (a menos que --workers seja informado)
+    if args.profile:
+        if args.workers is None:
+            args.workers = 1
+        with perfilar(args.profile):
+            executar(args)
+    else:
+        executar(args)
 
-    return soma_mensal.to_dict()
+    emitir_resumo()
 
+# soma por mês das vendas de um dia da semana para um sku do arquivo informado
+def executar_soma_dia_semana(args):
+    if not args.arquivo or args.sku is None:
+        print("Erro: --dia-semana exige --arquivo e --sku", file=sys.stderr)
+        sys.exit(2)
 
+    try:
+        cubo = obter_cubo_arquivo(args.arquivo)
+        if args.sku not in cubo.posicoes:
+            print(f"Nenhum dado encontrado para o SKU {args.sku}")
+            return
+        calcular_soma_por_dia_semana(None, args.dia_semana, args.sku, cubo)
+    except ValueError as ve:
+        print(f"Erro: {ve}", file=sys.stderr)
+        sys.exit(2)
+
+# modo de acréscimo: junta só as linhas novas (do arquivo ou da entrada padrão) ao histórico preparado
+# em disco e prevê apenas os skus cujo histórico mudou; um sku deixa de estar pendente depois que sua
+# previsão é entregue (ou se ainda não tem dados suficientes para ser previsto)
+def executar_acrescimo(args):
+    if args.acrescentar == '-':
+        dados_novos = processar_csv_entrada()
+    else:
+        dados_novos = carregar_arquivo_local(args.acrescentar)
 
+    with etapa("acrescimo", len(dados_novos)):
+        resumo = acrescentar_vendas(dados_novos, args.historico) if not dados_novos.empty else None
+    if resumo is not None:
+        print(f"Histórico atualizado: {json.dumps(resumo)}", file=sys.stderr)
+
+    particoes = carregar_pendentes(args.historico)
+    entregues = [sku for sku, dados_sku in particoes.items() if len(dados_sku) < MINIMO_LINHAS_SKU]
+    previsoes = prever_particoes_em_fluxo(particoes, args.workers, ordenado=not args.ndjson, motor=args.motor,
+                                          horizonte=args.horizonte)
+
+    try:
+        if args.ndjson:
+            for resultado in previsoes:
+                with contexto_sku(resultado["sku"]), etapa("saida", 1):
+                    print(para_json(resultado), flush=True)
+                entregues.append(resultado["sku"])
+        else:
+            resultados_finais = list(previsoes)
+            with etapa("saida", len(resultados_finais)):
+                print(para_json(resultados_finais))
+            entregues += [resultado["sku"] for resultado in resultados_finais]
+    finally:
+        limpar_pendentes(entregues, args.historico)
+
+# grade sku x dia da semana x mês do arquivo informado em json (filtros opcionais: --sku, --dia-semana e meses)
+def executar_cubo(args):
+    if not args.arquivo:
+        print("Erro: --cubo exige --arquivo", file=sys.stderr)
+        sys.exit(2)
 
-def main():
+    try:
+        cubo = obter_cubo_arquivo(args.arquivo)
+        grade = cubo.para_json(
+            skus=None if args.sku is None else [args.sku],
+            dias_semana=None if args.dia_semana is None else [args.dia_semana],
+            mes_inicial=args.mes_inicial,
+            mes_final=args.mes_final,
+        )
+        print(json.dumps(grade, ensure_ascii=False))
+    except ValueError as ve:
+        print(f"Erro: {ve}", file=sys.stderr)
+        sys.exit(2)
+
+# executa o modo escolhido: integração via pipe, relatório ou interativo
+def executar(args):
     try:
         # modo de integração: se o script for chamado com dados via pipe (ex: node.js)
         if not sys.stdin.isatty():
             dados_brutos = processar_csv_entrada()
 
             if dados_brutos.empty:
-                print("[]") # retorna um json vazio se não houver dados
+                # sem dados: nenhuma linha no modo ndjson, json vazio no modo lista
+                if not args.ndjson:
+                    print("[]")
+                return
+
+            # streaming: uma linha json compacta por sku assim que a previsão fica pronta
+            if args.ndjson:
+                for resultado in gerar_previsoes_em_fluxo(dados_brutos, args.workers, ordenado=False,
+                                                          motor=args.motor, horizonte=args.horizonte):
+                    with contexto_sku(resultado["sku"]), etapa("saida", 1):
+                        print(para_json(resultado), flush=True)
                 return
 
-            skus_unicos = dados_brutos['id_produto'].unique()
-            resultados_finais = []
-
-            for sku in skus_unicos:
-                # prepara os dados para cada sku
-                dados_sku = preparar_dados_para_prophet(dados_brutos, sku)
-
-                # pula para o próximo sku se não houver dados suficientes
-                if dados_sku.empty or len(dados_sku) < 10:
-                    continue
-
-                modelo = treinar_modelo_prophet(dados_sku)
-                if modelo is None:
-                    continue
-
-                # gera previsão para 7 dias
-                previsao = gerar_previsao(modelo, dias_previsao=7)
-                if previsao.empty:
-                    continue
-
-                rmse, mape = calcular_metricas(dados_sku, previsao)
-
-                # formata a previsão para o json de saída
-                previsoes_futuras = previsao.tail(7)
-                previsoes_json = [
-                    {
-                        "ds": linha['ds'].isoformat(),
-                        "yhat": round(float(linha['yhat']), 2) if linha['yhat'] > 0 else 0,
-                        "yhat_lower": round(float(linha['yhat_lower']), 2) if linha['yhat_lower'] > 0 else 0,
-                        "yhat_upper": round(float(linha['yhat_upper']), 2) if linha['yhat_upper'] > 0 else 0,
-                    }
-                    for _, linha in previsoes_futuras.iterrows()
-                ]
-
-                resultados_finais.append({
-                    "sku": int(sku),
-                    "rmse": round(rmse, 2),
-                    "mape": round(mape, 2),
-                    "previsoes": previsoes_json
-                })
+            resultados_finais = gerar_previsoes(dados_brutos, args.workers, motor=args.motor, horizonte=args.horizonte)
 
             # imprime o resultado final como uma string json
-            print(json.dumps(resultados_finais, ensure_ascii=False, indent=2))
+            with etapa("saida", len(resultados_finais)):
+                print(para_json(resultados_finais))
 
         # modo interativo: se o script for executado diretamente no terminal
         else:
@@ -287,7 +558,7 @@ def main():
             data_alvo = input("Digite a data para o relatório (formato AAAA-MM-DD): ")
             dias_previsao = 30 # previsão mais longa para o relatório
 
-            dados_brutos = carregar_arquivo_local(caminho)
+            dados_brutos = carregar_arquivo_local(caminho, [sku])
             dados_sku = preparar_dados_para_prophet(dados_brutos, sku)
 
             if dados_sku.empty:
@@ -320,15 +591,15 @@ def main():
             print(f"\n Relatório Operacional para {pd.to_datetime(data_alvo).strftime('%d/%m/%Y')}:")
             print(relatorio.to_string(index=False))
 
+            dia = input("Digite o dia da semana (ex: domingo, segunda, ...): ").strip().lower()
+            try:
+                calcular_soma_por_dia_semana(dados_sku, dia, sku)
+            except ValueError as ve:
+                print(f"Erro: {ve}")
+
     except Exception as e:
         print(f"Ocorreu um erro inesperado na execução: {e}", file=sys.stderr)
         return
-    
-    dia = input("Digite o dia da semana (ex: domingo, segunda, ...): ").strip().lower()
-    try:
-        calcular_soma_por_dia_semana(dados_sku, dia)
-    except ValueError as ve:
-        print(f"Erro: {ve}")
 
 # ponto de entrada do script
 if __name__ == "__main__":
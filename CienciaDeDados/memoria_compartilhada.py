@@ -0,0 +1,114 @@
+# entrega dos históricos preparados (ds, y) aos processos de previsão sem serializar os dados:
+# as colunas de todos os skus são gravadas uma única vez em um arquivo mapeado em memória
+# (em /dev/shm quando existe, isto é, memória compartilhada do sistema) e cada tarefa leva só o
+# caminho do arquivo e as posições inicial e final do sku; o worker mapeia o arquivo uma vez e monta
+# visões numpy sem cópia, então o custo de despachar uma tarefa não cresce com o tamanho do histórico
+# pode ser desligado com ITAMIND_MEMORIA_COMPARTILHADA=0 (volta a serializar cada fatia)
+import os
+import sys
+import tempfile
+from collections import OrderedDict, namedtuple
+
+from importacao import importar_sob_demanda
+
+np = importar_sob_demanda("numpy")
+pd = importar_sob_demanda("pandas")
+
+# pasta dos arquivos compartilhados: /dev/shm fica em memória no linux
+PASTA_MEMORIA = '/dev/shm' if os.path.isdir('/dev/shm') else tempfile.gettempdir()
+
+# arquivos mapeados mantidos abertos por worker (um por lote em andamento no modo servidor)
+MAXIMO_ANEXOS = 4
+
+_anexos = OrderedDict()
+
+def memoria_compartilhada_ativa():
+    return os.environ.get('ITAMIND_MEMORIA_COMPARTILHADA', '1') != '0'
+
+# referência às linhas de um sku dentro do arquivo compartilhado; é o que vai para o worker no lugar dos dados
+class FatiaCompartilhada(namedtuple('FatiaCompartilhada', 'caminho tipo_ds tipo_y num_linhas inicio fim')):
+    __slots__ = ()
+
+    # histórico ds/y do sku como visões (somente leitura) do arquivo mapeado
+    def carregar(self):
+        tabela = _anexar(self.caminho, self.tipo_ds, self.tipo_y, self.num_linhas)
+        return tabela.iloc[self.inicio:self.fim]
+
+# tabela ds/y de todos os skus do arquivo, mapeada uma vez por processo; o recorte de cada sku
+# com iloc (como em particionar_por_sku) continua sem cópia e sai bem mais barato que montar
+# um dataframe novo por tarefa
+def _anexar(caminho, tipo_ds, tipo_y, num_linhas):
+    if caminho in _anexos:
+        _anexos.move_to_end(caminho)
+        return _anexos[caminho]
+
+    tipo_ds, tipo_y = np.dtype(tipo_ds), np.dtype(tipo_y)
+    mapa = np.memmap(caminho, dtype=np.uint8, mode='r')
+    fim_ds = num_linhas * tipo_ds.itemsize
+    tabela = pd.DataFrame({
+        'ds': mapa[:fim_ds].view(tipo_ds),
+        'y': mapa[fim_ds:fim_ds + num_linhas * tipo_y.itemsize].view(tipo_y),
+    }, copy=False)
+
+    # o mapeamento antigo é liberado quando a última visão dele deixa de ser usada
+    _anexos[caminho] = tabela
+    if len(_anexos) > MAXIMO_ANEXOS:
+        _anexos.popitem(last=False)
+    return tabela
+
+def _e_historico(dados):
+    return isinstance(dados, pd.DataFrame) and list(dados.columns) == ['ds', 'y']
+
+# grava os históricos das tarefas [(chave, dados ds/y)] em um arquivo compartilhado e devolve
+# (caminho, tarefas com FatiaCompartilhada no lugar dos dados); o mesmo histórico usado por várias
+# tarefas (ex: cortes do backtest) é gravado uma vez só. Se alguma tarefa não traz um histórico ds/y,
+# devolve (None, tarefas) sem alterar nada
+def publicar_tarefas(tarefas):
+    historicos = {}
+    for _, dados in tarefas:
+        if not _e_historico(dados):
+            return None, tarefas
+        historicos.setdefault(id(dados), dados)
+
+    if not historicos:
+        return None, tarefas
+
+    # uma única concatenação sai mais barata que ler as colunas de cada sku separadamente
+    tabela = pd.concat(list(historicos.values()), ignore_index=True)
+    ds, y = tabela['ds'].to_numpy(), tabela['y'].to_numpy()
+    if ds.dtype.kind != 'M' or y.dtype.kind not in 'if':
+        return None, tarefas
+
+    tamanhos = np.fromiter((len(dados) for dados in historicos.values()), dtype=np.int64, count=len(historicos))
+    inicios = np.r_[0, np.cumsum(tamanhos)].tolist()
+    posicoes = dict(zip(historicos, zip(inicios[:-1], inicios[1:])))
+
+    descritor, caminho = tempfile.mkstemp(prefix='itamind_', suffix='.vendas', dir=PASTA_MEMORIA)
+    try:
+        tamanho = ds.nbytes + y.nbytes
+        os.ftruncate(descritor, max(tamanho, 1))
+        mapa = np.memmap(caminho, dtype=np.uint8, mode='r+', shape=(max(tamanho, 1),))
+        mapa[:ds.nbytes] = ds.view(np.uint8)
+        mapa[ds.nbytes:tamanho] = y.view(np.uint8)
+        mapa.flush()
+        del mapa
+    except BaseException:
+        liberar(caminho)
+        raise
+    finally:
+        os.close(descritor)
+
+    tarefas = [
+        (chave, FatiaCompartilhada(caminho, ds.dtype.str, y.dtype.str, len(ds), *posicoes[id(dados)]))
+        for chave, dados in tarefas
+    ]
+    return caminho, tarefas
+
+# remove o arquivo compartilhado; workers que já o mapearam continuam lendo até liberar o mapeamento
+def liberar(caminho):
+    try:
+        os.remove(caminho)
+    except FileNotFoundError:
+        pass
+    except OSError as e:
+        print(f"Não foi possível remover o arquivo compartilhado {caminho}: {e}", file=sys.stderr)
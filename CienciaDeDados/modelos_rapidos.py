@@ -0,0 +1,377 @@
+# previsores baratos e vetorizados para skus de baixo volume, ajustados para todos os skus de uma vez,
+# e a seleção por níveis: o prophet só é usado onde vence o modelo barato na mesma semana reservada
+import sys
+from functools import partial
+
+from importacao import importar_sob_demanda
+from paralelo import executar_em_paralelo, executar_em_lotes
+from instrumentacao import etapa, contexto_sku
+from feriados import obter_feriados, JANELA_ANTERIOR, JANELA_POSTERIOR
+
+np = importar_sob_demanda("numpy")
+pd = importar_sob_demanda("pandas")
+
+# skus com menos linhas que isso ou média diária abaixo do limite usam só os modelos baratos
+LIMITE_LINHAS_PROPHET = 56
+LIMITE_MEDIA_KG = 5.0
+
+# meia-vida, em semanas, da média exponencial por dia da semana
+MEIA_VIDA_SEMANAS = 4
+
+# quantil normal do intervalo de 80% (mesma largura padrão do prophet)
+Z_INTERVALO = 1.2816
+
+# motores de previsão aceitos na linha de comando
+MOTORES = ["prophet", "rapido", "auto", "global"]
+
+# dias finais do histórico reservados para comparar o prophet com o modelo barato no motor auto
+DIAS_VALIDACAO = 7
+
+# linhas por bloco ao acumular as somas do modelo global (limita a matriz de variáveis em memória)
+BLOCO_LINHAS_GLOBAL = 262_144
+
+# junta as partições {sku: ds/y} em uma tabela longa ordenada por sku e data
+def _tabela_longa(particoes):
+    tamanhos = [len(dados_sku) for dados_sku in particoes.values()]
+    tabela = pd.DataFrame({
+        'sku': np.repeat(np.array(list(particoes)), tamanhos),
+        'ds': np.concatenate([dados_sku['ds'].to_numpy() for dados_sku in particoes.values()]),
+        'y': np.concatenate([dados_sku['y'].to_numpy(dtype=float) for dados_sku in particoes.values()]),
+    })
+    tabela['dia_semana'] = tabela['ds'].dt.weekday
+    return tabela
+
+# rmse e mape (%) por sku com as mesmas fórmulas do scikit-learn usadas em calcular_metricas
+def _metricas_por_sku(tabela, coluna_prevista):
+    validas = tabela.dropna(subset=[coluna_prevista])
+    erro = validas['y'] - validas[coluna_prevista]
+    erro_percentual = erro.abs() / np.maximum(validas['y'].abs(), np.finfo(np.float64).eps)
+
+    agrupado = pd.DataFrame({
+        'sku': validas['sku'],
+        'quadrado': erro ** 2,
+        'percentual': erro_percentual,
+        'residuo': erro,
+    }).groupby('sku', sort=False)
+
+    return pd.DataFrame({
+        'rmse': np.sqrt(agrupado['quadrado'].mean()),
+        'mape': agrupado['percentual'].mean() * 100,
+        'desvio': agrupado['residuo'].std().fillna(0.0),
+    })
+
+# ajusta o ingênuo sazonal (último valor do mesmo dia da semana) e a média exponencial por dia da semana
+# para todos os skus; devolve {sku: {"modelo", "previsao", "rmse", "mape"}} com o melhor dos dois por rmse
+def ajustar_modelos_rapidos(particoes, dias_previsao=7):
+    if not particoes:
+        return {}
+
+    tabela = _tabela_longa(particoes)
+    grupos = tabela.groupby(['sku', 'dia_semana'], sort=False)['y']
+
+    # média exponencial acumulada até cada dia, dentro da série de cada dia da semana
+    tabela['media_acumulada'] = grupos.ewm(halflife=MEIA_VIDA_SEMANAS).mean().reset_index(level=[0, 1], drop=True)
+
+    # previsões um passo à frente: valor (ou média) da mesma semana anterior
+    tabela['ingenuo'] = grupos.shift(1)
+    tabela['media_exponencial'] = tabela.groupby(['sku', 'dia_semana'], sort=False)['media_acumulada'].shift(1)
+
+    metricas = {
+        'ingenuo': _metricas_por_sku(tabela, 'ingenuo'),
+        'media_exponencial': _metricas_por_sku(tabela, 'media_exponencial'),
+    }
+
+    # valor mais recente de cada modelo por sku e dia da semana (base da previsão futura)
+    ultimos = tabela.groupby(['sku', 'dia_semana'], sort=False).agg(
+        ingenuo=('y', 'last'),
+        media_exponencial=('media_acumulada', 'last'),
+    )
+    media_sku = tabela.groupby('sku', sort=False)['y'].mean()
+
+    # datas futuras de cada sku a partir do último dia de histórico
+    ultimo_dia = tabela.groupby('sku', sort=False)['ds'].max()
+    skus_futuro = np.repeat(ultimo_dia.index.to_numpy(), dias_previsao)
+    deslocamentos = pd.to_timedelta(np.tile(np.arange(1, dias_previsao + 1), len(ultimo_dia)), unit='D')
+    futuro = pd.DataFrame({'sku': skus_futuro, 'ds': np.repeat(ultimo_dia.to_numpy(), dias_previsao) + deslocamentos})
+    futuro['dia_semana'] = futuro['ds'].dt.weekday
+    futuro = futuro.join(ultimos, on=['sku', 'dia_semana'])
+
+    # dia da semana sem histórico usa a média geral do sku
+    for modelo in ['ingenuo', 'media_exponencial']:
+        futuro[modelo] = futuro[modelo].fillna(futuro['sku'].map(media_sku))
+
+    # escolhe o melhor modelo barato de cada sku pelo rmse
+    skus = ultimo_dia.index
+    rmse = pd.DataFrame({modelo: metricas[modelo]['rmse'] for modelo in metricas}).reindex(skus)
+    usa_ingenuo = (rmse['ingenuo'].fillna(np.inf) < rmse['media_exponencial'].fillna(np.inf)).to_numpy()
+    escolha = {
+        coluna: np.where(usa_ingenuo, metricas['ingenuo'][coluna].reindex(skus), metricas['media_exponencial'][coluna].reindex(skus))
+        for coluna in ['rmse', 'mape', 'desvio']
+    }
+
+    # monta a previsão do modelo escolhido para todos os skus de uma vez
+    yhat = np.where(np.repeat(usa_ingenuo, dias_previsao), futuro['ingenuo'], futuro['media_exponencial'])
+    margem = Z_INTERVALO * np.nan_to_num(np.repeat(escolha['desvio'], dias_previsao))
+    previsoes = pd.DataFrame({
+        'ds': futuro['ds'].to_numpy(),
+        'yhat': yhat,
+        'yhat_lower': yhat - margem,
+        'yhat_upper': yhat + margem,
+    })
+
+    # cada sku recebe uma fatia da tabela de previsões
+    resultados = {}
+    for posicao, sku in enumerate(skus):
+        resultados[sku] = {
+            "modelo": "ingenuo" if usa_ingenuo[posicao] else "media_exponencial",
+            "previsao": previsoes.iloc[posicao * dias_previsao:(posicao + 1) * dias_previsao],
+            "rmse": float(np.nan_to_num(escolha['rmse'][posicao])),
+            "mape": float(np.nan_to_num(escolha['mape'][posicao])),
+        }
+
+    return resultados
+
+# variáveis compartilhadas por todos os skus no modelo global: dias da semana (segunda é a base)
+# e um indicador por dia da janela de cada feriado (o próprio dia, o dia seguinte...)
+def _variaveis_compartilhadas(dias, feriados):
+    dia_semana = (dias + 3) % 7  # 1970-01-01 foi uma quinta
+    deslocamentos = range(-JANELA_ANTERIOR, JANELA_POSTERIOR + 1)
+    variaveis = np.empty((len(dias), 6 + len(deslocamentos)))
+    for coluna in range(6):
+        variaveis[:, coluna] = dia_semana == coluna + 1
+    for coluna, deslocamento in enumerate(deslocamentos, start=6):
+        variaveis[:, coluna] = np.isin(dias - deslocamento, feriados)
+    return variaveis
+
+# modelo global ajustado de uma vez para todos os skus por mínimos quadrados:
+#   y / escala_sku = nível_sku + tendência_sku * semanas + efeito_dia_semana + efeito_feriado
+# a escala (média do sku) torna os efeitos de dia da semana e de feriado proporcionais ao volume de cada sku,
+# de forma que os skus compartilham o mesmo formato semanal; os efeitos compartilhados saem de um sistema
+# pequeno (8 x 8) depois de descontar nível e tendência de cada sku (frisch-waugh), e o nível e a tendência
+# de cada sku saem de somas por sku; o custo por sku é só o das somas, sem um ajuste por sku
+# devolve {sku: {"modelo", "previsao", "rmse", "mape"}} no mesmo formato de ajustar_modelos_rapidos
+def ajustar_modelo_global(particoes, dias_previsao=7):
+    if not particoes:
+        return {}
+
+    tabela = _tabela_longa(particoes)
+    skus = np.array(list(particoes))
+    contagem = np.array([len(dados_sku) for dados_sku in particoes.values()])
+    codigos = np.repeat(np.arange(len(skus)), contagem)
+
+    def somar(valores, linhas=slice(None)):
+        return np.bincount(codigos[linhas], weights=valores, minlength=len(skus))
+
+    # alvo normalizado pela média de cada sku
+    y = tabela['y'].to_numpy(dtype=float)
+    escala = somar(y) / contagem
+    escala = np.where(escala > np.finfo(np.float64).eps, escala, 1.0)
+    alvo = y / escala[codigos]
+
+    # tempo em semanas, centrado na média de cada sku (as partições estão ordenadas por data)
+    dias = tabela['ds'].to_numpy(dtype='datetime64[D]').astype(np.int64)
+    ultimo_dia = dias[np.cumsum(contagem) - 1]
+    semanas = (dias - ultimo_dia[codigos]) / 7
+    semanas_media = somar(semanas) / contagem
+    tempo = semanas - semanas_media[codigos]
+    soma_tempo2 = somar(tempo * tempo)
+    inverso_tempo2 = np.divide(1.0, soma_tempo2, out=np.zeros_like(soma_tempo2), where=soma_tempo2 > 1e-12)
+
+    anos = pd.DatetimeIndex([tabela['ds'].min(), tabela['ds'].max()]).year
+    feriados = obter_feriados(int(anos[0]), int(anos[1]) + 1)['ds'].to_numpy(dtype='datetime64[D]').astype(np.int64)
+
+    # somas das variáveis compartilhadas: globais (X'X, X'y) e por sku (sum x, sum tempo * x), em blocos
+    num_variaveis = 6 + JANELA_ANTERIOR + JANELA_POSTERIOR + 1
+    xtx = np.zeros((num_variaveis, num_variaveis))
+    xty = np.zeros(num_variaveis)
+    soma_x = np.zeros((len(skus), num_variaveis))
+    soma_tx = np.zeros((len(skus), num_variaveis))
+    for inicio in range(0, len(dias), BLOCO_LINHAS_GLOBAL):
+        linhas = slice(inicio, inicio + BLOCO_LINHAS_GLOBAL)
+        variaveis = _variaveis_compartilhadas(dias[linhas], feriados)
+        xtx += variaveis.T @ variaveis
+        xty += variaveis.T @ alvo[linhas]
+        for coluna in range(num_variaveis):
+            soma_x[:, coluna] += somar(variaveis[:, coluna], linhas)
+            soma_tx[:, coluna] += somar(tempo[linhas] * variaveis[:, coluna], linhas)
+
+    soma_y = somar(alvo)
+    soma_ty = somar(tempo * alvo)
+
+    # efeitos compartilhados: mínimos quadrados sobre os resíduos de nível e tendência de cada sku
+    projecao_media = soma_x.T / contagem
+    projecao_tendencia = soma_tx.T * inverso_tempo2
+    matriz = xtx - projecao_media @ soma_x - projecao_tendencia @ soma_tx
+    vetor = xty - projecao_media @ soma_y - projecao_tendencia @ soma_ty
+    efeitos = np.linalg.lstsq(matriz, vetor, rcond=None)[0]
+
+    # nível e tendência de cada sku sobre o que sobra depois dos efeitos compartilhados
+    nivel = (soma_y - soma_x @ efeitos) / contagem
+    tendencia = (soma_ty - soma_tx @ efeitos) * inverso_tempo2
+
+    # ajuste dentro da amostra para as métricas e o desvio dos resíduos
+    ajuste = np.empty(len(dias))
+    for inicio in range(0, len(dias), BLOCO_LINHAS_GLOBAL):
+        linhas = slice(inicio, inicio + BLOCO_LINHAS_GLOBAL)
+        ajuste[linhas] = _variaveis_compartilhadas(dias[linhas], feriados) @ efeitos
+    ajuste += nivel[codigos] + tendencia[codigos] * tempo
+    tabela['global'] = ajuste * escala[codigos]
+    metricas = _metricas_por_sku(tabela, 'global').reindex(skus)
+
+    # previsão dos próximos dias de cada sku a partir do último dia de histórico
+    passos = np.tile(np.arange(1, dias_previsao + 1), len(skus))
+    codigos_futuro = np.repeat(np.arange(len(skus)), dias_previsao)
+    dias_futuro = ultimo_dia[codigos_futuro] + passos
+    tempo_futuro = passos / 7 - semanas_media[codigos_futuro]
+    yhat = (
+        nivel[codigos_futuro] + tendencia[codigos_futuro] * tempo_futuro
+        + _variaveis_compartilhadas(dias_futuro, feriados) @ efeitos
+    ) * escala[codigos_futuro]
+    margem = Z_INTERVALO * np.repeat(metricas['desvio'].fillna(0.0).to_numpy(), dias_previsao)
+    previsoes = pd.DataFrame({
+        'ds': dias_futuro.astype('datetime64[D]').astype(tabela['ds'].dtype),
+        'yhat': yhat,
+        'yhat_lower': yhat - margem,
+        'yhat_upper': yhat + margem,
+    })
+
+    rmse = np.nan_to_num(metricas['rmse'].to_numpy()).tolist()
+    mape = np.nan_to_num(metricas['mape'].to_numpy()).tolist()
+    resultados = {}
+    for posicao, sku in enumerate(skus.tolist()):
+        resultados[sku] = {
+            "modelo": "global",
+            "previsao": previsoes.iloc[posicao * dias_previsao:(posicao + 1) * dias_previsao],
+            "rmse": rmse[posicao],
+            "mape": mape[posicao],
+        }
+
+    return resultados
+
+# sku de baixo volume: histórico curto ou vendas médias pequenas
+def baixo_volume(dados_sku):
+    return len(dados_sku) < LIMITE_LINHAS_PROPHET or dados_sku['y'].mean() < LIMITE_MEDIA_KG
+
+# separa o histórico ordenado de um sku em treino e nos últimos `dias` dias, reservados para validação
+def separar_validacao(dados_sku, dias=DIAS_VALIDACAO):
+    corte = dados_sku['ds'].iloc[-1] - pd.Timedelta(days=dias)
+    posicao = int(dados_sku['ds'].searchsorted(corte, side='right'))
+    return dados_sku.iloc[:posicao], dados_sku.iloc[posicao:]
+
+# rmse da previsão (ds, yhat) nos dias reservados; nan quando não há dia em comum
+def rmse_validacao(validacao, previsao):
+    comparacao = validacao.merge(previsao[['ds', 'yhat']], on='ds', how='inner')
+    if comparacao.empty:
+        return float('nan')
+    erro = comparacao['y'].to_numpy(dtype=float) - comparacao['yhat'].to_numpy(dtype=float)
+    return float(np.sqrt(np.mean(erro ** 2)))
+
+# rmse do prophet treinado sem a semana reservada (executado nos workers)
+def _validar_prophet(dados_sku, sku, validar_sku, dias=DIAS_VALIDACAO):
+    treino, validacao = separar_validacao(dados_sku, dias)
+    previsao = validar_sku(treino, sku, dias)
+    if previsao is None or previsao.empty:
+        return None
+    return rmse_validacao(validacao, previsao)
+
+# rmse do melhor modelo barato de cada sku treinado sem a semana reservada
+def _validar_rapidos(tarefas, dias=DIAS_VALIDACAO):
+    separados = {sku: separar_validacao(dados_sku, dias) for sku, dados_sku in tarefas}
+    rapidos = ajustar_modelos_rapidos({sku: treino for sku, (treino, _) in separados.items()}, dias)
+    return {
+        sku: rmse_validacao(validacao, rapidos[sku]["previsao"])
+        for sku, (_, validacao) in separados.items()
+    }
+
+# executa as previsões por níveis e entrega os resultados no formato do script
+#   motor="prophet": só prophet (comportamento original)
+#   motor="rapido": só os modelos baratos
+#   motor="auto": baratos para skus de baixo volume; nos demais os dois motores são treinados sem os últimos
+#     DIAS_VALIDACAO dias e o prophet só é usado se tiver rmse menor nesses dias
+#   motor="global": um único modelo ajustado para todos os skus (ajustar_modelo_global)
+# processar_sku(dados_sku, sku) -> resultado do prophet; formatar_resultado(sku, previsao, rmse, mape) -> resultado
+# validar_sku(treino, sku, dias) -> previsão (ds, yhat) do prophet treinado só com `treino` (motor auto)
+# processar_lote([(sku, dados_sku)]) -> [(sku, resultado)], se informado, substitui processar_sku e
+# recebe os skus do prophet em lotes por worker (previsão rápida de vários modelos de uma vez)
+def prever_por_nivel(tarefas, processar_sku, formatar_resultado, motor="prophet", dias_previsao=7,
+                     num_workers=None, executor=None, ordenado=True, validar_sku=None, processar_lote=None):
+    tarefas = list(tarefas)
+
+    def executar_prophet(tarefas_prophet):
+        if processar_lote is not None:
+            return executar_em_lotes(processar_lote, tarefas_prophet, num_workers, executor, ordenado)
+        return executar_em_paralelo(processar_sku, tarefas_prophet, num_workers, executor, ordenado)
+
+    if motor == "prophet":
+        for _, resultado in executar_prophet(tarefas):
+            if resultado is not None:
+                yield resultado
+        return
+
+    if motor == "global":
+        with etapa("modelo_global", sum(len(dados_sku) for _, dados_sku in tarefas)):
+            globais = ajustar_modelo_global(dict(tarefas), dias_previsao)
+        for sku, _ in tarefas:
+            with contexto_sku(sku):
+                yield formatar_resultado(sku, globais[sku]["previsao"], globais[sku]["rmse"], globais[sku]["mape"])
+        return
+
+    with etapa("modelos_rapidos", sum(len(dados_sku) for _, dados_sku in tarefas)):
+        rapidos = ajustar_modelos_rapidos(dict(tarefas), dias_previsao)
+
+    def resultado_rapido(sku):
+        rapido = rapidos[sku]
+        with contexto_sku(sku):
+            return formatar_resultado(sku, rapido["previsao"], rapido["rmse"], rapido["mape"])
+
+    candidatos = [
+        (sku, dados_sku) for sku, dados_sku in tarefas
+        if motor == "auto" and not baixo_volume(dados_sku)
+    ]
+
+    # o prophet só é treinado com o histórico completo nos skus em que vence o melhor modelo barato
+    # na semana reservada (os dois avaliados do mesmo jeito, fora da amostra)
+    tarefas_prophet = []
+    if candidatos:
+        with etapa("validacao_rapidos", sum(len(dados_sku) for _, dados_sku in candidatos)):
+            rmse_rapidos = _validar_rapidos(candidatos)
+        validar = partial(_validar_prophet, validar_sku=validar_sku)
+        rmse_prophet = dict(executar_em_paralelo(validar, candidatos, num_workers, executor))
+        tarefas_prophet = [
+            (sku, dados_sku) for sku, dados_sku in candidatos
+            if rmse_prophet[sku] is not None and rmse_prophet[sku] < rmse_rapidos[sku]
+        ]
+    skus_prophet = {sku for sku, _ in tarefas_prophet}
+
+    resultados = {}
+    escolhidos = {"prophet": 0, "ingenuo": 0, "media_exponencial": 0}
+
+    # skus que ficam com o modelo barato já estão prontos
+    for sku, _ in tarefas:
+        if sku in skus_prophet:
+            continue
+        escolhidos[rapidos[sku]["modelo"]] += 1
+        resultado = resultado_rapido(sku)
+        if ordenado:
+            resultados[sku] = resultado
+        else:
+            yield resultado
+
+    # se o treino com o histórico completo falhar, o sku fica com o modelo barato
+    for sku, resultado in executar_prophet(tarefas_prophet):
+        if resultado is None:
+            escolhidos[rapidos[sku]["modelo"]] += 1
+            resultado = resultado_rapido(sku)
+        else:
+            escolhidos["prophet"] += 1
+
+        if ordenado:
+            resultados[sku] = resultado
+        else:
+            yield resultado
+
+    print(f"Modelos escolhidos: {escolhidos}", file=sys.stderr)
+
+    if ordenado:
+        for sku, _ in tarefas:
+            yield resultados[sku]
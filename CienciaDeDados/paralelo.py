@@ -0,0 +1,184 @@
+# motor de execução paralela das previsões por sku
+import math
+import os
+import sys
+
+# skus por tarefa em executar_em_lotes (lotes menores quando há poucos skus por worker)
+TAMANHO_MAXIMO_LOTE = 32
+
+# lotes por worker: mais de um para equilibrar skus de tamanhos diferentes
+LOTES_POR_WORKER = 4
+
+# obtém o número de processos a usar: parâmetro, variável ITAMIND_WORKERS ou total de núcleos
+def obter_num_workers(num_workers=None):
+    if num_workers is None:
+        num_workers = os.environ.get('ITAMIND_WORKERS')
+
+    try:
+        num_workers = int(num_workers) if num_workers else (os.cpu_count() or 1)
+    except ValueError:
+        print(f"Número de workers inválido: {num_workers}. Usando 1.", file=sys.stderr)
+        num_workers = 1
+
+    return max(1, num_workers)
+
+# executa a função de um sku isolando qualquer falha para não derrubar o lote;
+# dados vindos por memória compartilhada são abertos aqui, já dentro do worker
+def _executar_tarefa(funcao, sku, dados_sku):
+    try:
+        from memoria_compartilhada import FatiaCompartilhada
+        if isinstance(dados_sku, FatiaCompartilhada):
+            dados_sku = dados_sku.carregar()
+        return funcao(dados_sku, sku), None
+    except Exception as e:
+        return None, str(e)
+
+# executa a função de um lote [(sku, dados_sku)], que devolve [(sku, resultado)]; uma falha vale para o lote
+def _executar_lote(funcao_lote, itens):
+    try:
+        from memoria_compartilhada import FatiaCompartilhada
+        itens = [
+            (sku, dados_sku.carregar() if isinstance(dados_sku, FatiaCompartilhada) else dados_sku)
+            for sku, dados_sku in itens
+        ]
+        return funcao_lote(itens), None
+    except Exception as e:
+        return None, str(e)
+
+# (sku, resultado) de cada sku do lote; se o lote falhou todos os skus ficam sem resultado
+def _resultados_do_lote(lote, resultados, erro):
+    if erro:
+        skus = ", ".join(str(sku) for sku, _ in lote)
+        print(f"Erro ao processar o lote de SKUs {skus}: {erro}", file=sys.stderr)
+        return [(sku, None) for sku, _ in lote]
+    return resultados
+
+# função vazia usada para iniciar os processos do pool antes da primeira requisição
+def _aquecer_worker():
+    return os.getpid()
+
+# cria um pool persistente, reaproveitado entre várias execuções (modo servidor)
+def criar_pool(num_workers=None):
+    num_workers = obter_num_workers(num_workers)
+    if num_workers == 1:
+        return None
+
+    from concurrent.futures import ProcessPoolExecutor
+
+    executor = ProcessPoolExecutor(max_workers=num_workers)
+    for futuro in [executor.submit(_aquecer_worker) for _ in range(num_workers)]:
+        futuro.result()
+    return executor
+
+# distribui as tarefas (sku, dados_sku) entre processos e devolve (sku, resultado) na ordem de entrada,
+# ou à medida que cada sku termina quando ordenado=False (saída em streaming)
+# se um pool persistente for informado ele é usado e não é encerrado ao final
+def executar_em_paralelo(funcao, tarefas, num_workers=None, executor=None, ordenado=True):
+    tarefas = list(tarefas)
+
+    if executor is not None:
+        yield from _coletar_resultados(executor, funcao, tarefas, ordenado)
+        return
+
+    num_workers = min(obter_num_workers(num_workers), max(1, len(tarefas)))
+
+    # com um único worker evita o custo de criar o pool
+    if num_workers == 1:
+        for sku, dados_sku in tarefas:
+            resultado, erro = _executar_tarefa(funcao, sku, dados_sku)
+            if erro:
+                print(f"Erro ao processar o SKU {sku}: {erro}", file=sys.stderr)
+            yield sku, resultado
+        return
+
+    # o módulo de processos só é importado quando há paralelismo de fato
+    from concurrent.futures import ProcessPoolExecutor
+
+    with ProcessPoolExecutor(max_workers=num_workers) as executor:
+        yield from _coletar_resultados(executor, funcao, tarefas, ordenado)
+
+# como executar_em_paralelo, mas cada worker recebe um lote de skus de uma vez:
+# funcao_lote([(sku, dados_sku)]) -> [(sku, resultado)] permite processar o lote junto
+# (ex: a previsão rápida de vários modelos em um único prever_em_lote); os resultados saem por sku
+def executar_em_lotes(funcao_lote, tarefas, num_workers=None, executor=None, ordenado=True,
+                      tamanho_maximo=TAMANHO_MAXIMO_LOTE):
+    tarefas = list(tarefas)
+    num_workers = min(obter_num_workers(num_workers), max(1, len(tarefas)))
+    tamanho_lote = max(1, min(tamanho_maximo, math.ceil(len(tarefas) / (num_workers * LOTES_POR_WORKER))))
+
+    if executor is not None:
+        yield from _coletar_resultados(executor, funcao_lote, tarefas, ordenado, tamanho_lote)
+        return
+
+    if num_workers == 1:
+        for inicio in range(0, len(tarefas), tamanho_lote):
+            lote = tarefas[inicio:inicio + tamanho_lote]
+            yield from _resultados_do_lote(lote, *_executar_lote(funcao_lote, lote))
+        return
+
+    from concurrent.futures import ProcessPoolExecutor
+
+    with ProcessPoolExecutor(max_workers=num_workers) as executor:
+        yield from _coletar_resultados(executor, funcao_lote, tarefas, ordenado, tamanho_lote)
+
+# submete as tarefas ao pool (uma a uma ou em lotes de tamanho_lote) e as recolhe
+# na ordem de submissão ou de conclusão
+def _coletar_resultados(executor, funcao, tarefas, ordenado=True, tamanho_lote=None):
+    from memoria_compartilhada import memoria_compartilhada_ativa, publicar_tarefas, liberar
+
+    # os históricos vão para os processos por memória compartilhada, sem serializar os dados
+    caminho = None
+    if memoria_compartilhada_ativa():
+        caminho, tarefas = publicar_tarefas(tarefas)
+
+    try:
+        if tamanho_lote is None:
+            yield from _submeter_e_coletar(executor, funcao, tarefas, ordenado)
+        else:
+            yield from _submeter_lotes(executor, funcao, tarefas, ordenado, tamanho_lote)
+    finally:
+        if caminho is not None:
+            liberar(caminho)
+
+def _submeter_e_coletar(executor, funcao, tarefas, ordenado):
+    futuros = [
+        (sku, executor.submit(_executar_tarefa, funcao, sku, dados_sku))
+        for sku, dados_sku in tarefas
+    ]
+
+    # na ordem de submissão a saída é determinística; na de conclusão cada sku sai assim que termina
+    if not ordenado:
+        from concurrent.futures import as_completed
+
+        sku_por_futuro = {futuro: sku for sku, futuro in futuros}
+        futuros = [(sku_por_futuro[futuro], futuro) for futuro in as_completed(sku_por_futuro)]
+
+    for sku, futuro in futuros:
+        try:
+            resultado, erro = futuro.result()
+        except Exception as e:
+            # falha do próprio processo (ex: worker encerrado abruptamente)
+            resultado, erro = None, str(e)
+
+        if erro:
+            print(f"Erro ao processar o SKU {sku}: {erro}", file=sys.stderr)
+        yield sku, resultado
+
+def _submeter_lotes(executor, funcao_lote, tarefas, ordenado, tamanho_lote):
+    futuros = [
+        (lote, executor.submit(_executar_lote, funcao_lote, lote))
+        for lote in (tarefas[inicio:inicio + tamanho_lote] for inicio in range(0, len(tarefas), tamanho_lote))
+    ]
+
+    if not ordenado:
+        from concurrent.futures import as_completed
+
+        lote_por_futuro = {futuro: lote for lote, futuro in futuros}
+        futuros = [(lote_por_futuro[futuro], futuro) for futuro in as_completed(lote_por_futuro)]
+
+    for lote, futuro in futuros:
+        try:
+            resultados, erro = futuro.result()
+        except Exception as e:
+            resultados, erro = None, str(e)
+        yield from _resultados_do_lote(lote, resultados, erro)
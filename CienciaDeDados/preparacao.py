@@ -0,0 +1,64 @@
+# preparação dos dados brutos de vendas para o formato do prophet (ds, y) de todos os skus de uma vez
+from importacao import importar_sob_demanda
+
+np = importar_sob_demanda("numpy")
+pd = importar_sob_demanda("pandas")
+
+# códigos inteiros dos skus (-1 para sku ausente) e os valores correspondentes;
+# com o sku em categoria reaproveita os códigos compactos já existentes
+def codificar_skus(ids):
+    if isinstance(ids.dtype, pd.CategoricalDtype):
+        return ids.cat.codes.to_numpy(), np.asarray(ids.cat.categories)
+    codigos, skus = pd.factorize(ids)
+    return codigos, np.asarray(skus)
+
+# limpa, ordena e divide os dados por sku em uma única passada
+# devolve {sku: dataframe ds/y} na ordem em que os skus aparecem nos dados brutos;
+# cada dataframe é uma fatia (sem cópia) da mesma tabela ordenada
+def particionar_por_sku(dados_brutos):
+    codigos, skus = codificar_skus(dados_brutos['id_produto'])
+    datas = dados_brutos['data_dia'].to_numpy()
+    vendas = dados_brutos['total_venda_dia_kg'].to_numpy()
+
+    # linhas válidas: sku e data presentes, venda presente e não negativa
+    validas = (codigos >= 0) & ~np.isnat(datas) & (vendas >= 0)
+    if not validas.any():
+        return {}
+
+    # só copia as colunas quando há linhas a descartar
+    if not validas.all():
+        linhas = np.flatnonzero(validas)
+        codigos, datas, vendas = codigos[linhas], datas[linhas], vendas[linhas]
+
+    ordem_skus = pd.unique(codigos)
+
+    # exportações costumam vir agrupadas por sku e em ordem de data; nesse caso não é preciso ordenar
+    trocas = codigos[1:] != codigos[:-1]
+    agrupado = np.count_nonzero(trocas) + 1 == len(ordem_skus)
+    if not (agrupado and np.all(trocas | (datas[1:] >= datas[:-1]))):
+        # ordena por sku e data (lexsort é estável, mantendo a ordem original nos empates)
+        ordem = np.lexsort((datas, codigos))
+        codigos, datas, vendas = codigos[ordem], datas[ordem], vendas[ordem]
+        trocas = codigos[1:] != codigos[:-1]
+
+    colunas = pd.DataFrame({'ds': datas, 'y': vendas}, copy=False)
+
+    # encontra onde começa e termina o bloco de cada sku
+    inicios = np.flatnonzero(np.r_[True, trocas])
+    fins = np.r_[inicios[1:], len(codigos)]
+    limites = dict(zip(codigos[inicios].tolist(), zip(inicios, fins)))
+
+    particoes = {}
+    for codigo in ordem_skus.tolist():
+        inicio, fim = limites[codigo]
+        particoes[skus[codigo].item()] = colunas.iloc[inicio:fim]
+
+    return particoes
+
+# histórico ds/y de um único sku com a mesma limpeza e ordenação de particionar_por_sku
+# (dataframe vazio se o sku não tiver linhas válidas); só as linhas do sku são particionadas
+def preparar_sku(dados_brutos, sku):
+    mascara = (dados_brutos['id_produto'] == sku).to_numpy()
+    if not mascara.all():
+        dados_brutos = dados_brutos[mascara]
+    return particionar_por_sku(dados_brutos).get(sku, pd.DataFrame())
@@ -0,0 +1,139 @@
+# previsão rápida a partir de modelos prophet já treinados
+# o predict do prophet monta todos os componentes e amostra a incerteza em todas as linhas do histórico,
+# que o modo integração descarta (só o yhat do histórico entra nas métricas); aqui:
+# - o yhat (histórico + horizonte) sai direto dos parâmetros: tendência por partes + variáveis sazonais x beta
+# - as variáveis de sazonalidade e feriados são montadas uma vez por grade de datas e compartilhadas entre skus
+# - a incerteza só é amostrada nos dias do horizonte, com quantidade de amostras configurável;
+#   com 0 amostras o intervalo é analítico (desvio dos resíduos do histórico)
+import os
+from collections import OrderedDict
+from statistics import NormalDist
+
+from importacao import importar_sob_demanda
+
+np = importar_sob_demanda("numpy")
+pd = importar_sob_demanda("pandas")
+
+# quantidade de grades de variáveis sazonais guardadas por processo
+MAXIMO_GRADES = 32
+
+_grades = OrderedDict()
+
+# o modo rápido é ligado com --previsao-rapida (ou ITAMIND_PREVISAO_RAPIDA=1); com 0 amostras de incerteza
+# ele é sempre usado, porque o predict completo do prophet sem amostras não gera yhat_lower/yhat_upper
+# e o intervalo analítico só existe aqui
+def previsao_rapida_ativa():
+    return os.environ.get('ITAMIND_PREVISAO_RAPIDA', '0') == '1' or obter_amostras_incerteza() == 0
+
+# amostras da incerteza (--amostras-incerteza ou ITAMIND_AMOSTRAS_INCERTEZA); None mantém a do modelo
+def obter_amostras_incerteza():
+    valor = os.environ.get('ITAMIND_AMOSTRAS_INCERTEZA')
+    return None if valor in (None, '') else max(int(valor), 0)
+
+# aplica a quantidade de amostras configurada ao modelo (também usada pelo predict completo)
+def configurar_incerteza(modelo, amostras_incerteza=None):
+    if amostras_incerteza is None:
+        amostras_incerteza = obter_amostras_incerteza()
+    if amostras_incerteza is not None:
+        modelo.uncertainty_samples = amostras_incerteza
+    return modelo
+
+# identifica a configuração que define as colunas das variáveis sazonais do modelo
+def _assinatura_sazonal(modelo):
+    feriados = None
+    if modelo.holidays is not None:
+        feriados = int(pd.util.hash_pandas_object(modelo.holidays, index=False).sum())
+    nomes_treino = None if modelo.train_holiday_names is None else tuple(modelo.train_holiday_names)
+    return repr(sorted(modelo.seasonalities.items())), feriados, nomes_treino, modelo.holidays_mode
+
+# matriz de variáveis sazonais/feriados da grade de datas e as colunas aditivas e multiplicativas,
+# reaproveitada entre skus com a mesma configuração
+def _variaveis_sazonais(modelo, datas, assinatura):
+    chave = (assinatura, hash(datas.tobytes()), len(datas))
+    if chave in _grades:
+        _grades.move_to_end(chave)
+        return _grades[chave]
+
+    variaveis, _, colunas, _ = modelo.make_all_seasonality_features(pd.DataFrame({'ds': datas}))
+    grade = (
+        variaveis.to_numpy(dtype=float),
+        colunas['additive_terms'].to_numpy(dtype=float),
+        colunas['multiplicative_terms'].to_numpy(dtype=float),
+    )
+
+    _grades[chave] = grade
+    if len(_grades) > MAXIMO_GRADES:
+        _grades.popitem(last=False)
+    return grade
+
+# tendência linear por partes do modelo nas datas pedidas (média dos parâmetros, como no predict)
+def _tendencia(modelo, datas):
+    t = (datas - np.datetime64(modelo.start, 'ns')) / np.timedelta64(modelo.t_scale, 'ns')
+    k = np.nanmean(modelo.params['k'])
+    m = np.nanmean(modelo.params['m'])
+    deltas = np.nanmean(modelo.params['delta'], axis=0)
+    return modelo.piecewise_linear(t, deltas, k, m, modelo.changepoints_t) * modelo.y_scale
+
+# intervalo do horizonte: amostrado pelo prophet só nessas linhas, ou analítico com 0 amostras
+def _intervalos(modelo, datas_futuras, yhat_futuro, residuos):
+    if modelo.uncertainty_samples:
+        futuro = modelo.setup_dataframe(pd.DataFrame({'ds': datas_futuras}))
+        intervalos = modelo.predict_uncertainty(futuro, vectorized=True)
+        return intervalos['yhat_lower'].to_numpy(), intervalos['yhat_upper'].to_numpy()
+
+    quantil = NormalDist().inv_cdf((1 + modelo.interval_width) / 2)
+    margem = quantil * (np.std(residuos, ddof=1) if len(residuos) > 1 else 0.0)
+    return yhat_futuro - margem, yhat_futuro + margem
+
+# previsão de vários modelos de uma vez: {sku: dataframe ds/yhat/yhat_lower/yhat_upper} com as datas do
+# histórico de cada modelo (só yhat, para as métricas) seguidas dos `dias_previsao` dias futuros
+# itens: [(sku, modelo)]; modelos sem tendência linear usam o predict completo
+def prever_em_lote(itens, dias_previsao=7, amostras_incerteza=None):
+    previsoes = {}
+    grupos = {}
+    for sku, modelo in itens:
+        configurar_incerteza(modelo, amostras_incerteza)
+        if modelo.growth != 'linear' or modelo.extra_regressors:
+            previsoes[sku] = modelo.predict(modelo.make_future_dataframe(periods=dias_previsao))
+            continue
+        grupos.setdefault(_assinatura_sazonal(modelo), []).append((sku, modelo))
+
+    for assinatura, modelos in grupos.items():
+        # grade única com todas as datas (histórico + horizonte) dos skus do grupo
+        datas_por_sku = []
+        for sku, modelo in modelos:
+            historico = modelo.history['ds'].to_numpy()
+            futuras = historico[-1] + np.arange(1, dias_previsao + 1) * np.timedelta64(1, 'D')
+            datas_por_sku.append(np.concatenate([historico, futuras]))
+        grade = np.unique(np.concatenate(datas_por_sku))
+        variaveis, aditivas, multiplicativas = _variaveis_sazonais(modelos[0][1], grade, assinatura)
+
+        # componentes sazonais de todos os skus do grupo em um único produto de matrizes
+        betas = np.stack([np.nanmean(modelo.params['beta'], axis=0) for _, modelo in modelos], axis=1)
+        escalas = np.array([modelo.y_scale for _, modelo in modelos])
+        sazonal_aditivo = variaveis @ (betas * aditivas[:, None]) * escalas
+        sazonal_multiplicativo = variaveis @ (betas * multiplicativas[:, None])
+
+        for coluna, ((sku, modelo), datas) in enumerate(zip(modelos, datas_por_sku)):
+            linhas = np.searchsorted(grade, datas)
+            yhat = (
+                _tendencia(modelo, datas) * (1 + sazonal_multiplicativo[linhas, coluna])
+                + sazonal_aditivo[linhas, coluna]
+            )
+
+            tamanho_historico = len(datas) - dias_previsao
+            residuos = modelo.history['y'].to_numpy(dtype=float) - yhat[:tamanho_historico]
+            inferior, superior = _intervalos(modelo, datas[tamanho_historico:], yhat[tamanho_historico:], residuos)
+
+            previsoes[sku] = pd.DataFrame({
+                'ds': datas,
+                'yhat': yhat,
+                'yhat_lower': np.r_[np.full(tamanho_historico, np.nan), inferior],
+                'yhat_upper': np.r_[np.full(tamanho_historico, np.nan), superior],
+            })
+
+    return previsoes
+
+# previsão rápida de um único modelo, no mesmo formato de prever_em_lote
+def prever_horizonte(modelo, dias_previsao=7, amostras_incerteza=None):
+    return prever_em_lote([(None, modelo)], dias_previsao, amostras_incerteza)[None]
@@ -0,0 +1,83 @@
+# relatório operacional de retirada do freezer calculado com operações vetorizadas
+# para vários skus e várias datas alvo de uma só vez
+from importacao import importar_sob_demanda
+
+np = importar_sob_demanda("numpy")
+pd = importar_sob_demanda("pandas")
+
+# colunas do relatório, na ordem do json devolvido ao backend
+COLUNAS_RELATORIO = [
+    "data_retirada",
+    "sku",
+    "kg_a_retirar",
+    "kg_em_descongelamento",
+    "kg_disponivel_bruto",
+    "kg_para_venda_hoje",
+]
+
+# aplica a compensação de perda a um vetor de quantidades previstas;
+# quantidades ausentes, zeradas ou negativas viram NaN (sem retirada)
+def calcular_retirada_vetorizada(quantidades, percentual_perda=15):
+    quantidades = np.asarray(quantidades, dtype=float)
+    with np.errstate(invalid='ignore'):
+        quantidade_congelado = np.round(quantidades / (1 - (percentual_perda / 100)), 2)
+        return np.where(quantidades > 0, quantidade_congelado, np.nan)
+
+# junta as previsões de vários skus em uma única tabela sku/ds/yhat
+def _unificar_previsoes(previsoes):
+    if isinstance(previsoes, dict):
+        previsoes = pd.concat(
+            [previsao[['ds', 'yhat']].assign(sku=sku) for sku, previsao in previsoes.items()],
+            ignore_index=True
+        )
+    return previsoes
+
+# gera o relatório de retirada (d), descongelamento (d+1) e venda (d+2) para cada combinação sku x data alvo
+# previsoes: {sku: previsão do prophet} ou dataframe com colunas sku, ds e yhat
+def gerar_relatorios_operacionais(previsoes, datas_alvo, skus=None, percentual_perda=15):
+    previsoes = _unificar_previsoes(previsoes)
+
+    # quantidade prevista (arredondada) por sku e data de venda
+    datas_venda = pd.to_datetime(previsoes['ds']).dt.normalize().to_numpy(dtype='datetime64[ns]')
+    kg_previsto = pd.Series(
+        previsoes['yhat'].round(2).to_numpy(),
+        index=pd.MultiIndex.from_arrays([previsoes['sku'].to_numpy(), datas_venda])
+    )
+    kg_previsto = kg_previsto[~kg_previsto.index.duplicated(keep='last')]
+
+    if skus is None:
+        skus = pd.unique(previsoes['sku'])
+    datas = pd.DatetimeIndex(pd.to_datetime(list(datas_alvo))).normalize().astype('datetime64[ns]')
+
+    # todas as combinações sku x data alvo
+    grade = pd.MultiIndex.from_product([skus, datas])
+    skus_grade = grade.get_level_values(0)
+    datas_grade = grade.get_level_values(1)
+
+    # busca a previsão de venda deslocada em dias em relação à data de retirada
+    def previsao_em(dias):
+        indice = pd.MultiIndex.from_arrays([skus_grade, datas_grade + pd.Timedelta(days=dias)])
+        return kg_previsto.reindex(indice).to_numpy(dtype=float)
+
+    venda_d2 = previsao_em(2)  # o que retirar hoje para vender em d+2
+    venda_d1 = previsao_em(1)  # o que foi retirado ontem e está descongelando
+    venda_d0 = previsao_em(0)  # o que foi retirado anteontem e está pronto para venda
+
+    return pd.DataFrame({
+        "data_retirada": datas_grade,
+        "sku": skus_grade,
+        "kg_a_retirar": calcular_retirada_vetorizada(venda_d2, percentual_perda),
+        "kg_em_descongelamento": calcular_retirada_vetorizada(venda_d1, percentual_perda),
+        "kg_disponivel_bruto": calcular_retirada_vetorizada(venda_d0, percentual_perda),
+        "kg_para_venda_hoje": np.where(venda_d0 != 0, venda_d0, np.nan),
+    }, columns=COLUNAS_RELATORIO)
+
+# converte o relatório em uma lista de dicionários serializáveis em json (NaN vira null)
+def relatorios_para_json(relatorios):
+    registros = []
+    for data_retirada, sku, *quantidades in relatorios[COLUNAS_RELATORIO].itertuples(index=False):
+        registro = {"data_retirada": data_retirada.strftime("%d/%m/%Y"), "sku": int(sku)}
+        for coluna, valor in zip(COLUNAS_RELATORIO[2:], quantidades):
+            registro[coluna] = None if pd.isna(valor) else float(valor)
+        registros.append(registro)
+    return registros
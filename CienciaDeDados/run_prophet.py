@@ -1,119 +1,139 @@
 # importando bibliotecas necessárias
-import pandas as pd
-import numpy as np
-from prophet import Prophet
-from sklearn.metrics import mean_squared_error, mean_absolute_percentage_error
-from datetime import timedelta
+import math
 import os
 import json
 import sys
 import warnings
+import argparse
+import io
+import time
+from functools import partial
+from paralelo import executar_em_paralelo, criar_pool
+from modelos_rapidos import prever_por_nivel, MOTORES
+from instrumentacao import medir_etapa, etapa, contexto_sku, emitir_resumo, perfilar
+from ingestao import ler_csv_vendas, ler_csv_stdin, carregar_arquivo_vendas
+from preparacao import particionar_por_sku, preparar_sku
+from cache_modelos import (cache_ativo, calcular_impressao_digital, carregar_modelo, salvar_modelo, aplicar_limites,
+                           chave_validacao)
+from relatorio import gerar_relatorios_operacionais, relatorios_para_json
+from feriados import feriados_para_historico
+from previsao_rapida import previsao_rapida_ativa, obter_amostras_incerteza, configurar_incerteza, prever_horizonte, prever_em_lote
+from cache_resultados import cache_resultados_ativo, prever_com_cache
+from serializacao import HORIZONTE_PADRAO, horizonte_valido, previsoes_para_registros, para_json
+from treino_incremental import treino_incremental_ativo, obter_parametros_iniciais, registrar_tempo_treino
+from importacao import importar_sob_demanda, carregar_agora
+
+# pandas e numpy carregam no primeiro uso; prophet e scikit-learn só nas funções que treinam e avaliam
+pd = importar_sob_demanda("pandas")
+np = importar_sob_demanda("numpy")
 warnings.filterwarnings('ignore')
 
-# função que retorna os feriados
-def obter_feriados():
-    return pd.DataFrame({
-        "holiday": "feriado",
-        "ds": pd.to_datetime([
-            "2025-01-01", "2025-03-29", "2025-04-21", "2025-05-01",
-            "2025-06-29", "2025-07-28", "2025-09-07", "2025-09-08",
-            "2025-10-12", "2025-11-02", "2025-11-15", "2025-12-08", "2025-12-25"
-        ]),
-        "lower_window": 0,
-        "upper_window": 1
-    })
-
-# função que carrega arquivo csv ou excel e filtra dados pelo sku específico
-def carregar_arquivo(caminho, sku):
-    extensao = os.path.splitext(caminho)[1].lower()
-
-    if extensao == ".csv":
-        dados = pd.read_csv(caminho, encoding='latin1', sep=';', parse_dates=["data_dia"], dayfirst=True)
-    elif extensao in [".xls", ".xlsx"]:
-        dados = pd.read_excel(caminho)
-    else:
-        raise ValueError(f"Formato de arquivo não suportado: {extensao}")
-
-    if "data_dia" not in dados.columns or "id_produto" not in dados.columns or "total_venda_dia_kg" not in dados.columns:
-        raise ValueError("O arquivo deve conter as colunas: 'data_dia', 'id_produto', 'total_venda_dia_kg'")
-
-    dados_filtrados = dados[dados["id_produto"] == sku].copy()
-    dados_finais = dados_filtrados[["data_dia", "total_venda_dia_kg"]].copy()
-    dados_finais.rename(columns={"data_dia": "ds", "total_venda_dia_kg": "y"}, inplace=True)
-    dados_finais["ds"] = pd.to_datetime(dados_finais["ds"], dayfirst=True)
+# parâmetros do prophet usados nos treinos (também fazem parte da chave do cache de modelos)
+PARAMETROS_MODELO = {
+    "weekly_seasonality": True,
+    "yearly_seasonality": False,
+    "daily_seasonality": False,
+}
 
-    return dados_finais
+# identifica o formato de saída deste script no cache de resultados
+SCRIPT = "run_prophet"
 
-# função que processa dados csv vindos da entrada padrão para integração com node.js
-def processar_csv_entrada():
+# função que processa dados csv vindos da entrada padrão (ou do modo servidor) para integração com node.js
+@medir_etapa("leitura_csv")
+def processar_csv_entrada(conteudo_csv=None):
     try:
-        conteudo_csv = sys.stdin.read()
-
-        # salva temporariamente para processar
-        with open('dados_temporarios.csv', 'w', encoding='latin1') as arquivo:
-            arquivo.write(conteudo_csv)
-
-        # lê os dados
-        dados = pd.read_csv('dados_temporarios.csv', encoding='latin1', sep=';')
+        # lê em blocos direto do buffer da entrada padrão, sem arquivo temporário
+        if conteudo_csv is None:
+            return ler_csv_stdin()
 
-        # converte data corretamente
-        dados['data_dia'] = pd.to_datetime(dados['data_dia'], format='%d/%m/%Y', errors='coerce')
-
-        # remove arquivo temporário
-        os.remove('dados_temporarios.csv')
-
-        return dados
+        return ler_csv_vendas(io.StringIO(conteudo_csv))
 
     except Exception as e:
         print(f"Erro ao processar CSV: {e}", file=sys.stderr)
         return pd.DataFrame()
 
 # função que prepara dados específicos de um sku para treinamento do modelo prophet
+@medir_etapa("preparacao")
 def preparar_dados_prophet(dados, sku):
     try:
-        # filtra pelo sku
-        dados_sku = dados[dados['id_produto'] == sku].copy()
-
-        if dados_sku.empty:
-            return pd.DataFrame()
-
-        # seleciona e renomeia colunas
-        dados_prophet = dados_sku[['data_dia', 'total_venda_dia_kg']].copy()
-        dados_prophet.columns = ['ds', 'y']
-
-        # remove valores nulos ou negativos
-        dados_prophet = dados_prophet.dropna()
-        dados_prophet = dados_prophet[dados_prophet['y'] >= 0]
-
-        # ordena por data
-        dados_prophet = dados_prophet.sort_values('ds')
-
-        return dados_prophet
+        # filtra pelo sku, remove valores nulos ou negativos e ordena por data (como no modo integração)
+        return preparar_sku(dados, sku)
 
     except Exception as e:
         print(f"Erro ao preparar dados para SKU {sku}: {e}", file=sys.stderr)
         return pd.DataFrame()
 
 # função que treina modelo prophet com dados históricos de vendas
-def treinar_modelo_prophet(dados):
+@medir_etapa("treino")
+def treinar_modelo_prophet(dados, parametros_iniciais=None):
     try:
+        from prophet import Prophet
+
         modelo = Prophet(
-            weekly_seasonality=True,
-            yearly_seasonality=False,
-            holidays=obter_feriados(),
-            daily_seasonality=False
+            **PARAMETROS_MODELO,
+            holidays=feriados_para_historico(dados['ds'])
         )
 
-        modelo.fit(dados)
+        # treino incremental: parte dos parâmetros do último modelo do sku
+        if parametros_iniciais is not None:
+            modelo.fit(dados, init=parametros_iniciais)
+        else:
+            modelo.fit(dados)
         return modelo
 
     except Exception as e:
         print(f"Erro ao treinar modelo: {e}", file=sys.stderr)
         return None
 
+# função que busca o modelo do sku no cache em disco e só treina quando o histórico mudou
+# com validacao=True (modelo treinado sem a semana reservada do motor auto) o modelo fica em chave
+# própria no cache, sem treino incremental nem registro de tempo, para não se passar pelo modelo do sku
+def obter_modelo(dados_sku, sku, validacao=False):
+    if not cache_ativo():
+        return treinar_modelo_prophet(dados_sku)
+
+    impressao = calcular_impressao_digital(dados_sku, PARAMETROS_MODELO, feriados_para_historico(dados_sku['ds']))
+    if validacao:
+        modelo = carregar_modelo(chave_validacao(sku), impressao)
+        if modelo is None:
+            modelo = treinar_modelo_prophet(dados_sku)
+            if modelo is not None:
+                salvar_modelo(chave_validacao(sku), impressao, modelo)
+        return modelo
+
+    modelo = carregar_modelo(sku, impressao)
+    if modelo is not None:
+        return modelo
+
+    # com histórico novo, tenta o treino aquecido a partir do último modelo do sku
+    modelo = None
+    aquecido = False
+    if treino_incremental_ativo():
+        parametros_iniciais = obter_parametros_iniciais(sku)
+        if parametros_iniciais is not None:
+            inicio = time.perf_counter()
+            modelo = treinar_modelo_prophet(dados_sku, parametros_iniciais)
+            aquecido = modelo is not None
+
+    if modelo is None:
+        inicio = time.perf_counter()
+        modelo = treinar_modelo_prophet(dados_sku)
+
+    if modelo is not None:
+        registrar_tempo_treino(sku, time.perf_counter() - inicio, aquecido)
+        salvar_modelo(sku, impressao, modelo)
+    return modelo
+
 # função que gera previsão para próximos dias usando modelo treinado
+@medir_etapa("previsao")
 def gerar_previsao(modelo, dados, dias_previsao=7):
     try:
+        configurar_incerteza(modelo)
+
+        # modo rápido: yhat do histórico direto dos parâmetros e incerteza só no horizonte
+        if previsao_rapida_ativa():
+            return prever_horizonte(modelo, dias_previsao)
+
         futuro = modelo.make_future_dataframe(periods=dias_previsao)
         previsao = modelo.predict(futuro)
 
@@ -124,8 +144,11 @@ def gerar_previsao(modelo, dados, dias_previsao=7):
         return pd.DataFrame()
 
 # função que calcula métricas de qualidade da previsão comparando com dados reais
+@medir_etapa("metricas")
 def calcular_metricas(dados_reais, previsao):
     try:
+        from sklearn.metrics import mean_squared_error, mean_absolute_percentage_error
+
         # une dados reais com previsão
         dados_unidos = pd.merge(dados_reais, previsao[['ds', 'yhat']], on='ds', how='inner')
 
@@ -147,7 +170,7 @@ def calcular_metricas(dados_reais, previsao):
 
 # calcula quanto deve ser retirado do freezer considerando perdas
 def calcular_retirada(quantidade_prevista, percentual_perda=15):
-    if quantidade_prevista is None or pd.isna(quantidade_prevista) or quantidade_prevista <= 0:
+    if quantidade_prevista is None or math.isnan(quantidade_prevista) or quantidade_prevista <= 0:
         return None
     # fórmula para encontrar a quantidade original antes da perda percentual
     quantidade_congelado = quantidade_prevista / (1 - (percentual_perda / 100))
@@ -155,53 +178,311 @@ def calcular_retirada(quantidade_prevista, percentual_perda=15):
 
 # gera relatório operacional com dados de retirada, descongelamento e venda
 def gerar_relatorio_operacional(previsao, sku, data_alvo_str):
-    # mapeia a data de retirada (d-2) para a quantidade prevista na data da venda (d)
-    retirada_por_data = {}
-
-    for _, row in previsao.iterrows():
-        data_venda = row["ds"].date()
-        kg_previsto = round(row["yhat"], 2)
-        data_retirada = data_venda - timedelta(days=2)
-        retirada_por_data[data_retirada] = kg_previsto
-
-    # converte a data alvo para o formato de data
-    data_alvo = pd.to_datetime(data_alvo_str).date()
-
-    # calcula as quantidades para o relatório com base na data alvo
-    # o que retirar hoje (data_alvo) para vender em d+2
-    kg_a_retirar = retirada_por_data.get(data_alvo)
-    # o que está em descongelamento (foi retirado ontem) para vender amanhã (d+1)
-    kg_em_descongelamento = retirada_por_data.get(data_alvo - timedelta(days=1))
-    # o que está pronto para venda hoje (foi retirado anteontem)
-    kg_para_venda_hoje = retirada_por_data.get(data_alvo - timedelta(days=2))
-
-    relatorio = {
-        "data_retirada": data_alvo.strftime("%d/%m/%Y"),
-        "sku": sku,
-        "kg_a_retirar": calcular_retirada(kg_a_retirar),
-        "kg_em_descongelamento": calcular_retirada(kg_em_descongelamento),
-        "kg_disponivel_bruto": calcular_retirada(kg_para_venda_hoje),  # quantidade bruta retirada (com compensação)
-        "kg_para_venda_hoje": round(kg_para_venda_hoje, 2) if kg_para_venda_hoje else None,  # quantidade líquida real
+    # calcula retirada (d+2), descongelamento (d+1) e venda (d) com o motor vetorizado
+    relatorio = gerar_relatorios_operacionais({sku: previsao}, [data_alvo_str])
+    return relatorios_para_json(relatorio)[0]
+
+# função que treina, prevê e formata o resultado de um sku para o modo integração
+def processar_sku(dados_sku, sku, horizonte=HORIZONTE_PADRAO):
+    # as etapas medidas abaixo ficam associadas ao sku
+    with contexto_sku(sku):
+        # treina modelo (ou reaproveita do cache)
+        modelo = obter_modelo(dados_sku, sku)
+
+        if modelo is None:
+            return None
+
+        # gera previsão
+        previsao = gerar_previsao(modelo, dados_sku, horizonte)
+
+        if previsao.empty:
+            return None
+
+        # calcula métricas
+        rmse, mape = calcular_metricas(dados_sku, previsao)
+
+        return formatar_resultado(sku, previsao, rmse, mape, horizonte)
+
+# função que treina os skus de um lote e faz a previsão rápida de todos os modelos juntos (prever_em_lote),
+# com o mesmo resultado de processar_sku para cada sku
+def processar_lote_skus(itens, horizonte=HORIZONTE_PADRAO):
+    modelos = []
+    for sku, dados_sku in itens:
+        with contexto_sku(sku):
+            modelo = obter_modelo(dados_sku, sku)
+        if modelo is not None:
+            modelos.append((sku, modelo))
+
+    with etapa("previsao_lote", len(modelos)):
+        try:
+            previsoes = prever_em_lote(modelos, horizonte)
+        except Exception as e:
+            print(f"Erro na previsão em lote, prevendo os SKUs um a um: {e}", file=sys.stderr)
+            historicos = dict(itens)
+            previsoes = {sku: gerar_previsao(modelo, historicos[sku], horizonte) for sku, modelo in modelos}
+
+    resultados = []
+    for sku, dados_sku in itens:
+        previsao = previsoes.get(sku)
+        if previsao is None or previsao.empty:
+            resultados.append((sku, None))
+            continue
+        with contexto_sku(sku):
+            rmse, mape = calcular_metricas(dados_sku, previsao)
+            resultados.append((sku, formatar_resultado(sku, previsao, rmse, mape, horizonte)))
+    return resultados
+
+# função que treina só com o histórico de treino e prevê os dias reservados (validação do motor auto)
+def prever_validacao(treino, sku, dias):
+    with contexto_sku(sku):
+        modelo = obter_modelo(treino, sku, validacao=True)
+        if modelo is None:
+            return None
+        return gerar_previsao(modelo, treino, dias)
+
+# função que monta o json de saída de um sku com as previsões dos últimos dias do horizonte e as métricas
+@medir_etapa("formatacao")
+def formatar_resultado(sku, previsao, rmse, mape, horizonte=HORIZONTE_PADRAO):
+    return {
+        "sku": int(sku),
+        "rmse": rmse,
+        "mape": mape,
+        "previsoes": previsoes_para_registros(previsao, horizonte)
+    }
+
+# função que gera as previsões de 7 dias dos skus e entrega cada resultado assim que fica pronto
+# (com ordenado=False os skus saem na ordem em que terminam, para o modo streaming)
+def gerar_previsoes_em_fluxo(dados_originais, num_workers=None, executor=None, ordenado=True, motor="prophet",
+                             horizonte=HORIZONTE_PADRAO):
+    # separa os dados de todos os skus de uma vez, ignorando os que têm poucos registros
+    with etapa("particionamento", len(dados_originais)):
+        tarefas = [
+            (sku, dados_sku)
+            for sku, dados_sku in particionar_por_sku(dados_originais).items()
+            if len(dados_sku) >= 10
+        ]
+
+    # treina e prevê os skus em paralelo, com prophet ou com os modelos rápidos conforme o motor
+    prever = partial(
+        prever_por_nivel, processar_sku=partial(processar_sku, horizonte=horizonte),
+        formatar_resultado=partial(formatar_resultado, horizonte=horizonte), motor=motor,
+        dias_previsao=horizonte, num_workers=num_workers, executor=executor, ordenado=ordenado,
+        validar_sku=prever_validacao,
+        processar_lote=partial(processar_lote_skus, horizonte=horizonte) if previsao_rapida_ativa() else None
+    )
+
+    # skus com o mesmo histórico da última execução saem do cache de resultados
+    # (o motor global ajusta todos os skus juntos, então o resultado de um sku depende dos demais)
+    if motor != "global" and cache_resultados_ativo():
+        yield from prever_com_cache(tarefas, prever, parametros_resultado(motor, horizonte), ordenado)
+    else:
+        yield from prever(tarefas)
+
+    # mantém o cache de modelos dentro dos limites de tamanho
+    if cache_ativo():
+        aplicar_limites()
+
+# função com os parâmetros que, junto com o histórico do sku, determinam o resultado guardado no cache de resultados
+def parametros_resultado(motor, horizonte):
+    return {
+        "script": SCRIPT,
+        "motor": motor,
+        "horizonte": horizonte,
+        "modelo": PARAMETROS_MODELO,
+        "previsao_rapida": previsao_rapida_ativa(),
+        "amostras_incerteza": obter_amostras_incerteza(),
+        "incremental": treino_incremental_ativo(),
     }
 
-    return relatorio
+# função que gera as previsões de 7 dias de todos os skus presentes nos dados, na ordem de entrada
+def gerar_previsoes(dados_originais, num_workers=None, executor=None, motor="prophet", horizonte=HORIZONTE_PADRAO):
+    return list(gerar_previsoes_em_fluxo(dados_originais, num_workers, executor, motor=motor, horizonte=horizonte))
+
+# função que inicia o modo servidor: bibliotecas e pool de processos ficam carregados entre requisições
+def iniciar_servidor(args):
+    from servidor import servir_tcp, servir_linhas
+
+    executor = criar_pool(args.workers)
+    carregar_agora("numpy", "pandas")
+
+    def prever_csv(conteudo_csv):
+        dados_originais = processar_csv_entrada(conteudo_csv)
+        if dados_originais.empty:
+            return []
+        # sem pool (--workers 1) os skus rodam no próprio processo, sem criar um pool a cada requisição
+        return gerar_previsoes(dados_originais, args.workers, executor, motor=args.motor, horizonte=args.horizonte)
+
+    try:
+        if args.servidor:
+            servir_tcp(prever_csv, args.host, args.porta)
+        else:
+            servir_linhas(prever_csv)
+    finally:
+        if executor is not None:
+            executor.shutdown()
+
+# função que treina o sku e devolve a previsão (ds, yhat) cobrindo até a data final dos relatórios
+def prever_para_relatorio(dados_sku, sku, data_final):
+    modelo = obter_modelo(dados_sku, sku)
+    if modelo is None:
+        return None
+
+    # no mínimo 30 dias, como no modo relatório de um sku
+    dias_previsao = max(30, (data_final - dados_sku['ds'].max()).days)
+    previsao = gerar_previsao(modelo, dados_sku, dias_previsao)
+    if previsao.empty:
+        return None
+
+    return previsao[['ds', 'yhat']]
+
+# função que interpreta a lista de datas: "2025-06-20,2025-06-22" ou intervalo "2025-06-20:2025-06-27"
+def interpretar_datas(texto):
+    datas = []
+    for parte in texto.split(','):
+        parte = parte.strip()
+        if ':' in parte:
+            inicio, fim = parte.split(':', 1)
+            datas.extend(pd.date_range(inicio, fim, freq='D'))
+        elif parte:
+            datas.append(pd.to_datetime(parte))
+    return pd.DatetimeIndex(datas).unique().sort_values()
+
+# função que gera relatórios operacionais de vários skus e várias datas lendo o arquivo uma única vez
+def gerar_relatorios_em_lote(caminho_arquivo, datas_alvo, skus=None, num_workers=None):
+    dados = carregar_arquivo_vendas(caminho_arquivo, skus=skus)
+    particoes = particionar_por_sku(dados)
+
+    if skus is None:
+        skus = list(particoes)
+
+    # separa os skus sem dados suficientes
+    tarefas = []
+    erros = []
+    for sku in skus:
+        dados_sku = particoes.get(sku)
+        if dados_sku is None or len(dados_sku) < 10:
+            erros.append({"sku": int(sku), "error": "Dados insuficientes para o SKU especificado"})
+        else:
+            tarefas.append((sku, dados_sku))
+
+    # cada sku é treinado uma única vez, com horizonte suficiente para a última data
+    data_final = datas_alvo.max() + pd.Timedelta(days=2)
+    previsoes = {}
+    funcao = partial(prever_para_relatorio, data_final=data_final)
+    for sku, previsao in executar_em_paralelo(funcao, tarefas, num_workers):
+        if previsao is None:
+            erros.append({"sku": int(sku), "error": "Falha ao treinar modelo Prophet"})
+        else:
+            previsoes[sku] = previsao
+
+    if not previsoes:
+        return [], erros
+
+    relatorios = gerar_relatorios_operacionais(previsoes, datas_alvo)
+    return relatorios_para_json(relatorios), erros
+
+# função que executa o modo lote e imprime um único json (ou uma linha json por relatório com --ndjson)
+def executar_modo_lote(args):
+    if not args.datas:
+        print(para_json({"error": "Informe as datas do relatório com --datas"}))
+        return
+
+    datas_alvo = interpretar_datas(args.datas)
+    skus = [int(sku) for sku in args.skus.split(',') if sku.strip()] if args.skus else None
+
+    relatorios, erros = gerar_relatorios_em_lote(args.lote, datas_alvo, skus, args.workers)
+
+    if args.ndjson:
+        for registro in relatorios + erros:
+            print(para_json(registro))
+    else:
+        print(para_json({"relatorios": relatorios, "erros": erros}))
+
+# função que lê os parâmetros posicionais (caminho, sku, data) e as opções da linha de comando
+def ler_argumentos():
+    parser = argparse.ArgumentParser(description="Previsão de vendas e relatório operacional por SKU")
+    parser.add_argument('posicionais', nargs='*', help="caminho do arquivo, SKU e data alvo (modo relatório)")
+    parser.add_argument('--workers', type=int, default=None,
+                        help="número de processos para treinar os SKUs (padrão: ITAMIND_WORKERS ou total de núcleos)")
+    parser.add_argument('--lote', metavar='CAMINHO',
+                        help="modo lote: gera relatórios operacionais de vários SKUs e datas a partir do arquivo")
+    parser.add_argument('--skus', help="SKUs do modo lote separados por vírgula (padrão: todos do arquivo)")
+    parser.add_argument('--datas', help="datas do modo lote: lista AAAA-MM-DD separada por vírgula ou intervalo INICIO:FIM")
+    parser.add_argument('--ndjson', action='store_true',
+                        help="imprime uma linha json por SKU (modo integração) ou por relatório (modo lote) assim que fica pronta")
+    parser.add_argument('--motor', choices=MOTORES, default="prophet",
+                        help="prophet (padrão), rapido (modelos por dia da semana) ou auto (rápido para SKUs de baixo volume, prophet só onde vence)")
+    parser.add_argument('--horizonte', type=horizonte_valido, default=HORIZONTE_PADRAO,
+                        help="dias de previsão entregues por SKU no json (padrão: 7)")
+    parser.add_argument('--rastrear', action='store_true',
+                        help="emite no stderr uma linha json por etapa (tempo, linhas e pico de memória), por SKU")
+    parser.add_argument('--profile', metavar='CAMINHO',
+                        help="grava as estatísticas do cProfile da execução neste arquivo (SKUs no processo principal)")
+    parser.add_argument('--sem-cache', action='store_true',
+                        help="ignora os caches de modelos e de resultados em disco e prevê todos os SKUs novamente")
+    parser.add_argument('--incremental', action='store_true',
+                        help="retreina SKUs com histórico novo partindo dos parâmetros do último modelo salvo")
+    parser.add_argument('--previsao-rapida', action='store_true',
+                        help="prevê só o horizonte com o yhat do histórico calculado direto dos parâmetros do modelo")
+    parser.add_argument('--amostras-incerteza', type=int, metavar='N',
+                        help="amostras do intervalo de incerteza do prophet (0 = intervalo analítico pelos resíduos, "
+                             "calculado pela previsão rápida)")
+    parser.add_argument('--servidor', action='store_true',
+                        help="mantém o processo ativo atendendo previsões via socket tcp local")
+    parser.add_argument('--linhas', action='store_true',
+                        help="mantém o processo ativo atendendo previsões em json por linha via stdin/stdout")
+    parser.add_argument('--host', default='127.0.0.1', help="endereço do modo servidor")
+    parser.add_argument('--porta', type=int, default=8765, help="porta do modo servidor")
+    return parser.parse_args()
 
 # função principal que coordena todo fluxo de previsão
 def main():
+    args = ler_argumentos()
+
+    # desliga o cache também nos processos filhos
+    if args.sem_cache:
+        os.environ['ITAMIND_CACHE_MODELOS_ATIVO'] = '0'
+        os.environ['ITAMIND_CACHE_RESULTADOS_ATIVO'] = '0'
+    if args.incremental:
+        os.environ['ITAMIND_TREINO_INCREMENTAL'] = '1'
+    if args.previsao_rapida:
+        os.environ['ITAMIND_PREVISAO_RAPIDA'] = '1'
+    if args.amostras_incerteza is not None:
+        os.environ['ITAMIND_AMOSTRAS_INCERTEZA'] = str(args.amostras_incerteza)
+    if args.rastrear:
+        os.environ['ITAMIND_RASTREAMENTO'] = '1'
+
+    # modo servidor persistente (socket tcp ou json por linha na entrada padrão)
+    if args.servidor or args.linhas:
+        iniciar_servidor(args)
+        return
+
+    # com o cProfile os skus rodam no processo principal (a menos que --workers seja informado)
+    if args.profile:
+        if args.workers is None:
+            args.workers = 1
+        with perfilar(args.profile):
+            executar(args)
+    else:
+        executar(args)
+
+    emitir_resumo()
+
+# executa o modo escolhido: integração via pipe, relatório ou interativo
+def executar(args):
     try:
+        # modo lote: vários skus e datas em uma única execução
+        if args.lote:
+            executar_modo_lote(args)
+
         # modo relatório com parâmetros da linha de comando
-        if len(sys.argv) >= 4:
-            caminho_arquivo = sys.argv[1]
-            sku = int(sys.argv[2])
-            data_alvo = sys.argv[3]
-
-            # carrega dados do arquivo
-            if caminho_arquivo.endswith('.csv'):
-                dados = pd.read_csv(caminho_arquivo, encoding='latin1', sep=';')
-                dados['data_dia'] = pd.to_datetime(dados['data_dia'], format='%d/%m/%Y', errors='coerce')
-            else:
-                dados = pd.read_excel(caminho_arquivo)
-                dados['data_dia'] = pd.to_datetime(dados['data_dia'], errors='coerce')
+        elif len(args.posicionais) >= 3:
+            caminho_arquivo = args.posicionais[0]
+            sku = int(args.posicionais[1])
+            data_alvo = args.posicionais[2]
+
+            # carrega só as colunas de vendas do sku (csv, xlsx ou armazém parquet)
+            dados = carregar_arquivo_vendas(caminho_arquivo, skus=[sku])
 
             # prepara dados para o sku
             dados_sku = preparar_dados_prophet(dados, sku)
@@ -210,8 +491,8 @@ def main():
                 print(json.dumps({"error": "Dados insuficientes para o SKU especificado"}))
                 return
 
-            # treina modelo
-            modelo = treinar_modelo_prophet(dados_sku)
+            # treina modelo (ou reaproveita do cache)
+            modelo = obter_modelo(dados_sku, sku)
             if modelo is None:
                 print(json.dumps({"error": "Falha ao treinar modelo Prophet"}))
                 return
@@ -224,78 +505,39 @@ def main():
 
             # gera relatório operacional
             relatorio = gerar_relatorio_operacional(previsao, sku, data_alvo)
-            print(json.dumps(relatorio, ensure_ascii=False, indent=2))
+            print(para_json(relatorio))
 
         # modo integração com node.js
         elif not sys.stdin.isatty():
             dados_originais = processar_csv_entrada()
 
             if dados_originais.empty:
-                print("[]")
+                # sem dados o fluxo ndjson fica vazio; no modo lista sai um json vazio
+                if not args.ndjson:
+                    print("[]")
                 return
 
-            # obtém skus únicos
-            skus = dados_originais['id_produto'].unique()
-            resultados = []
-
-            for sku in skus:
-                # prepara dados para o sku
-                dados_sku = preparar_dados_prophet(dados_originais, sku)
-
-                if dados_sku.empty or len(dados_sku) < 10:
-                    continue
-
-                # treina modelo
-                modelo = treinar_modelo_prophet(dados_sku)
-
-                if modelo is None:
-                    continue
-
-                # gera previsão
-                previsao = gerar_previsao(modelo, dados_sku, 7)
-
-                if previsao.empty:
-                    continue
-
-                # calcula métricas
-                rmse, mape = calcular_metricas(dados_sku, previsao)
-
-                # obtém previsões futuras (últimos 7 dias)
-                previsoes_futuras = previsao.tail(7)
-
-                # prepara dados para json
-                previsoes_json = []
-                for _, linha in previsoes_futuras.iterrows():
-                    previsoes_json.append({
-                        "ds": linha['ds'].isoformat(),
-                        "yhat": float(linha['yhat']),
-                        "yhat_lower": float(linha['yhat_lower']),
-                        "yhat_upper": float(linha['yhat_upper'])
-                    })
-
-                resultado = {
-                    "sku": int(sku),
-                    "rmse": rmse,
-                    "mape": mape,
-                    "previsoes": previsoes_json
-                }
+            # modo streaming: uma linha json por sku assim que a previsão termina
+            if args.ndjson:
+                for resultado in gerar_previsoes_em_fluxo(dados_originais, args.workers, ordenado=False,
+                                                          motor=args.motor, horizonte=args.horizonte):
+                    with contexto_sku(resultado["sku"]), etapa("saida", 1):
+                        print(para_json(resultado), flush=True)
+                return
 
-                resultados.append(resultado)
+            resultados = gerar_previsoes(dados_originais, args.workers, motor=args.motor, horizonte=args.horizonte)
 
-            # retorna json
-            print(json.dumps(resultados, ensure_ascii=False, indent=2))
+            # retorna json compacto
+            with etapa("saida", len(resultados)):
+                print(para_json(resultados))
 
         # modo interativo
         else:
             caminho = input("Digite o caminho do arquivo (.csv ou .xlsx): ")
             sku = int(input("Digite o SKU que deseja analisar: "))
 
-            # lê arquivo
-            if caminho.endswith('.csv'):
-                dados = pd.read_csv(caminho, encoding='latin1', sep=';')
-                dados['data_dia'] = pd.to_datetime(dados['data_dia'], format='%d/%m/%Y', errors='coerce')
-            else:
-                dados = pd.read_excel(caminho)
+            # lê arquivo (csv, xlsx ou armazém parquet)
+            dados = carregar_arquivo_vendas(caminho, skus=[sku])
 
             # prepara dados
             dados_sku = preparar_dados_prophet(dados, sku)
@@ -0,0 +1,77 @@
+# serialização das previsões para o json de saída: datas, arredondamento e limite em zero aplicados
+# à coluna inteira (sem iterrows) e texto json compacto, com orjson quando instalado
+import argparse
+import functools
+import json
+import math
+
+from importacao import importar_sob_demanda
+
+np = importar_sob_demanda("numpy")
+
+# dias de previsão entregues por sku quando --horizonte não é informado
+HORIZONTE_PADRAO = 7
+
+COLUNAS_PREVISAO = ["yhat", "yhat_lower", "yhat_upper"]
+
+# tipo do argumento --horizonte: inteiro a partir de 1 (com 0 ou negativo o tail de
+# previsoes_para_registros entregaria previsões vazias ou o histórico inteiro)
+def horizonte_valido(texto):
+    try:
+        horizonte = int(texto)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"horizonte inválido: {texto!r} (informe um número inteiro de dias)")
+    if horizonte < 1:
+        raise argparse.ArgumentTypeError(f"o horizonte deve ser de pelo menos 1 dia (recebido: {horizonte})")
+    return horizonte
+
+# orjson é opcional: serializa bem mais rápido que o json da biblioteca padrão
+@functools.lru_cache(maxsize=None)
+def _orjson():
+    try:
+        import orjson
+        return orjson
+    except ImportError:
+        return None
+
+# converte os últimos `horizonte` dias da previsão em registros ds/yhat/yhat_lower/yhat_upper;
+# com limitar=True os valores são arredondados em 2 casas e os não positivos viram 0
+def previsoes_para_registros(previsao, horizonte=HORIZONTE_PADRAO, limitar=False):
+    futuras = previsao.tail(horizonte)
+    datas = np.datetime_as_string(futuras['ds'].to_numpy(dtype='datetime64[s]'), unit='s').tolist()
+
+    colunas = []
+    for coluna in COLUNAS_PREVISAO:
+        valores = futuras[coluna].to_numpy(dtype=float)
+        if limitar:
+            valores = np.where(valores > 0, np.round(valores, 2), 0.0)
+        colunas.append(valores.tolist())
+
+    return [
+        {"ds": ds, "yhat": yhat, "yhat_lower": inferior, "yhat_upper": superior}
+        for ds, yhat, inferior, superior in zip(datas, *colunas)
+    ]
+
+# texto json compacto (sem espaços nem quebras de linha); NaN e infinito saem como null, como no orjson
+def para_json(objeto):
+    orjson = _orjson()
+    if orjson is not None:
+        return orjson.dumps(objeto, option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS).decode('utf-8')
+    return json.dumps(_sem_nao_finitos(objeto), ensure_ascii=False, separators=(',', ':'), allow_nan=False)
+
+# troca NaN e infinito por None (o json da biblioteca padrão escreveria NaN/Infinity, que não são json válido)
+def _sem_nao_finitos(objeto):
+    if isinstance(objeto, float):
+        return objeto if math.isfinite(objeto) else None
+    if isinstance(objeto, dict):
+        return {chave: _sem_nao_finitos(valor) for chave, valor in objeto.items()}
+    if isinstance(objeto, (list, tuple)):
+        return [_sem_nao_finitos(valor) for valor in objeto]
+    return objeto
+
+# lê um texto json (com orjson quando instalado)
+def ler_json(texto):
+    orjson = _orjson()
+    if orjson is not None:
+        return orjson.loads(texto)
+    return json.loads(texto)
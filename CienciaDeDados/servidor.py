@@ -0,0 +1,174 @@
+# servidor persistente de previsões: carrega as bibliotecas uma única vez e atende
+# várias requisições seguidas, evitando iniciar um processo python a cada previsão
+#
+# protocolo: uma mensagem json por linha, tanto via socket tcp quanto via stdin/stdout
+#   {"id": 1, "acao": "prever", "csv": "data_dia;id_produto;total_venda_dia_kg\n...", "prioridade": 5}
+#   {"id": 2, "acao": "saude"}
+# sem bloquear até o fim da previsão (o back-end consulta o andamento periodicamente):
+#   {"id": 3, "acao": "enviar", "csv": "...", "prioridade": 1}   -> {"trabalho": "...", "estado": "na_fila", ...}
+#   {"id": 4, "acao": "status", "trabalho": "..."}               -> estado, posição na fila, tempos
+#   {"id": 5, "acao": "resultado", "trabalho": "...", "esperar": 30}  -> estado e, se concluído, o resultado
+# todas as previsões passam pela fila de trabalhos (fila_previsoes.py): pedidos com o mesmo csv ainda
+# em andamento compartilham uma única execução
+# cada resposta também ocupa uma linha e repete o "id" recebido
+import json
+import os
+import socketserver
+import sys
+import threading
+import time
+
+from fila_previsoes import FilaPrevisoes, PRIORIDADE_PADRAO
+from serializacao import para_json
+
+# estado compartilhado entre as requisições para o sinal de saúde
+class EstadoServidor:
+    def __init__(self, funcao_previsao):
+        self.fila = FilaPrevisoes(funcao_previsao)
+        self.inicio = time.time()
+        self.atendidas = 0
+        self.em_andamento = 0
+        self.trava = threading.Lock()
+
+    def saude(self):
+        with self.trava:
+            return {
+                "status": "pronto",
+                "pid": os.getpid(),
+                "em_andamento": self.em_andamento,
+                "atendidas": self.atendidas,
+                "trabalhos": self.fila.contagem(),
+                "tempo_ativo_s": round(time.time() - self.inicio, 1),
+            }
+
+# interpreta uma linha do protocolo e devolve o dicionário de resposta
+def tratar_mensagem(linha, estado):
+    try:
+        mensagem = json.loads(linha)
+    except json.JSONDecodeError as e:
+        return {"id": None, "ok": False, "erro": f"Mensagem json inválida: {e}"}
+
+    id_mensagem = mensagem.get("id")
+    acao = mensagem.get("acao", "prever")
+
+    if acao == "saude":
+        return {"id": id_mensagem, "ok": True, **estado.saude()}
+
+    if acao in ("status", "resultado"):
+        return _consultar_trabalho(mensagem, acao, estado)
+
+    if acao not in ("prever", "enviar"):
+        return {"id": id_mensagem, "ok": False, "erro": f"Ação desconhecida: {acao}"}
+
+    if not mensagem.get("csv"):
+        return {"id": id_mensagem, "ok": False, "erro": 'O campo "csv" é obrigatório.'}
+
+    try:
+        prioridade = int(mensagem.get("prioridade", PRIORIDADE_PADRAO))
+    except (TypeError, ValueError):
+        return {"id": id_mensagem, "ok": False, "erro": 'O campo "prioridade" deve ser um número inteiro.'}
+
+    trabalho, reaproveitado = estado.fila.enviar(mensagem["csv"], prioridade)
+
+    if acao == "enviar":
+        return {"id": id_mensagem, "ok": True, "reaproveitado": reaproveitado, **estado.fila.resumir(trabalho)}
+
+    with estado.trava:
+        estado.em_andamento += 1
+
+    try:
+        trabalho.terminado.wait()
+        if trabalho.estado == "erro":
+            print(f"Erro ao atender requisição {id_mensagem}: {trabalho.erro}", file=sys.stderr)
+            return {"id": id_mensagem, "ok": False, "erro": trabalho.erro}
+        return {"id": id_mensagem, "ok": True, "resultado": trabalho.resultado}
+    finally:
+        with estado.trava:
+            estado.em_andamento -= 1
+            estado.atendidas += 1
+
+# estado de um trabalho enviado; "resultado" inclui a previsão quando o trabalho terminou e pode
+# aguardar até "esperar" segundos por ela
+def _consultar_trabalho(mensagem, acao, estado):
+    id_mensagem = mensagem.get("id")
+    trabalho = estado.fila.obter(mensagem.get("trabalho"))
+    if trabalho is None:
+        return {"id": id_mensagem, "ok": False, "erro": f"Trabalho desconhecido ou expirado: {mensagem.get('trabalho')}"}
+
+    if acao == "resultado" and mensagem.get("esperar"):
+        try:
+            trabalho.terminado.wait(float(mensagem["esperar"]))
+        except (TypeError, ValueError):
+            return {"id": id_mensagem, "ok": False, "erro": 'O campo "esperar" deve ser um número de segundos.'}
+
+    # o trabalho pode ser descartado da fila enquanto esta consulta espera; o resumo sai do objeto já obtido
+    resposta = {"id": id_mensagem, "ok": True, **estado.fila.resumir(trabalho)}
+    if acao == "resultado" and trabalho.estado == "concluido":
+        resposta["resultado"] = trabalho.resultado
+    return resposta
+
+# serializa a resposta em uma única linha
+def _formatar_resposta(resposta):
+    return para_json(resposta) + "\n"
+
+# cada conexão tcp é atendida em sua própria thread e pode enviar várias linhas
+class _TratadorConexao(socketserver.StreamRequestHandler):
+    def handle(self):
+        for linha in self.rfile:
+            linha = linha.decode('utf-8').strip()
+            if not linha:
+                continue
+            resposta = tratar_mensagem(linha, self.server.estado)
+            self.wfile.write(_formatar_resposta(resposta).encode('utf-8'))
+            self.wfile.flush()
+
+class _ServidorTCP(socketserver.ThreadingMixIn, socketserver.TCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+# inicia o servidor tcp local; a linha "pronto" no stdout indica que aceita conexões
+def servir_tcp(funcao_previsao, host='127.0.0.1', porta=8765):
+    estado = EstadoServidor(funcao_previsao)
+
+    with _ServidorTCP((host, porta), _TratadorConexao) as servidor:
+        servidor.estado = estado
+        host_real, porta_real = servidor.server_address[:2]
+        print(json.dumps({"status": "pronto", "host": host_real, "porta": porta_real}), flush=True)
+        try:
+            servidor.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            estado.fila.encerrar()
+
+# atende o mesmo protocolo pela entrada padrão até o fim do stream;
+# cada requisição é atendida em sua própria thread (o uso de cpu é limitado pela fila de trabalhos)
+# e respondida na ordem em que termina
+def servir_linhas(funcao_previsao, entrada=None, saida=None):
+    entrada = entrada or sys.stdin
+    saida = saida or sys.stdout
+    estado = EstadoServidor(funcao_previsao)
+    trava_saida = threading.Lock()
+
+    def atender(linha):
+        resposta = tratar_mensagem(linha, estado)
+        with trava_saida:
+            saida.write(_formatar_resposta(resposta))
+            saida.flush()
+
+    with trava_saida:
+        saida.write(_formatar_resposta({"id": None, "ok": True, **estado.saude()}))
+        saida.flush()
+
+    atendimentos = []
+    try:
+        for linha in entrada:
+            linha = linha.strip()
+            if linha:
+                atendimento = threading.Thread(target=atender, args=(linha,), daemon=True)
+                atendimento.start()
+                atendimentos.append(atendimento)
+        for atendimento in atendimentos:
+            atendimento.join()
+    finally:
+        estado.fila.encerrar()
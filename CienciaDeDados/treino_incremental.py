@@ -0,0 +1,86 @@
+# treino incremental: inicia a otimização do stan a partir dos parâmetros do último modelo
+# salvo do sku, em vez de partir do zero, quando o histórico só ganhou novos dias
+import json
+import os
+import sys
+
+from cache_modelos import obter_pasta_cache
+from importacao import importar_sob_demanda
+
+np = importar_sob_demanda("numpy")
+
+# o modo incremental é ligado com --incremental (ou ITAMIND_TREINO_INCREMENTAL=1)
+def treino_incremental_ativo():
+    return os.environ.get('ITAMIND_TREINO_INCREMENTAL', '0') == '1'
+
+# extrai k, m, delta, beta e sigma_obs de um modelo treinado no formato aceito por fit(init=...)
+def extrair_parametros_iniciais(modelo):
+    parametros = {}
+    for nome in ['k', 'm', 'sigma_obs']:
+        parametros[nome] = float(modelo.params[nome][0][0])
+    for nome in ['delta', 'beta']:
+        parametros[nome] = np.asarray(modelo.params[nome][0], dtype=float)
+    return parametros
+
+# carrega o modelo mais recente do sku salvo no cache, seja qual for o histórico que o gerou
+def carregar_ultimo_modelo(sku):
+    from prophet.serialize import model_from_json
+
+    pasta = obter_pasta_cache()
+    if not os.path.isdir(pasta):
+        return None
+
+    prefixo = f"{sku}_"
+    candidatos = [
+        entrada for entrada in os.scandir(pasta)
+        if entrada.name.startswith(prefixo) and entrada.name.endswith('.json')
+    ]
+    if not candidatos:
+        return None
+
+    mais_recente = max(candidatos, key=lambda entrada: entrada.stat().st_mtime)
+    try:
+        with open(mais_recente.path, 'r', encoding='utf-8') as arquivo:
+            return model_from_json(arquivo.read())
+    except Exception as e:
+        print(f"Não foi possível carregar o último modelo do SKU {sku}: {e}", file=sys.stderr)
+        return None
+
+# parâmetros iniciais para o próximo treino do sku, ou None se não houver modelo anterior
+def obter_parametros_iniciais(sku):
+    modelo_anterior = carregar_ultimo_modelo(sku)
+    if modelo_anterior is None:
+        return None
+    return extrair_parametros_iniciais(modelo_anterior)
+
+def _caminho_tempos(sku):
+    return os.path.join(obter_pasta_cache(), f"{sku}.tempos")
+
+# guarda o tempo do último treino completo do sku e, nos treinos aquecidos,
+# informa no stderr quanto tempo foi economizado em relação a ele
+def registrar_tempo_treino(sku, segundos, aquecido):
+    caminho = _caminho_tempos(sku)
+
+    if not aquecido:
+        try:
+            os.makedirs(obter_pasta_cache(), exist_ok=True)
+            with open(caminho, 'w', encoding='utf-8') as arquivo:
+                json.dump({"treino_completo_s": segundos}, arquivo)
+        except OSError:
+            pass
+        return None
+
+    try:
+        with open(caminho, 'r', encoding='utf-8') as arquivo:
+            treino_completo = json.load(arquivo)["treino_completo_s"]
+    except (OSError, ValueError, KeyError):
+        print(f"Treino incremental do SKU {sku}: {segundos:.3f}s (sem treino completo de referência)", file=sys.stderr)
+        return None
+
+    economia = treino_completo - segundos
+    print(
+        f"Treino incremental do SKU {sku}: {segundos:.3f}s "
+        f"(treino completo: {treino_completo:.3f}s, economia: {economia:.3f}s)",
+        file=sys.stderr
+    )
+    return economia